@@ -0,0 +1,107 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from models import (
+    User,
+    ConsumptionEntry,
+    SpendingEntry,
+    ConsumptionEntryArchive,
+    SpendingEntryArchive,
+)
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Purge Configuration
+# ------------------------
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", 1000))
+
+# Large per-user tables, emptied chunk by chunk. Small ones (summaries, goal
+# status) go with the user row through ON DELETE CASCADE.
+_CHUNKED_TABLES = (ConsumptionEntry, SpendingEntry, ConsumptionEntryArchive, SpendingEntryArchive)
+
+_lock = threading.Lock()
+purge_progress = {}  # user_id -> progress of the running or last purge
+
+
+def _delete_chunk(db: Session, table, user_id: int, chunk_size: int) -> int:
+    ids = db.query(table.id).filter(table.user_id == user_id).limit(chunk_size).scalar_subquery()
+    deleted = db.query(table).filter(table.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def purge_user(db: Session, user_id: int, chunk_size: int = PURGE_CHUNK_SIZE):
+    """
+    Deletes a disabled user's rows in bounded chunks, each in its own short
+    transaction, then the user row itself. Safe to re-run after interruption.
+    """
+    with _lock:
+        if purge_progress.get(user_id, {}).get("status") == "running":
+            return purge_progress[user_id]
+        progress = purge_progress[user_id] = {
+            "status": "running",
+            "started_at": datetime.utcnow(),
+            "finished_at": None,
+            "deleted": {table.__tablename__: 0 for table in _CHUNKED_TABLES},
+            "error": None,
+        }
+
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None or user.disabled_at is None:
+            progress["status"] = "skipped"
+            return progress
+
+        for table in _CHUNKED_TABLES:
+            while True:
+                deleted = _delete_chunk(db, table, user_id, chunk_size)
+                progress["deleted"][table.__tablename__] += deleted
+                if deleted < chunk_size:
+                    break
+
+        db.query(User).filter(User.id == user_id).delete(synchronize_session=False)
+        db.commit()
+        progress["status"] = "completed"
+        logger.info(f"Purged user {user_id}: {progress['deleted']}")
+    except Exception as e:
+        db.rollback()
+        progress["status"] = "failed"
+        progress["error"] = str(e)
+        logger.error(f"Purging user {user_id} failed: {e}")
+    finally:
+        progress["finished_at"] = datetime.utcnow()
+    return progress
+
+
+def purge_with_new_session(user_id: int):
+    from database import SessionLocal
+    import leaderboards
+    import timeseries
+    import anomalies
+
+    db = SessionLocal()
+    try:
+        progress = purge_user(db, user_id)
+        if progress["status"] == "completed":
+            leaderboards.record_write(db, user_id)  # Drops the user from every board
+            timeseries.store.invalidate(user_id)
+            anomalies.forget(user_id)
+        return progress
+    finally:
+        db.close()
+
+
+def resume_pending_purges():
+    """Purges accounts that were disabled but not fully deleted, e.g. after a restart."""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        user_ids = [row.id for row in db.query(User.id).filter(User.disabled_at.isnot(None)).all()]
+    finally:
+        db.close()
+    for user_id in user_ids:
+        purge_with_new_session(user_id)
@@ -3,8 +3,9 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
 
-# Import the Base object from your project's database module
-from database import Base  # Update this import if necessary
+# Import the Base object from the models, not the database module: that one
+# connects on import, and migrations must run against the configured URL only
+from models import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
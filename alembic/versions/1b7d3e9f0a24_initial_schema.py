@@ -0,0 +1,81 @@
+"""initial schema
+
+Revision ID: 1b7d3e9f0a24
+Revises:
+Create Date: 2026-10-19 08:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b7d3e9f0a24'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+role_enum = postgresql.ENUM("admin", "user", name="roleenum", create_type=False)
+
+
+def upgrade() -> None:
+    # Databases set up before the migrations existed got these tables from
+    # create_all, which used to run when the app started
+    if sa.inspect(op.get_bind()).has_table("users"):
+        return
+
+    role_enum.create(op.get_bind(), checkfirst=True)
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("first_name", sa.String(), nullable=False),
+        sa.Column("last_name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("date_of_birth", sa.Date(), nullable=False),
+        sa.Column("monthly_goal", sa.Float(), nullable=True),
+        sa.Column("role", role_enum, nullable=True),
+        sa.Column("income", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "consumption_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("liters_consumed", sa.Float(), nullable=False),
+        sa.Column("notes", sa.String(), nullable=True),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.CheckConstraint("liters_consumed > 0", name="check_liters_positive"),
+    )
+    op.create_index("ix_consumption_entries_id", "consumption_entries", ["id"])
+
+    op.create_table(
+        "spending_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("amount_spent", sa.Float(), nullable=False),
+        sa.Column("liters", sa.Float(), nullable=False),
+        sa.Column("store", sa.String(), nullable=True),
+        sa.Column("city", sa.String(), nullable=True),
+        sa.Column("notes", sa.String(), nullable=True),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.CheckConstraint("amount_spent > 0", name="check_amount_positive"),
+        sa.CheckConstraint("liters > 0", name="check_liters_positive"),
+    )
+    op.create_index("ix_spending_entries_id", "spending_entries", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("spending_entries")
+    op.drop_table("consumption_entries")
+    op.drop_table("users")
+    role_enum.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,45 @@
+"""entry notes full text search
+
+Revision ID: 2c8f5d1a9e36
+Revises: 9d4c1e7b2f58
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8f5d1a9e36'
+down_revision: Union[str, None] = '9d4c1e7b2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match sql_expressions.TEXT_SEARCH_CONFIG and the documents in entry_search.py
+CONSUMPTION_VECTOR = "to_tsvector('simple', coalesce(notes, ''))"
+SPENDING_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(notes, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(store, '') || ' ' || coalesce(city, '')), 'B')"
+)
+
+# Hot tables are partitioned; columns and indexes added to them cascade to every partition
+TABLES = {
+    "consumption_entries": CONSUMPTION_VECTOR,
+    "consumption_entries_archive": CONSUMPTION_VECTOR,
+    "spending_entries": SPENDING_VECTOR,
+    "spending_entries_archive": SPENDING_VECTOR,
+}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")  # user_id in the same GIN index
+    for table, vector in TABLES.items():
+        op.execute(f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED")
+        op.execute(f"CREATE INDEX ix_{table}_search ON {table} USING gin (user_id, search_vector)")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.execute(f"DROP INDEX ix_{table}_search")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN search_vector")
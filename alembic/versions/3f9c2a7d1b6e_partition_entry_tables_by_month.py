@@ -0,0 +1,94 @@
+"""partition entry tables by month
+
+Revision ID: 3f9c2a7d1b6e
+Revises: 6e2a9c4b8d10
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b6e'
+down_revision: Union[str, None] = '6e2a9c4b8d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("consumption_entries", "spending_entries")
+MONTHS_AHEAD = 3
+
+
+def _add_months(month_start, months):
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    current_month = date.today().replace(day=1)
+
+    for table in TABLES:
+        old = f"{table}_unpartitioned"
+
+        # The id sequence would be dropped with the old table otherwise
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (date)"
+        )
+
+        # One partition per month from the oldest row to a few months ahead
+        oldest = conn.execute(sa.text(f"SELECT min(date) FROM {old}")).scalar()
+        month_start = min(oldest.replace(day=1), current_month) if oldest else current_month
+        last_month = _add_months(current_month, MONTHS_AHEAD)
+        while month_start <= last_month:
+            next_month = _add_months(month_start, 1)
+            op.execute(
+                f"CREATE TABLE {table}_y{month_start.year}m{month_start.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{next_month.isoformat()}')"
+            )
+            month_start = next_month
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        op.execute(f"DROP TABLE {old}")  # Frees its constraint and index names
+
+        # Unique constraints on a partitioned table must include the partition key
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, date)")
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_user_id_fkey "
+            f"FOREIGN KEY (user_id) REFERENCES users (id)"
+        )
+        op.execute(f"CREATE INDEX ix_{table}_id ON {table} (id)")
+        op.execute(f"CREATE INDEX ix_{table}_user_id_date ON {table} (user_id, date)")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        partitioned = f"{table}_partitioned"
+
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+        op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        op.execute(f"ALTER TABLE {partitioned} DROP CONSTRAINT {table}_pkey")
+        op.execute(f"ALTER TABLE {partitioned} DROP CONSTRAINT {table}_user_id_fkey")
+        op.execute(f"DROP INDEX ix_{table}_id")
+        op.execute(f"DROP INDEX ix_{table}_user_id_date")
+
+        op.execute(f"CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+        op.execute(f"DROP TABLE {partitioned} CASCADE")
+
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_user_id_fkey "
+            f"FOREIGN KEY (user_id) REFERENCES users (id)"
+        )
+        op.execute(f"CREATE INDEX ix_{table}_id ON {table} (id)")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
@@ -0,0 +1,36 @@
+"""snapshot export keyset indexes
+
+Revision ID: 5a0e9b3c7d12
+Revises: c4d7e2a91f03
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a0e9b3c7d12'
+down_revision: Union[str, None] = 'c4d7e2a91f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Snapshot exports page through entries by (created_at, id)
+TABLES = (
+    "consumption_entries",
+    "spending_entries",
+    "consumption_entries_archive",
+    "spending_entries_archive",
+)
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        # Databases whose tables were created from the models already have them
+        op.create_index(f"ix_{table}_created_at_id", table, ["created_at", "id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_created_at_id", table_name=table, if_exists=True)
@@ -0,0 +1,49 @@
+"""goal job tables
+
+Revision ID: 6e2a9c4b8d10
+Revises: 1b7d3e9f0a24
+Create Date: 2026-10-19 08:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2a9c4b8d10'
+down_revision: Union[str, None] = '1b7d3e9f0a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases whose tables were created from the models already have them
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if "user_goal_status" not in existing:
+        op.create_table(
+            "user_goal_status",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("month", sa.Date(), nullable=False),
+            sa.Column("consumption", sa.Float(), nullable=False),
+            sa.Column("monthly_goal", sa.Float(), nullable=True),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("evaluated_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        )
+
+    if "job_checkpoints" not in existing:
+        op.create_table(
+            "job_checkpoints",
+            sa.Column("name", sa.String(), primary_key=True),
+            sa.Column("last_id", sa.Integer(), nullable=False),
+            sa.Column("processed", sa.Integer(), nullable=False),
+            sa.Column("run_started_at", sa.TIMESTAMP(), nullable=True),
+            sa.Column("completed_at", sa.TIMESTAMP(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("job_checkpoints")
+    op.drop_table("user_goal_status")
@@ -0,0 +1,48 @@
+"""cascade user deletes and disabled accounts
+
+Revision ID: 8b1e4c0d2a57
+Revises: a3f5c8e1d9b7
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4c0d2a57'
+down_revision: Union[str, None] = 'a3f5c8e1d9b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+USER_TABLES = (
+    "consumption_entries",
+    "spending_entries",
+    "consumption_entries_archive",
+    "spending_entries_archive",
+    "consumption_monthly_summaries",
+    "spending_monthly_summaries",
+    "user_goal_status",
+)
+
+
+def _replace_user_fk(ondelete):
+    for table in USER_TABLES:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_user_id_fkey")
+        op.create_foreign_key(
+            f"{table}_user_id_fkey", table, "users", ["user_id"], ["id"], ondelete=ondelete
+        )
+
+
+def upgrade() -> None:
+    # Databases whose tables were created from the models already have it
+    if "disabled_at" not in {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}:
+        op.add_column("users", sa.Column("disabled_at", sa.TIMESTAMP(), nullable=True))
+    _replace_user_fk("CASCADE")
+
+
+def downgrade() -> None:
+    _replace_user_fk(None)
+    op.drop_column("users", "disabled_at")
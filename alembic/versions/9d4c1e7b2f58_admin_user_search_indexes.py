@@ -0,0 +1,61 @@
+"""admin user search indexes
+
+Revision ID: 9d4c1e7b2f58
+Revises: e7b2f4a60c19
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4c1e7b2f58'
+down_revision: Union[str, None] = 'e7b2f4a60c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases whose tables were created from the models already have it
+    if "lifetime_liters" not in {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}:
+        op.add_column(
+            "users", sa.Column("lifetime_liters", sa.Float(), nullable=False, server_default="0")
+        )
+    # Hot entries plus the monthly summaries of archived ones, as the leaderboards count them
+    op.execute("""
+        UPDATE users SET lifetime_liters = totals.liters
+        FROM (
+            SELECT user_id, SUM(liters) AS liters FROM (
+                SELECT user_id, SUM(liters_consumed) AS liters FROM consumption_entries GROUP BY user_id
+                UNION ALL
+                SELECT user_id, SUM(total_liters) AS liters FROM consumption_monthly_summaries GROUP BY user_id
+            ) AS parts
+            GROUP BY user_id
+        ) AS totals
+        WHERE users.id = totals.user_id
+    """)
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Built concurrently so a large users table stays writable meanwhile
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_search_trgm ON users "
+            "USING gin ((first_name || ' ' || last_name || ' ' || email) gin_trgm_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_name_id ON users (last_name, first_name, id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_lifetime_liters_id ON users (lifetime_liters, id)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_lifetime_liters_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_name_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_search_trgm")
+    op.drop_column("users", "lifetime_liters")
@@ -0,0 +1,80 @@
+"""archive tables and monthly summaries
+
+Revision ID: a3f5c8e1d9b7
+Revises: 3f9c2a7d1b6e
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f5c8e1d9b7'
+down_revision: Union[str, None] = '3f9c2a7d1b6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases whose tables were created from the models already have them
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if "consumption_entries_archive" not in existing:
+        op.create_table(
+            "consumption_entries_archive",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),  # Keeps the original entry id
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("liters_consumed", sa.Float(), nullable=False),
+            sa.Column("notes", sa.String(), nullable=True),
+            sa.Column("created_at", sa.TIMESTAMP()),
+            sa.Column("archived_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        )
+        op.create_index("ix_consumption_entries_archive_user_id", "consumption_entries_archive", ["user_id"])
+
+    if "spending_entries_archive" not in existing:
+        op.create_table(
+            "spending_entries_archive",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("date", sa.Date(), nullable=False),
+            sa.Column("amount_spent", sa.Float(), nullable=False),
+            sa.Column("liters", sa.Float(), nullable=False),
+            sa.Column("store", sa.String(), nullable=True),
+            sa.Column("city", sa.String(), nullable=True),
+            sa.Column("notes", sa.String(), nullable=True),
+            sa.Column("created_at", sa.TIMESTAMP()),
+            sa.Column("archived_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+        )
+        op.create_index("ix_spending_entries_archive_user_id", "spending_entries_archive", ["user_id"])
+
+    if "consumption_monthly_summaries" not in existing:
+        op.create_table(
+            "consumption_monthly_summaries",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("month", sa.Date(), primary_key=True),
+            sa.Column("total_liters", sa.Float(), nullable=False),
+            sa.Column("entry_count", sa.Integer(), nullable=False),
+            sa.Column("max_liters", sa.Float(), nullable=False),
+        )
+
+    if "spending_monthly_summaries" not in existing:
+        op.create_table(
+            "spending_monthly_summaries",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("month", sa.Date(), primary_key=True),
+            sa.Column("total_spent", sa.Float(), nullable=False),
+            sa.Column("total_liters", sa.Float(), nullable=False),
+            sa.Column("entry_count", sa.Integer(), nullable=False),
+            sa.Column("max_spent", sa.Float(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("spending_monthly_summaries")
+    op.drop_table("consumption_monthly_summaries")
+    op.drop_table("spending_entries_archive")
+    op.drop_table("consumption_entries_archive")
@@ -0,0 +1,57 @@
+"""case-insensitive unique email
+
+Revision ID: c4d7e2a91f03
+Revises: 8b1e4c0d2a57
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e2a91f03'
+down_revision: Union[str, None] = '8b1e4c0d2a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    # Accounts whose email only differs by case or surrounding whitespace from an
+    # older account. Nothing is deleted: the older account keeps the address and
+    # the newer ones get a tagged address that still identifies them for support.
+    duplicates = conn.execute(sa.text(
+        """
+        SELECT id, email FROM (
+            SELECT id, email,
+                   row_number() OVER (PARTITION BY lower(trim(email)) ORDER BY id) AS rank
+            FROM users
+        ) ranked
+        WHERE rank > 1
+        """
+    )).fetchall()
+    for user_id, email in duplicates:
+        local, _, domain = email.strip().lower().partition("@")
+        conn.execute(
+            sa.text("UPDATE users SET email = :email WHERE id = :id"),
+            {"email": f"{local}+duplicate-{user_id}@{domain}", "id": user_id},
+        )
+        logger.warning(f"User {user_id}: duplicate email {email!r} renamed")
+
+    # Store every address normalized, as register now does
+    op.execute("UPDATE users SET email = lower(trim(email)) WHERE email <> lower(trim(email))")
+
+    # Databases whose tables were created from the models already have it
+    op.create_index("ix_users_email_lower", "users", [sa.text("lower(email)")], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    # Emails stay normalized; renamed duplicates are not restored
+    op.drop_index("ix_users_email_lower", table_name="users")
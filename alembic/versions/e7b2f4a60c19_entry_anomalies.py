@@ -0,0 +1,44 @@
+"""entry anomalies
+
+Revision ID: e7b2f4a60c19
+Revises: 5a0e9b3c7d12
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2f4a60c19'
+down_revision: Union[str, None] = '5a0e9b3c7d12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases whose tables were created from the models already have it
+    if sa.inspect(op.get_bind()).has_table("entry_anomalies"):
+        return
+    op.create_table(
+        "entry_anomalies",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("metric", sa.String(), nullable=False),
+        sa.Column("entry_id", sa.Integer(), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("expected", sa.Float(), nullable=False),
+        sa.Column("z_score", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_entry_anomalies_id", "entry_anomalies", ["id"])
+    op.create_index("ix_entry_anomalies_user_id_created_at", "entry_anomalies", ["user_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_entry_anomalies_user_id_created_at", table_name="entry_anomalies")
+    op.drop_index("ix_entry_anomalies_id", table_name="entry_anomalies")
+    op.drop_table("entry_anomalies")
@@ -0,0 +1,294 @@
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+from datetime import timedelta
+from models import ConsumptionEntry, SpendingEntry, EntryAnomaly
+from cache import cache
+import threading
+import logging
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Detector Configuration
+# ------------------------
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", 0.1))  # Weight of the newest observation
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", 3.5))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", 7))  # Observations before anything is flagged
+ANOMALY_MIN_STD_FRACTION = 0.1  # Floor on the deviation, as a share of the mean, for very regular users
+ANOMALY_STATE_TTL_SECONDS = float(os.getenv("ANOMALY_STATE_TTL_SECONDS", 7 * 86400))  # Idle users are relearned
+ANOMALY_WARMUP_DAYS = 60  # History read when a user's state is cold, e.g. after a restart
+
+
+# ------------------------
+# Moving Statistics
+# ------------------------
+class EWMA:
+    """Exponentially weighted mean and variance of a stream, in O(1) space."""
+
+    __slots__ = ("mean", "variance", "samples")
+
+    def __init__(self, mean: float = 0.0, variance: float = 0.0, samples: int = 0):
+        self.mean = mean
+        self.variance = variance
+        self.samples = samples
+
+    def add(self, value: float):
+        if self.samples == 0:
+            self.mean = value
+        else:
+            difference = value - self.mean
+            increment = ANOMALY_ALPHA * difference
+            self.mean += increment
+            self.variance = (1 - ANOMALY_ALPHA) * (self.variance + difference * increment)
+        self.samples += 1
+
+    def z_score(self, value: float):
+        """How many deviations `value` lies from the mean, or None while still learning."""
+        if self.samples < ANOMALY_MIN_SAMPLES:
+            return None
+        deviation = max(math.sqrt(self.variance), ANOMALY_MIN_STD_FRACTION * abs(self.mean), 1e-9)
+        return (value - self.mean) / deviation
+
+    def as_list(self):
+        return [self.mean, self.variance, self.samples]
+
+
+# ------------------------
+# Per-User State
+# ------------------------
+# A user's state lives in the cache (see cache.py), so with a shared backend
+# every worker updates the same state. Liters state is the EWMA of the
+# user's daily totals before `day`, the latest day written, plus the running
+# total of `day` and whether it was flagged; price state is the EWMA of
+# prices per liter. Both are updated in O(1) per write: the database is only
+# read when a state is cold (first write since it expired or was lost).
+_lock = threading.Lock()
+detector_stats = {"observed": 0, "flagged": 0, "warmed_up": 0}
+
+
+def _cache_key(user_id: int, metric: str) -> str:
+    return f"anomalies:{user_id}:{metric}"
+
+
+def _update(key: str, load, apply):
+    """
+    Runs `apply(state, warm)` on the state under `key`, loaded with `load()`
+    when cold (or left alone if there is no `load`), and returns its result.
+    The state is only stored back if nobody updated it in the meantime;
+    otherwise both updates drop it and the next write reloads it, rather than
+    one silently losing the other's write.
+    """
+    version = cache.version(key)  # Read before the state, see cache.py
+    state = cache.get(key)
+    if state is None:
+        if load is None:
+            return None
+        state = load()
+        with _lock:
+            detector_stats["warmed_up"] += 1
+        warm = False
+    else:
+        state = dict(state)  # The in-process backend hands out its own copy
+        warm = True
+    result = apply(state, warm)
+    previous, current = cache.invalidate(key)
+    if previous is not None and previous == version:
+        cache.set(key, state, ttl=ANOMALY_STATE_TTL_SECONDS, version=current)
+    return result
+
+
+def _warm_up_liters(db: Session, user_id: int, entry_id: int, day) -> dict:
+    """Replays recent daily totals, up to and including the entry just written."""
+    rows = (
+        db.query(ConsumptionEntry.date, func.sum(ConsumptionEntry.liters_consumed))
+        .filter(
+            ConsumptionEntry.user_id == user_id,
+            ConsumptionEntry.date.between(day - timedelta(days=ANOMALY_WARMUP_DAYS), day),
+            or_(ConsumptionEntry.date < day, ConsumptionEntry.id <= entry_id),
+        )
+        .group_by(ConsumptionEntry.date)
+        .order_by(ConsumptionEntry.date)
+        .all()
+    )
+    stats = EWMA()
+    total = 0.0
+    for row_day, row_total in rows:
+        if row_day == day:
+            total = float(row_total)
+        else:
+            stats.add(float(row_total))
+    return {"day": day, "total": total, "flagged": _day_flagged(db, user_id, day), "stats": stats.as_list()}
+
+
+def _day_flagged(db: Session, user_id: int, day) -> bool:
+    return db.query(
+        db.query(EntryAnomaly.id)
+        .filter(EntryAnomaly.user_id == user_id, EntryAnomaly.metric == "liters", EntryAnomaly.date == day)
+        .exists()
+    ).scalar()
+
+
+def _warm_up_prices(db: Session, user_id: int, entry_id: int, day) -> dict:
+    """Replays recent prices per liter before the entry just written."""
+    rows = (
+        db.query(SpendingEntry.amount_spent, SpendingEntry.liters)
+        .filter(
+            SpendingEntry.user_id == user_id,
+            SpendingEntry.date.between(day - timedelta(days=ANOMALY_WARMUP_DAYS), day),
+            or_(SpendingEntry.date < day, and_(SpendingEntry.date == day, SpendingEntry.id < entry_id)),
+            SpendingEntry.liters > 0,
+        )
+        .order_by(SpendingEntry.date, SpendingEntry.id)
+        .all()
+    )
+    stats = EWMA()
+    for amount, liters in rows:
+        stats.add(amount / liters)
+    return {"stats": stats.as_list()}
+
+
+def _record(db: Session, user_id: int, metric: str, entry_id: int, day, value: float, expected: float, z_score: float):
+    try:
+        db.add(EntryAnomaly(
+            user_id=user_id, metric=metric, entry_id=entry_id, date=day,
+            value=round(value, 4), expected=round(expected, 4), z_score=round(z_score, 2),
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()  # The entry itself is already committed
+        logger.error(f"Failed to record {metric} anomaly for user {user_id}: {e}")
+        return
+    logger.info(f"Flagged {metric} anomaly for user {user_id}: {value:.2f} against {expected:.2f} (z={z_score:.1f})")
+
+
+# ------------------------
+# Scoring
+# ------------------------
+def score_liters(state: dict, day, liters: float, counted: bool = False):
+    """
+    Adds an entry to the liters state and returns (total, expected, z_score)
+    if its day's total is unusually high and the day was not flagged yet.
+    `counted` means the state already includes the entry. Days before the
+    latest one are not scored.
+    """
+    if day < state["day"]:
+        return None
+    stats = EWMA(*state["stats"])
+    if day > state["day"]:
+        stats.add(state["total"])  # The previous day is complete
+        state.update(day=day, total=0.0, flagged=False, stats=stats.as_list())
+    if not counted:
+        state["total"] += liters
+
+    z_score = stats.z_score(state["total"])
+    if z_score is None or z_score <= ANOMALY_Z_THRESHOLD or state["flagged"]:  # Only unusually high days, once
+        return None
+    state["flagged"] = True
+    return state["total"], stats.mean, z_score
+
+
+def score_price(state: dict, price: float):
+    """Adds a price per liter to the price state and returns (expected, z_score) if it is unusual."""
+    stats = EWMA(*state["stats"])
+    z_score = stats.z_score(price)
+    expected = stats.mean
+    stats.add(price)
+    state["stats"] = stats.as_list()
+    if z_score is None or abs(z_score) <= ANOMALY_Z_THRESHOLD:  # Too cheap is as odd as too dear
+        return None
+    return expected, z_score
+
+
+# ------------------------
+# Write-Path Hooks
+# ------------------------
+# Called after entries are committed. Only flagged entries write a row.
+def observe_consumptions(db: Session, user_id: int, entries):
+    """Scores committed consumption entries, given as (id, date, liters)."""
+    key = _cache_key(user_id, "liters")
+    for entry_id, day, liters in sorted(entries, key=lambda entry: (entry[1], entry[0])):
+        flagged = _update(
+            key,
+            lambda: _warm_up_liters(db, user_id, entry_id, day),
+            lambda state, warm: score_liters(state, day, liters, counted=not warm),
+        )
+        with _lock:
+            detector_stats["observed"] += 1
+            if flagged:
+                detector_stats["flagged"] += 1
+        if flagged:
+            _record(db, user_id, "liters", entry_id, day, *flagged)
+
+
+def observe_consumption(db: Session, user_id: int, entry: ConsumptionEntry):
+    observe_consumptions(db, user_id, [(entry.id, entry.date, entry.liters_consumed)])
+
+
+def observe_spendings(db: Session, user_id: int, entries):
+    """Scores committed spending entries, given as (id, date, amount_spent, liters)."""
+    key = _cache_key(user_id, "price_per_liter")
+    for entry_id, day, amount, liters in sorted(entries, key=lambda entry: (entry[1], entry[0])):
+        if not liters:
+            continue
+        price = amount / liters
+        flagged = _update(
+            key,
+            lambda: _warm_up_prices(db, user_id, entry_id, day),
+            lambda state, warm: score_price(state, price),
+        )
+        with _lock:
+            detector_stats["observed"] += 1
+            if flagged:
+                detector_stats["flagged"] += 1
+        if flagged:
+            _record(db, user_id, "price_per_liter", entry_id, day, price, *flagged)
+
+
+def observe_spending(db: Session, user_id: int, entry: SpendingEntry):
+    observe_spendings(db, user_id, [(entry.id, entry.date, entry.amount_spent, entry.liters)])
+
+
+def entries_changed(db: Session, user_id: int, metric: str, old_entries):
+    """
+    Called after entries are edited or deleted, with the (id, date, value)
+    each had before. Drops the anomalies they triggered, and takes liters of
+    the latest day out of its running total. Values of earlier days stay in
+    the moving statistics rather than relearning them from history: their
+    weight shrinks by (1 - ANOMALY_ALPHA) with every later day. Edited
+    entries are then observed again by the caller.
+    """
+    old_entries = list(old_entries)
+    try:
+        dropped = db.query(EntryAnomaly).filter(
+            EntryAnomaly.user_id == user_id,
+            EntryAnomaly.metric == metric,
+            EntryAnomaly.entry_id.in_([entry_id for entry_id, _, _ in old_entries]),
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()  # The entries themselves are already committed
+        logger.error(f"Failed to drop {metric} anomalies for user {user_id}: {e}")
+        dropped = 0
+    if metric != "liters":
+        return
+
+    def take_out(state, warm):
+        for _, day, liters in old_entries:
+            if day == state["day"]:
+                state["total"] = max(state["total"] - liters, 0.0)
+                if dropped:
+                    state["flagged"] = False  # The day may be flagged again
+
+    _update(_cache_key(user_id, "liters"), None, take_out)
+
+
+def forget(user_id: int):
+    cache.invalidate(_cache_key(user_id, "liters"))
+    cache.invalidate(_cache_key(user_id, "price_per_liter"))
+
+
+def stats():
+    with _lock:
+        return {**detector_stats, "shared": cache.shared}
@@ -0,0 +1,164 @@
+from sqlalchemy import select, union_all, text
+from sqlalchemy.orm import Session, aliased
+from datetime import date
+from models import (
+    ConsumptionEntry,
+    SpendingEntry,
+    ConsumptionEntryArchive,
+    SpendingEntryArchive,
+)
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Archive Configuration
+# ------------------------
+
+# Whole months older than this move to the archive. Never less than a year,
+# so current week/month/year queries can keep reading only the hot tables.
+ARCHIVE_HORIZON_MONTHS = max(int(os.getenv("ARCHIVE_HORIZON_MONTHS", 24)), 12)
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", 5000))
+
+_CONSUMPTION_COLUMNS = ("id", "user_id", "date", "liters_consumed", "notes", "created_at")
+_SPENDING_COLUMNS = ("id", "user_id", "date", "amount_spent", "liters", "store", "city", "notes", "created_at")
+
+
+def archive_boundary(today: date = None) -> date:
+    """First day of the oldest month that stays in the hot tables."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - ARCHIVE_HORIZON_MONTHS
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# ------------------------
+# Transparent Reads
+# ------------------------
+def _all_entries(model, archive_model, columns):
+    """
+    An alias of `model` over hot UNION ALL archived rows. Queries written
+    against it look exactly like queries against the hot table.
+    """
+    hot = select(*[model.__table__.c[name] for name in columns])
+    cold = select(*[archive_model.__table__.c[name] for name in columns])
+    return aliased(model, union_all(hot, cold).subquery(f"all_{model.__tablename__}"), adapt_on_names=True)
+
+
+# Use for per-entry or per-day reads that may reach past the archive boundary
+AllConsumptionEntries = _all_entries(ConsumptionEntry, ConsumptionEntryArchive, _CONSUMPTION_COLUMNS)
+AllSpendingEntries = _all_entries(SpendingEntry, SpendingEntryArchive, _SPENDING_COLUMNS)
+
+
+# ------------------------
+# Read-Only Archive
+# ------------------------
+# Archived entries are folded into the monthly summaries, which cannot take an
+# edit back out exactly (e.g. a month's maximum), so they are listed but never
+# changed. Writes that target one answer 409 rather than 404.
+_ARCHIVE_MODELS = {ConsumptionEntry: ConsumptionEntryArchive, SpendingEntry: SpendingEntryArchive}
+
+
+def archived_ids(db: Session, model, user_id: int, ids) -> set:
+    """Returns which of `ids` are archived entries of the user."""
+    archive_model = _ARCHIVE_MODELS[model]
+    ids = list(ids)
+    if not ids:
+        return set()
+    return {
+        entry_id
+        for (entry_id,) in db.query(archive_model.id).filter(archive_model.user_id == user_id, archive_model.id.in_(ids))
+    }
+
+
+# ------------------------
+# Archival Job
+# ------------------------
+
+# Each statement moves one chunk and folds it into the monthly summaries atomically
+_ARCHIVE_STATEMENTS = {
+    "consumption_entries": """
+        WITH moved AS (
+            DELETE FROM consumption_entries
+            WHERE date < :boundary
+              AND id IN (SELECT id FROM consumption_entries WHERE date < :boundary ORDER BY id LIMIT :chunk)
+            RETURNING id, user_id, date, liters_consumed, notes, created_at
+        ), archived AS (
+            INSERT INTO consumption_entries_archive (id, user_id, date, liters_consumed, notes, created_at)
+            SELECT id, user_id, date, liters_consumed, notes, created_at FROM moved
+        ), summarized AS (
+            INSERT INTO consumption_monthly_summaries (user_id, month, total_liters, entry_count, max_liters)
+            SELECT user_id, date_trunc('month', date)::date, sum(liters_consumed), count(*), max(liters_consumed)
+            FROM moved
+            GROUP BY user_id, date_trunc('month', date)
+            ON CONFLICT (user_id, month) DO UPDATE SET
+                total_liters = consumption_monthly_summaries.total_liters + excluded.total_liters,
+                entry_count = consumption_monthly_summaries.entry_count + excluded.entry_count,
+                max_liters = greatest(consumption_monthly_summaries.max_liters, excluded.max_liters)
+        )
+        SELECT count(*) FROM moved
+    """,
+    "spending_entries": """
+        WITH moved AS (
+            DELETE FROM spending_entries
+            WHERE date < :boundary
+              AND id IN (SELECT id FROM spending_entries WHERE date < :boundary ORDER BY id LIMIT :chunk)
+            RETURNING id, user_id, date, amount_spent, liters, store, city, notes, created_at
+        ), archived AS (
+            INSERT INTO spending_entries_archive (id, user_id, date, amount_spent, liters, store, city, notes, created_at)
+            SELECT id, user_id, date, amount_spent, liters, store, city, notes, created_at FROM moved
+        ), summarized AS (
+            INSERT INTO spending_monthly_summaries (user_id, month, total_spent, total_liters, entry_count, max_spent)
+            SELECT user_id, date_trunc('month', date)::date, sum(amount_spent), sum(liters), count(*), max(amount_spent)
+            FROM moved
+            GROUP BY user_id, date_trunc('month', date)
+            ON CONFLICT (user_id, month) DO UPDATE SET
+                total_spent = spending_monthly_summaries.total_spent + excluded.total_spent,
+                total_liters = spending_monthly_summaries.total_liters + excluded.total_liters,
+                entry_count = spending_monthly_summaries.entry_count + excluded.entry_count,
+                max_spent = greatest(spending_monthly_summaries.max_spent, excluded.max_spent)
+        )
+        SELECT count(*) FROM moved
+    """,
+}
+
+
+def run_archival(db: Session, chunk_size: int = ARCHIVE_CHUNK_SIZE):
+    """
+    Moves entries dated before the archive boundary into the archive tables in
+    bounded chunks, one short transaction each. Safe to interrupt and re-run.
+    """
+    boundary = archive_boundary()
+    moved = {}
+    for table, statement in _ARCHIVE_STATEMENTS.items():
+        moved[table] = 0
+        while True:
+            try:
+                count = db.execute(text(statement), {"boundary": boundary, "chunk": chunk_size}).scalar()
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Archiving {table} failed after {moved[table]} rows: {e}")
+                break
+            moved[table] += count
+            if count < chunk_size:
+                break
+        logger.info(f"Archived {moved[table]} rows from {table} older than {boundary}")
+    return {"boundary": str(boundary), "archived": moved}
+
+
+def run_with_new_session():
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return run_archival(db)
+    finally:
+        db.close()
+
+
+# ------------------------
+# Archival Command
+# ------------------------
+if __name__ == "__main__":
+    run_with_new_session()
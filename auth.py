@@ -1,11 +1,10 @@
 from fastapi import HTTPException, Depends, APIRouter, Body
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
-from database import SessionLocal
+from dependencies import get_db, get_current_user  # Shared request-scoped session and auth
 from models import User
 from dotenv import load_dotenv
 import os
@@ -27,15 +26,6 @@ if not SECRET_KEY:
 
 # Password Hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-
-# Dependency for Database Session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # API Router for Authentication
 auth_router = APIRouter()
@@ -49,7 +39,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     """
     normalized_email = form_data.username.strip().lower()  # Normalize email
     user = db.query(User).filter(func.lower(User.email) == normalized_email).first()
-    if not user or not verify_password(form_data.password, user.password):
+    if not user or user.disabled_at is not None or not verify_password(form_data.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     tokens = create_tokens(data={"sub": str(user.id)})
@@ -72,7 +62,7 @@ def refresh_token(refresh_token: str = Body(...), db: Session = Depends(get_db))
             raise HTTPException(status_code=401, detail="Invalid refresh token")
 
         user = db.query(User).filter(User.id == int(user_id)).first()
-        if not user:
+        if not user or user.disabled_at is not None:
             raise HTTPException(status_code=401, detail="User not found")
 
         new_access_token = create_access_token(data={"sub": user_id})
@@ -102,7 +92,7 @@ def authenticate_user(db: Session, email: str, password: str) -> User:
     """
     normalized_email = email.strip().lower()  # Normalize email
     user = db.query(User).filter(func.lower(User.email) == normalized_email).first()
-    if not user or not verify_password(password, user.password):
+    if not user or user.disabled_at is not None or not verify_password(password, user.password):
         return None
     return user
 
@@ -115,29 +105,6 @@ def create_tokens(data: dict) -> dict:
     refresh_token = create_refresh_token(data)
     return {"access_token": access_token, "refresh_token": refresh_token}
 
-# Get Current User from Token
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    """
-    Extracts and validates the current user from the token.
-    """
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Invalid or expired token. Please log in again.",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = decode_token(token)  # Use helper function
-        user_id: str = payload.get("sub")
-        if not user_id:
-            raise credentials_exception
-    except ValueError as e:
-        raise credentials_exception
-
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if not user:
-        raise credentials_exception
-    return user
-
 # Exception Handling for Credentials
 def handle_credentials_exception() -> HTTPException:
     """
@@ -5,6 +5,7 @@ SECRET_KEY = "q0W7uk0KTEjyW7Ob"  # Keep this consistent
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+STREAM_TICKET_EXPIRE_SECONDS = 30
 
 # Create Access Token
 def create_access_token(data: dict):
@@ -20,6 +21,14 @@ def create_refresh_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Create Stream Ticket
+# Short-lived and redeemed once (see routes/live.py), so it can travel in a
+# URL where an access token would end up in logs
+def create_stream_ticket(user_id: int, jti: str, version: int):
+    expire = datetime.utcnow() + timedelta(seconds=STREAM_TICKET_EXPIRE_SECONDS)
+    to_encode = {"sub": str(user_id), "type": "stream", "jti": jti, "ver": version, "exp": expire}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
 # Decode and Verify Token
 def decode_token(token: str):
     try:
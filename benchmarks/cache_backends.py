@@ -0,0 +1,86 @@
+"""
+Cache backend benchmark.
+
+Times hits, misses, sets and invalidations on each backend in cache.py, then
+checks that an invalidation made in one process is seen by another through
+the shared SQLite backend.
+
+    python benchmarks/cache_backends.py --keys 10000 --reads 100000
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import LRUCache, SQLiteCache  # noqa: E402
+
+# Roughly the size of a fitted forecast state
+SAMPLE_VALUE = {
+    "fitted_on": "2026-10-19",
+    "liters": {"month_to_date": 41.5, "year_to_date": 512.0, "daily_mean": 2.1, "daily_std": 0.4},
+    "spending": {"month_to_date": 12.3, "year_to_date": 150.2, "daily_mean": 0.6, "daily_std": 0.2},
+    "monthly_goal": 60.0,
+}
+
+
+def _timed(operation, keys):
+    samples = []
+    for key in keys:
+        started = time.perf_counter()
+        operation(key)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 2),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 2),
+    }
+
+
+def run(backend, keys: int, reads: int):
+    names = [f"forecast:{i}" for i in range(keys)]
+    results = {"set": _timed(lambda key: backend.set(key, SAMPLE_VALUE), names)}
+    results["hit"] = _timed(backend.get, random.choices(names, k=reads))
+    results["invalidate"] = _timed(backend.invalidate, names[: keys // 10])
+    results["miss"] = _timed(backend.get, names[: keys // 10])
+    return results
+
+
+def _invalidate_in_child(path, key):
+    SQLiteCache(path).invalidate(key)
+
+
+def check_cross_process(path: str):
+    parent = SQLiteCache(path)
+    version = parent.version("forecast:shared")
+    parent.set("forecast:shared", SAMPLE_VALUE, version=version)
+
+    child = multiprocessing.Process(target=_invalidate_in_child, args=(path, "forecast:shared"))
+    child.start()
+    child.join()
+
+    assert parent.get("forecast:shared") is None, "invalidation not visible to the parent"
+    assert not parent.set("forecast:shared", SAMPLE_VALUE, version=version), "stale write accepted"
+    print("cross-process invalidation: ok")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite3")
+        backends = {"memory": LRUCache(max_entries=args.keys * 2), "sqlite": SQLiteCache(path)}
+        for name, backend in backends.items():
+            print(f"{name}:", run(backend, args.keys, args.reads))
+        check_cross_process(path)
+
+
+if __name__ == "__main__":
+    main()
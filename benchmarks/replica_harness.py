@@ -0,0 +1,128 @@
+"""
+Read-replica routing harness.
+
+Runs the app against two databases, a primary and a "replica" that never
+receives the primary's writes, so every read shows which one served it. It
+checks that a user reads their own write back from the primary within the
+sticky window, also on a worker that did not handle the write, and that reads
+go to the replica once the window has passed.
+It uses two temporary SQLite files by default. Any two empty local databases
+work as well, e.g. two Postgres databases:
+
+    python benchmarks/replica_harness.py
+    python benchmarks/replica_harness.py --primary-url postgresql://localhost/app --replica-url postgresql://localhost/app_replica
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--primary-url")
+    parser.add_argument("--replica-url")
+    parser.add_argument("--max-lag", type=float, default=1.0, help="REPLICA_MAX_LAG_SECONDS, and so the sticky window")
+    return parser.parse_args()
+
+
+args = parse_args()
+workdir = tempfile.mkdtemp(prefix="replica_harness_")
+# Must be set before the app is imported
+os.environ["DATABASE_URL"] = args.primary_url or f"sqlite:///{workdir}/primary.sqlite3"
+os.environ["READ_REPLICA_URLS"] = args.replica_url or f"sqlite:///{workdir}/replica.sqlite3"
+os.environ["REPLICA_MAX_LAG_SECONDS"] = str(args.max_lag)
+os.environ["RATE_LIMITS_ENABLED"] = "false"
+os.environ["COALESCE_REQUESTS"] = "false"
+# Shared by workers, which is what carries a write over to the others
+os.environ["CACHE_BACKEND"] = "sqlite"
+os.environ["CACHE_SQLITE_PATH"] = f"{workdir}/cache.sqlite3"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from auth_helpers import create_access_token  # noqa: E402
+from models import Base, User, RoleEnum  # noqa: E402
+
+served_by = []  # "primary" or "replica", one per statement
+
+
+def _record(name):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        served_by.append(name)
+    return before_cursor_execute
+
+
+def seed_user(engine, user_id: int):
+    """Creates the same user on both databases, as replication would have."""
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add(User(
+            id=user_id, first_name="Replica", last_name=str(user_id), email=f"replica{user_id}@example.com",
+            password="x", date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+        ))
+        db.commit()
+
+
+def history_liters(client, headers):
+    """Total liters in the user's consumption history, and which database served the read."""
+    served_by.clear()
+    response = client.get("/consumption/history", headers=headers)
+    response.raise_for_status()
+    total = sum(month["total_consumption"] for month in response.json()["data"])
+    return total, set(served_by)
+
+
+def main_():
+    logging.disable(logging.INFO)  # The engine echoes every statement otherwise
+    replica = database.replica_engines[0]
+    event.listen(database.engine, "before_cursor_execute", _record("primary"))
+    event.listen(replica, "before_cursor_execute", _record("replica"))
+
+    writer, reader = 1, 2
+    for user_id in (writer, reader):
+        seed_user(database.engine, user_id)
+        seed_user(replica, user_id)
+    print(f"Replica health: {database.check_replicas()}")
+
+    client = TestClient(main.app)
+    headers = {user_id: {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"} for user_id in (writer, reader)}
+    failures = []
+
+    def expect(name, actual, wanted):
+        status = "ok" if actual == wanted else "FAILED"
+        print(f"{name:55} {str(actual):22} {status}")
+        if actual != wanted:
+            failures.append(f"{name}: got {actual}, expected {wanted}")
+
+    response = client.post("/consumption", json={"date": str(date.today()), "liters_consumed": 2.5}, headers=headers[writer])
+    response.raise_for_status()
+
+    expect("writer reads own write within the sticky window", history_liters(client, headers[writer]), (2.5, {"primary"}))
+    database._last_write.clear()  # As seen by a worker that did not handle the write
+    expect("writer reads own write on another worker", history_liters(client, headers[writer]), (2.5, {"primary"}))
+    expect("other user's read goes to the replica", history_liters(client, headers[reader]), (0, {"replica"}))
+
+    time.sleep(database.READ_STICKY_SECONDS + 0.1)
+    # The replica never received the write, so this read cannot see it: the sticky
+    # window, which is at least the replica lag allowed, is what keeps it visible
+    expect("writer's read goes to the replica after the window", history_liters(client, headers[writer]), (0, {"replica"}))
+
+    print(f"Sticky window {database.READ_STICKY_SECONDS}s, max replica lag {database.REPLICA_MAX_LAG_SECONDS}s")
+    if failures:
+        print(f"\n{len(failures)} failures:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll checks passed")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,190 @@
+"""
+In-memory SQLite benchmark and regression harness.
+
+Seeds an in-memory database, calls the user-facing endpoints through the
+ASGI app, checks their totals against the seeded data and reports latency.
+Needs no Postgres; exits non-zero if an endpoint fails or returns wrong totals.
+The defaults are sized for CI; raise them for a load profile.
+
+    python benchmarks/sqlite_harness.py
+    python benchmarks/sqlite_harness.py --users 20 --days 400 --rounds 5
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+os.environ["DATABASE_URL"] = "sqlite://"  # Must be set before the app is imported
+os.environ["RATE_LIMITS_ENABLED"] = "false"  # Every request comes from the same few users
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+import main  # noqa: E402
+from auth_helpers import create_access_token  # noqa: E402
+from database import SessionLocal, init_db  # noqa: E402
+from models import User, RoleEnum, ConsumptionEntry, SpendingEntry  # noqa: E402
+
+CITIES = ("Oslo", "Bergen", "Trondheim")
+STORES = ("Kiwi", "Rema", "Coop")
+
+
+def seed(users: int, days: int, rng: random.Random):
+    """Inserts users with one to three entries per active day; returns the expected totals."""
+    today = date.today()
+    expected = {}
+    db = SessionLocal()
+    try:
+        for n in range(users):
+            user = User(
+                first_name="Bench", last_name=str(n), email=f"bench{n}@example.com", password="x",
+                date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0, income=5000.0,
+            )
+            db.add(user)
+            db.flush()
+
+            consumption, spending = [], []
+            liters_by_month, spent_by_month = defaultdict(float), defaultdict(float)
+            for offset in range(days):
+                day = today - timedelta(days=offset)
+                if rng.random() < 0.2:
+                    continue
+                for _ in range(rng.randint(1, 3)):
+                    liters = round(rng.uniform(0.2, 3.0), 2)
+                    consumption.append({
+                        "user_id": user.id, "date": day, "liters_consumed": liters,
+                        "created_at": datetime.combine(day, datetime.min.time()),
+                    })
+                    liters_by_month[day.strftime("%Y-%m")] += liters
+                if rng.random() < 0.3:
+                    spent = round(rng.uniform(1, 20), 2)
+                    spending.append({
+                        "user_id": user.id, "date": day, "amount_spent": spent,
+                        "liters": round(rng.uniform(1, 10), 2), "store": rng.choice(STORES),
+                        "city": rng.choice(CITIES), "created_at": datetime.combine(day, datetime.min.time()),
+                    })
+                    spent_by_month[day.strftime("%Y-%m")] += spent
+
+            db.execute(insert(ConsumptionEntry), consumption)
+            if spending:
+                db.execute(insert(SpendingEntry), spending)
+            expected[user.id] = {
+                "liters_by_month": liters_by_month,
+                "spent_by_month": spent_by_month,
+                "active_days": len({row["date"] for row in consumption}),
+            }
+        db.commit()
+    finally:
+        db.close()
+    return expected
+
+
+def _history(client, path, headers):
+    rows, page = [], 1
+    while True:
+        body = client.get(path, params={"page": page, "limit": 12}, headers=headers).json()
+        rows.extend(body["data"])
+        if page >= body["total_pages"]:
+            return rows
+        page += 1
+
+
+def check(client, user_id, headers, expected, failures):
+    """Compares endpoint totals with the seeded data."""
+    def expect(name, actual, wanted):
+        if abs(actual - wanted) > 0.01:
+            failures.append(f"user {user_id}: {name} is {actual}, expected {wanted}")
+
+    liters_by_month = expected["liters_by_month"]
+    spent_by_month = expected["spent_by_month"]
+    this_month = date.today().strftime("%Y-%m")
+
+    history = _history(client, "/consumption/history", headers)
+    expect("consumption history months", len(history), len(liters_by_month))
+    expect("consumption history total", sum(m["total_consumption"] for m in history), sum(liters_by_month.values()))
+    spending_history = _history(client, "/spending/history", headers)
+    expect("spending history total", sum(m["total_spending"] for m in spending_history), sum(spent_by_month.values()))
+
+    params = {"user_id": user_id}
+    milestones = client.get("/analytics/milestones", params=params, headers=headers).json()
+    expect("milestones total", milestones["total_consumption"], sum(liters_by_month.values()))
+    trends = client.get("/analytics/daily-trends", params=params, headers=headers).json()["trends"]
+    expect("daily trend days", len(trends), expected["active_days"])
+    comparison = client.get(
+        "/analytics/compare-months", params={**params, "months[]": [this_month]}, headers=headers
+    ).json()["comparison"][0]
+    expect("compare-months liters", comparison["consumption"], liters_by_month[this_month])
+    expect("compare-months spending", comparison["spending"], spent_by_month[this_month])
+    annual = client.get("/analytics/annual-overview", params=params, headers=headers).json()["monthly_data"]
+    this_year = [month for month in liters_by_month if month.startswith(str(date.today().year))]
+    expect("annual-overview liters", sum(m["liters"] for m in annual), sum(liters_by_month[m] for m in this_year))
+    expect("annual-overview spending", sum(m["spending"] for m in annual),
+           sum(spent for month, spent in spent_by_month.items() if month.startswith(str(date.today().year))))
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--days", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # The engine echoes every statement otherwise
+    init_db()
+    started = time.perf_counter()
+    expected = seed(args.users, args.days, random.Random(args.seed))
+    print(f"Seeded {args.users} users x {args.days} days in {time.perf_counter() - started:.2f}s")
+
+    # No context manager: startup jobs (partitions, archival) are Postgres-only
+    client = TestClient(main.app)
+    endpoints = [
+        ("/dashboard", False),
+        ("/user/profile", False),
+        ("/consumption/history", False),
+        ("/spending/history", False),
+        ("/analytics/daily-trends", True),
+        ("/analytics/weekly-overview", True),
+        ("/analytics/monthly-trends", True),
+        ("/analytics/annual-overview", True),
+        ("/analytics/spending-percentage", True),
+        ("/analytics/milestones", True),
+        ("/analytics/top-days", True),
+        ("/analytics/average-daily-consumption", True),
+        ("/analytics/prices", True),
+        ("/analytics/forecast", True),
+    ]
+
+    timings, failures = defaultdict(list), []
+    for user_id in expected:
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+        for _ in range(args.rounds):
+            for path, takes_user_id in endpoints:
+                request_started = time.perf_counter()
+                response = client.get(path, params={"user_id": user_id} if takes_user_id else None, headers=headers)
+                timings[path].append((time.perf_counter() - request_started) * 1000)
+                if response.status_code != 200:
+                    failures.append(f"user {user_id}: {path} returned {response.status_code}: {response.text[:200]}")
+        check(client, user_id, headers, expected[user_id], failures)
+
+    print(f"{'endpoint':40} {'p50 ms':>8} {'p95 ms':>8}")
+    for path, samples in timings.items():
+        samples.sort()
+        print(f"{path:40} {statistics.median(samples):8.2f} {samples[int(len(samples) * 0.95) - 1]:8.2f}")
+
+    if failures:
+        print(f"\n{len(failures)} failures:")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nAll checks passed in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main_()
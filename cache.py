@@ -0,0 +1,327 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+import numpy as np
+import sqlite3
+import threading
+import json
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Cache Configuration
+# ------------------------
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # "memory" (per process) or "sqlite" (shared by workers)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))  # Memory backend only
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 86400))
+# Required by the SQLite backend. Its directory should belong to the app's
+# user: the file is created readable by that user only, and a file owned by
+# anyone else is refused.
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH")
+CACHE_PRUNE_EVERY = 1000  # SQLite backend: drop expired rows every N writes
+
+
+# ------------------------
+# Backend Interface
+# ------------------------
+class CacheBackend(ABC):
+    """
+    Key/value cache with versioned invalidation.
+
+    Every key has a version that `invalidate` advances. A writer reads the
+    version before computing a value and passes it to `set`, which is refused
+    if the key was invalidated in the meantime. A value computed from data that
+    was already stale can therefore never overwrite an invalidation, whichever
+    process made it. Values must not be None, which `get` uses for a miss.
+
+    `invalidate` returns the key's (previous, new) versions, read atomically,
+    so a caller can tell whether anyone else invalidated the key since it last
+    looked. Both are None if the invalidation failed.
+
+    `shared` tells whether every worker process sees the same versions.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str):
+        ...
+
+    @abstractmethod
+    def version(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value, ttl: float = None, version: int = None) -> bool:
+        ...
+
+    @abstractmethod
+    def invalidate(self, key: str):
+        """Returns (previous version, new version)."""
+
+    def get_or_compute(self, key: str, compute, ttl: float = None):
+        value = self.get(key)
+        if value is None:
+            version = self.version(key)  # Read before computing, see class docstring
+            value = compute()
+            self.set(key, value, ttl=ttl, version=version)
+        return value
+
+
+# ------------------------
+# In-Process LRU
+# ------------------------
+class LRUCache(CacheBackend):
+    """Per-process cache; fastest, but each worker holds its own copy."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> [value, version, expires_at]
+        self._clock = 0  # Source of versions, so new ones always exceed evicted ones
+        self._floor = 0  # Highest version of an evicted key; the version of absent keys
+
+    def _version(self, key):
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else self._floor
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._floor = max(self._floor, evicted[1])
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is None:
+                return None
+            if entry[2] <= time.monotonic():
+                entry[0] = None
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def version(self, key: str) -> int:
+        with self._lock:
+            return self._version(key)
+
+    def set(self, key: str, value, ttl: float = None, version: int = None) -> bool:
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            current = self._version(key)
+            if version is not None and version != current:
+                return False
+            self._store(key, [value, current, expires_at])
+            return True
+
+    def invalidate(self, key: str):
+        with self._lock:
+            previous = self._version(key)
+            self._clock += 1
+            self._store(key, [None, self._clock, float("inf")])
+            return previous, self._clock
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+# ------------------------
+# Shared SQLite Cache
+# ------------------------
+# Values are stored as JSON, never pickled: anyone able to write the file
+# must not be able to run code in the app by planting a value.
+def _encode_default(value):
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot cache a value of type {type(value).__name__}")
+
+
+def _decode_object(obj):
+    if obj.keys() == {"__date__"}:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+def _open_private(path: str):
+    """Creates the cache file readable by this user only, and refuses one owned by anyone else."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if os.fstat(fd).st_uid != os.getuid():
+            raise PermissionError(f"Cache file {path} is not owned by the app's user")
+        os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache shared by every worker process on the host through one SQLite file
+    in WAL mode. Hits cost a primary-key read, with no external service.
+
+    A failed invalidation is logged and retried on the next write, and the key
+    reads as a miss in this process until then, so its value cannot be served
+    stale until it expires.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, ttl: float = CACHE_TTL_SECONDS):
+        _open_private(path)
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._pending_lock = threading.Lock()
+        self._pending = set()  # Keys whose invalidation failed
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB, version INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO cache_meta VALUES ('clock', 0), ('floor', 0)")
+
+    def _connection(self):
+        # One connection per thread and process; connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Durability is not needed for a cache
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")  # Serializes version checks across processes
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _version(self, conn, key):
+        row = conn.execute("SELECT version FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            row = conn.execute("SELECT value FROM cache_meta WHERE name = 'floor'").fetchone()
+        return row[0]
+
+    def _prune(self, conn):
+        now = time.time()
+        conn.execute(
+            "UPDATE cache_meta SET value = max(value, "
+            "(SELECT coalesce(max(version), 0) FROM cache_entries WHERE expires_at <= ?)) WHERE name = 'floor'",
+            (now,),
+        )
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+    def _retry_pending(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        for key in pending:
+            self.invalidate(key)
+
+    def get(self, key: str):
+        if key in self._pending:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Cache read of {key} failed: {e}")
+            return None
+        if row is None or row[0] is None or row[1] <= time.time():
+            return None
+        try:
+            return json.loads(row[0], object_hook=_decode_object)
+        except ValueError:  # E.g. written by an older version; recomputed and overwritten
+            logger.warning(f"Cache entry {key} is unreadable, ignoring it")
+            return None
+
+    def version(self, key: str) -> int:
+        try:
+            return self._version(self._connection(), key)
+        except sqlite3.Error as e:
+            logger.error(f"Cache version read of {key} failed: {e}")
+            return -1  # Matches no stored version, so the following set is refused
+
+    def set(self, key: str, value, ttl: float = None, version: int = None) -> bool:
+        if self._pending:
+            self._retry_pending()
+        if key in self._pending:
+            return False
+        payload = json.dumps(value, default=_encode_default)
+        try:
+            with self._transaction() as conn:
+                current = self._version(conn, key)
+                if version is not None and version != current:
+                    return False
+                conn.execute(
+                    "INSERT INTO cache_entries VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE "
+                    "SET value = excluded.value, expires_at = excluded.expires_at",
+                    (key, payload, current, time.time() + (ttl or self.ttl)),
+                )
+                self._writes += 1
+                if self._writes % CACHE_PRUNE_EVERY == 0:
+                    self._prune(conn)
+                return True
+        except sqlite3.Error as e:
+            logger.error(f"Cache write of {key} failed: {e}")
+            return False
+
+    def invalidate(self, key: str):
+        try:
+            with self._transaction() as conn:
+                previous = self._version(conn, key)
+                conn.execute("UPDATE cache_meta SET value = value + 1 WHERE name = 'clock'")
+                # Kept until it expires, so a stale writer still sees the new version
+                conn.execute(
+                    "INSERT INTO cache_entries VALUES (?, NULL, (SELECT value FROM cache_meta WHERE name = 'clock'), ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = NULL, version = excluded.version, "
+                    "expires_at = excluded.expires_at",
+                    (key, time.time() + self.ttl),
+                )
+                current = self._version(conn, key)
+        except sqlite3.Error as e:
+            logger.error(f"Cache invalidation of {key} failed, retrying on the next write: {e}")
+            with self._pending_lock:
+                self._pending.add(key)
+            return None, None
+        with self._pending_lock:
+            self._pending.discard(key)
+        return previous, current
+
+    def stats(self):
+        entries = self._connection().execute("SELECT count(*) FROM cache_entries").fetchone()[0]
+        return {"backend": "sqlite", "entries": entries, "path": self.path, "pending_invalidations": len(self._pending)}
+
+
+# ------------------------
+# Application Cache
+# ------------------------
+def make_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    if name == "sqlite":
+        if not CACHE_SQLITE_PATH:
+            raise RuntimeError("CACHE_SQLITE_PATH must be set for CACHE_BACKEND=sqlite")
+        return SQLiteCache(CACHE_SQLITE_PATH)
+    if name != "memory":
+        logger.warning(f"Unknown CACHE_BACKEND {name!r}, using the in-process cache")
+    return LRUCache()
+
+
+cache = make_backend()
@@ -1,46 +1,78 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import User, RoleEnum
-from schemas import TokenData
-from datetime import datetime, timedelta
-from typing import Optional
+from auth_helpers import SECRET_KEY, ALGORITHM, decode_token
 
-# Secret key and algorithm for JWT
-SECRET_KEY = "q0W7uk0KTEjyW7Ob"
-ALGORITHM = "HS256"
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Methods whose queries may be served by a read replica
+READ_ONLY_METHODS = ("GET", "HEAD")
+# Admin pages act on what they show (disable, purge, rebuild), so they always read the primary
+PRIMARY_ONLY_PATH_PREFIXES = ("/admin",)
 
 
 # Get database session
-def get_db():
+def get_db(request: Request):
+    """
+    The one session per request. Every dependency and handler that needs the
+    database depends on this function, so FastAPI resolves it once per request
+    and auth and handlers share the same session and pooled connection.
+    Reads of GET requests may go to a replica (see database.RoutingSession),
+    except under /admin.
+    """
     db = SessionLocal()
+    db.info["read_only"] = (
+        request.method in READ_ONLY_METHODS
+        and not request.url.path.startswith(PRIMARY_ONLY_PATH_PREFIXES)
+    )
+    db.info["user_id"] = request_user_id(request)  # Keeps the user's own recent writes visible
     try:
         yield db
     finally:
         db.close()
 
+# Identify the requesting user without a database round trip
+def token_user_id(request: Request):
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        try:
+            return int(jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub"))
+        except (JWTError, TypeError, ValueError):
+            pass
+    return None
+
+def request_user_id(request: Request):
+    user_id = token_user_id(request)
+    if user_id is not None:
+        return user_id
+    user_id = request.query_params.get("user_id")
+    return int(user_id) if user_id and user_id.isdigit() else None
+
 # Decode Token and Extract User
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    """
+    Extracts and validates the current user from the token.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
+        detail="Invalid or expired token. Please log in again.",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        payload = decode_token(token)
+        user_id: str = payload.get("sub")
+        # Stream tickets travel in URLs and only open /dashboard/stream
+        if not user_id or payload.get("type") == "stream":
             raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
+    except ValueError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == token_data.email).first()
-    if user is None:
+    # Tokens are issued with the user id as subject (see auth_helpers)
+    user = db.query(User).filter(User.id == int(user_id)).first()
+    if user is None or user.disabled_at is not None:  # Disabled accounts are awaiting purge
         raise credentials_exception
     return user
 
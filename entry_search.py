@@ -0,0 +1,77 @@
+from sqlalchemy import func, select, union_all, literal, literal_column, null, cast, Float, String
+from sqlalchemy.orm import Session
+from models import ConsumptionEntry, SpendingEntry, ConsumptionEntryArchive, SpendingEntryArchive
+from sql_expressions import text_search_match, text_search_rank, text_search_snippet
+
+# ------------------------
+# Entry Search
+# ------------------------
+# Each entry table has a generated search_vector column indexed together with
+# user_id (see the entry search migration), so a search reads only the
+# requesting user's matching rows. It is not mapped on the models: ORM loads
+# never need it, and SQLite databases do not have it.
+ENTRY_TYPES = ("consumption", "spending")
+
+_SEARCH_VECTOR = literal_column("search_vector")
+
+
+def _text(column):
+    return func.coalesce(column, literal_column("''"))
+
+
+def _consumption_document(table):
+    return _text(table.notes)
+
+
+def _spending_document(table):
+    # Same text as the search_vector expression: notes, then store and city
+    separator = literal_column("' '")
+    return _text(table.notes).concat(separator).concat(_text(table.store)).concat(separator).concat(_text(table.city))
+
+
+def _matches(entry_type: str, table, user_id: int, q: str):
+    document = _consumption_document(table) if entry_type == "consumption" else _spending_document(table)
+    return (
+        select(
+            literal(entry_type).label("type"),
+            table.id.label("id"),
+            table.date.label("date"),
+            (table.liters_consumed if entry_type == "consumption" else table.amount_spent).label("value"),
+            (cast(null(), Float) if entry_type == "consumption" else table.liters).label("liters"),
+            (cast(null(), String) if entry_type == "consumption" else table.store).label("store"),
+            (cast(null(), String) if entry_type == "consumption" else table.city).label("city"),
+            table.notes.label("notes"),
+            document.label("document"),
+            text_search_rank(_SEARCH_VECTOR, document, q).label("rank"),
+        )
+        .where(table.user_id == user_id)
+        .where(text_search_match(_SEARCH_VECTOR, document, q))
+    )
+
+
+def search_entries(db: Session, user_id: int, q: str, entry_type: str = None, page: int = 1, limit: int = 20):
+    """
+    Ranks the user's hot and archived entries against a web-style query
+    ("word", "exact phrase", -excluded, or). Snippets are only built for the
+    returned page, since highlighting is the costly part of a search.
+    """
+    tables = []
+    if entry_type in (None, "consumption"):
+        tables += [("consumption", ConsumptionEntry), ("consumption", ConsumptionEntryArchive)]
+    if entry_type in (None, "spending"):
+        tables += [("spending", SpendingEntry), ("spending", SpendingEntryArchive)]
+    matches = union_all(*[_matches(kind, table, user_id, q) for kind, table in tables]).subquery("matches")
+
+    total = db.scalar(select(func.count()).select_from(matches))
+    ranked = (
+        select(matches)
+        .order_by(matches.c.rank.desc(), matches.c.date.desc(), matches.c.id.desc())
+        .offset((page - 1) * limit)
+        .limit(limit)
+        .subquery("ranked")
+    )
+    rows = db.execute(
+        select(ranked, text_search_snippet(ranked.c.document, q).label("snippet"))
+        .order_by(ranked.c.rank.desc(), ranked.c.date.desc(), ranked.c.id.desc())
+    ).all()
+    return total, rows
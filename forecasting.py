@@ -0,0 +1,141 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from calendar import monthrange
+from models import User, ConsumptionEntry, SpendingEntry
+from cache import cache
+import numpy as np
+
+# ------------------------
+# Forecast Configuration
+# ------------------------
+FORECAST_WINDOW_DAYS = 28  # Rolling window used to estimate the daily rate
+CONFIDENCE_Z = 1.96  # ~95% confidence bands
+
+
+# ------------------------
+# Cache Invalidation
+# ------------------------
+def _cache_key(user_id: int) -> str:
+    return f"forecast:{user_id}"  # Fitted state, dropped on the user's next write
+
+
+def invalidate(user_id: int):
+    # The cache may be shared by all workers, so this reaches every process
+    cache.invalidate(_cache_key(user_id))
+
+
+# ------------------------
+# Fitting
+# ------------------------
+def _daily_series(db: Session, table, column, user_id: int, start: date, days: int):
+    """Loads a zero-filled daily series of `days` values starting at `start`."""
+    rows = (
+        db.query(table.date, func.sum(column))
+        .filter(table.user_id == user_id, table.date >= start, table.date < start + timedelta(days=days))
+        .group_by(table.date)
+        .all()
+    )
+    series = np.zeros(days)
+    if rows:
+        offsets = np.array([(row[0] - start).days for row in rows])
+        series[offsets] = np.array([row[1] or 0 for row in rows], dtype=float)
+    return series
+
+
+def _rolling_rate(series: np.ndarray, window: int):
+    """Rolling mean and standard deviation over the series; returns the latest values."""
+    window = min(window, len(series))
+    if window == 0:
+        return 0.0, 0.0
+    padded = np.concatenate(([0.0], series))
+    sums = np.cumsum(padded)
+    squares = np.cumsum(padded * padded)
+    rolling_mean = (sums[window:] - sums[:-window]) / window
+    rolling_var = (squares[window:] - squares[:-window]) / window - rolling_mean ** 2
+    return float(rolling_mean[-1]), float(np.sqrt(max(rolling_var[-1], 0.0)))
+
+
+def _fit(db: Session, user_id: int, today: date):
+    start = min(today.replace(month=1, day=1), today - timedelta(days=FORECAST_WINDOW_DAYS))
+    days = (today - start).days + 1  # Includes today
+
+    state = {"fitted_on": today}
+    series = {
+        "liters": _daily_series(db, ConsumptionEntry, ConsumptionEntry.liters_consumed, user_id, start, days),
+        "spending": _daily_series(db, SpendingEntry, SpendingEntry.amount_spent, user_id, start, days),
+    }
+
+    month_offset = (today.replace(day=1) - start).days
+    year_offset = (today.replace(month=1, day=1) - start).days
+    for name, values in series.items():
+        # Today is still in progress, so the rate is fitted on completed days only
+        mean, std = _rolling_rate(values[:-1], FORECAST_WINDOW_DAYS)
+        state[name] = {
+            "month_to_date": float(values[month_offset:].sum()),
+            "year_to_date": float(values[year_offset:].sum()),
+            "daily_mean": mean,
+            "daily_std": std,
+        }
+
+    user = db.query(User.monthly_goal).filter(User.id == user_id).first()
+    state["monthly_goal"] = user.monthly_goal if user else None
+    return state
+
+
+def get_fitted_state(db: Session, user_id: int):
+    today = date.today()
+    key = _cache_key(user_id)
+    state = cache.get(key)
+    if state is None or state["fitted_on"] != today:
+        version = cache.version(key)  # Read before fitting so a concurrent write wins
+        state = _fit(db, user_id, today)
+        cache.set(key, state, version=version)
+    return state
+
+
+# ------------------------
+# Projection
+# ------------------------
+def _project(observed: float, mean: float, std: float, remaining_days: int):
+    projected = observed + mean * remaining_days
+    margin = CONFIDENCE_Z * std * np.sqrt(remaining_days)
+    return {
+        "projected": round(projected, 2),
+        "lower": round(max(observed, projected - margin), 2),
+        "upper": round(projected + margin, 2),
+    }
+
+
+def forecast(db: Session, user_id: int):
+    state = get_fitted_state(db, user_id)
+    today = state["fitted_on"]
+    month_remaining = monthrange(today.year, today.month)[1] - today.day
+    year_remaining = (date(today.year, 12, 31) - today).days
+
+    result = {"as_of": str(today), "window_days": FORECAST_WINDOW_DAYS}
+    for name in ("liters", "spending"):
+        fitted = state[name]
+        result[name] = {
+            "daily_average": round(fitted["daily_mean"], 2),
+            "month_end": _project(fitted["month_to_date"], fitted["daily_mean"], fitted["daily_std"], month_remaining),
+            "year_end": _project(fitted["year_to_date"], fitted["daily_mean"], fitted["daily_std"], year_remaining),
+        }
+
+    goal = state["monthly_goal"]
+    if goal:
+        month_end = result["liters"]["month_end"]
+        if month_end["upper"] <= goal:
+            status = "under_goal"
+        elif month_end["lower"] > goal:
+            status = "over_goal"
+        else:
+            status = "at_risk"
+        result["goal"] = {
+            "monthly_goal": goal,
+            "projected_percentage": round(month_end["projected"] / goal * 100, 2),
+            "status": status,
+        }
+    else:
+        result["goal"] = None
+    return result
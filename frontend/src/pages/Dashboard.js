@@ -125,6 +125,104 @@ export default function Dashboard() {
     fetchDashboardData();
   }, [fetchDashboardData]);
 
+  // Apply a totals delta pushed by the server
+  const applyDashboardDelta = useCallback(
+    (delta) => {
+      const add = (value) => (prev) => prev + (value || 0);
+      setTodayConsumption(add(delta.todayConsumption));
+      setWeeklyConsumption(add(delta.weeklyConsumption));
+      setYearlyConsumption(add(delta.yearlyConsumption));
+      setMonthlyAverage(add(delta.monthlyAverage));
+      setTodaySpending(add(delta.todaySpending));
+      setWeeklySpending(add(delta.weeklySpending));
+      setMonthlySpending(add(delta.monthlySpending));
+      setYearlySpending(add(delta.yearlySpending));
+
+      // Only today's bar can be updated from the delta; other days need a refetch
+      const otherDaysChanged =
+        (delta.weeklyConsumption || 0) !== (delta.todayConsumption || 0) ||
+        (delta.weeklySpending || 0) !== (delta.todaySpending || 0);
+      if (otherDaysChanged) {
+        fetchDashboardData();
+        return;
+      }
+      const todayName = new Date().toLocaleDateString("en-US", { weekday: "long" });
+      setWeeklyTrends((prev) =>
+        prev.map((day) =>
+          day.name === todayName
+            ? {
+                ...day,
+                liters: day.liters + (delta.todayConsumption || 0),
+                amount: day.amount + (delta.todaySpending || 0),
+              }
+            : day
+        )
+      );
+    },
+    [fetchDashboardData]
+  );
+
+  // Subscribe to live dashboard updates, falling back to polling if streaming is unavailable
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    if (!token) return undefined;
+
+    let pollTimer = null;
+    const startPolling = () => {
+      if (!pollTimer) pollTimer = setInterval(fetchDashboardData, 60000);
+    };
+
+    if (typeof EventSource === "undefined") {
+      startPolling();
+      return () => clearInterval(pollTimer);
+    }
+
+    // The stream is opened with a single-use ticket, so every (re)connect asks for a new one
+    let source = null;
+    let reconnectTimer = null;
+    let closed = false;
+    const connect = async () => {
+      try {
+        const response = await axios.post(
+          "http://127.0.0.1:8000/dashboard/stream/ticket",
+          null,
+          { headers: { Authorization: `Bearer ${token}` } }
+        );
+        if (closed) return;
+        source = new EventSource(
+          `http://127.0.0.1:8000/dashboard/stream?ticket=${encodeURIComponent(response.data.ticket)}`
+        );
+      } catch (err) {
+        startPolling();
+        if (!closed) reconnectTimer = setTimeout(connect, 60000);
+        return;
+      }
+      source.addEventListener("delta", (event) => {
+        applyDashboardDelta(JSON.parse(event.data).delta);
+      });
+      source.addEventListener("resync", () => fetchDashboardData());
+      source.onerror = () => {
+        // The browser's own retry would reuse the spent ticket; poll and reconnect with a new one
+        source.close();
+        startPolling();
+        if (!closed) reconnectTimer = setTimeout(connect, 15000);
+      };
+      source.onopen = () => {
+        if (pollTimer) fetchDashboardData(); // Deltas sent while disconnected were missed
+        clearInterval(pollTimer);
+        pollTimer = null;
+      };
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      if (source) source.close();
+      clearTimeout(reconnectTimer);
+      clearInterval(pollTimer);
+    };
+  }, [fetchDashboardData, applyDashboardDelta]);
+
   return (
     <Box
       component="main"
@@ -0,0 +1,227 @@
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager
+from models import User, ConsumptionEntry, UserGoalStatus, JobCheckpoint
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Job Configuration
+# ------------------------
+JOB_NAME = "goal_evaluation"
+GOAL_JOB_BATCH_SIZE = int(os.getenv("GOAL_JOB_BATCH_SIZE", 1000))
+GOAL_JOB_INTERVAL_SECONDS = int(os.getenv("GOAL_JOB_INTERVAL_SECONDS", 3600))
+
+GOAL_JOB_ADVISORY_LOCK = 7211  # Postgres advisory lock key; one run at a time across all workers
+
+_run_lock = threading.Lock()  # Only one run at a time per process
+job_stats = {
+    "running": False,
+    "run_started_at": None,
+    "last_completed_at": None,
+    "last_user_id": 0,
+    "processed": 0,
+    "total_users": 0,
+    "batches": 0,
+    "users_per_second": 0.0,
+    "progress_percentage": 0.0,
+    "last_error": None,
+}
+
+
+# ------------------------
+# Status Helpers
+# ------------------------
+def month_bounds(today: date):
+    start = today.replace(day=1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def goal_status(consumption: float, monthly_goal):
+    if not monthly_goal:
+        return "no_goal"
+    return "within_goal" if consumption <= monthly_goal else "goal_exceeded"
+
+
+def get_goal_status(db: Session, user_id: int):
+    """Returns the stored status for the current month, or None if not yet evaluated."""
+    status = db.query(UserGoalStatus).filter(UserGoalStatus.user_id == user_id).first()
+    if not status or status.month != date.today().replace(day=1):
+        return None
+    return {
+        "status": status.status,
+        "consumption": round(status.consumption, 2),
+        "monthly_goal": status.monthly_goal,
+        "evaluated_at": status.evaluated_at,
+    }
+
+
+# ------------------------
+# Cross-Worker Lock
+# ------------------------
+@contextmanager
+def _cluster_lock(db: Session):
+    """
+    Yields whether this process may run the job. Every worker schedules it, so
+    on Postgres a session-level advisory lock is held on a dedicated connection
+    for the whole run; the job's own session commits per batch and would hand
+    its connection back to the pool, dropping the lock.
+    """
+    engine = db.get_bind()
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": GOAL_JOB_ADVISORY_LOCK}).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": GOAL_JOB_ADVISORY_LOCK})
+
+
+# ------------------------
+# Batch Evaluation
+# ------------------------
+def _evaluate_batch(db: Session, users, month_start: date, month_end: date):
+    """Evaluates one batch of (id, monthly_goal) rows with a single grouped query."""
+    user_ids = [user.id for user in users]
+    totals = dict(
+        db.query(ConsumptionEntry.user_id, func.sum(ConsumptionEntry.liters_consumed))
+        .filter(
+            ConsumptionEntry.user_id.in_(user_ids),
+            ConsumptionEntry.date.between(month_start, month_end),
+        )
+        .group_by(ConsumptionEntry.user_id)
+        .all()
+    )
+
+    db.query(UserGoalStatus).filter(UserGoalStatus.user_id.in_(user_ids)).delete(synchronize_session=False)
+    db.bulk_insert_mappings(UserGoalStatus, [
+        {
+            "user_id": user.id,
+            "month": month_start,
+            "consumption": totals.get(user.id) or 0.0,
+            "monthly_goal": user.monthly_goal,
+            "status": goal_status(totals.get(user.id) or 0.0, user.monthly_goal),
+            "evaluated_at": datetime.utcnow(),
+        }
+        for user in users
+    ])
+
+
+def run_goal_evaluation(db: Session, batch_size: int = GOAL_JOB_BATCH_SIZE, resume: bool = True):
+    """
+    Scans all users in keyset-paginated batches. The checkpoint is committed
+    with every batch, so an interrupted run resumes after the last finished one.
+    """
+    if not _run_lock.acquire(blocking=False):
+        logger.info("Goal evaluation already running, skipping")
+        return job_stats
+    try:
+        with _cluster_lock(db) as acquired:
+            if not acquired:
+                logger.info("Goal evaluation running in another worker, skipping")
+                return job_stats
+            return _run_locked(db, batch_size, resume)
+    finally:
+        _run_lock.release()
+
+
+def _run_locked(db: Session, batch_size: int, resume: bool):
+    try:
+        month_start, month_end = month_bounds(date.today())
+        checkpoint = db.query(JobCheckpoint).filter(JobCheckpoint.name == JOB_NAME).first()
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(name=JOB_NAME, last_id=0, processed=0)
+            db.add(checkpoint)
+
+        resuming = (
+            resume
+            and checkpoint.completed_at is None
+            and checkpoint.run_started_at is not None
+            and checkpoint.run_started_at.date() >= month_start
+        )
+        if not resuming:
+            checkpoint.last_id = 0
+            checkpoint.processed = 0
+            checkpoint.run_started_at = datetime.utcnow()
+            checkpoint.completed_at = None
+        db.commit()
+
+        started = time.monotonic()
+        processed_this_run = 0
+        job_stats.update({
+            "running": True,
+            "run_started_at": checkpoint.run_started_at,
+            "last_user_id": checkpoint.last_id,
+            "processed": checkpoint.processed,
+            "total_users": db.query(func.count(User.id)).scalar() or 0,
+            "batches": 0,
+            "users_per_second": 0.0,
+            "last_error": None,
+        })
+        logger.info(f"Goal evaluation {'resumed after user ' + str(checkpoint.last_id) if resuming else 'started'}")
+
+        while True:
+            users = (
+                db.query(User.id, User.monthly_goal)
+                .filter(User.id > checkpoint.last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not users:
+                break
+
+            _evaluate_batch(db, users, month_start, month_end)
+            checkpoint.last_id = users[-1].id
+            checkpoint.processed += len(users)
+            db.commit()
+
+            processed_this_run += len(users)
+            elapsed = time.monotonic() - started
+            job_stats.update({
+                "last_user_id": checkpoint.last_id,
+                "processed": checkpoint.processed,
+                "batches": job_stats["batches"] + 1,
+                "users_per_second": round(processed_this_run / elapsed, 2) if elapsed > 0 else 0.0,
+                "progress_percentage": round(
+                    min(checkpoint.processed / job_stats["total_users"] * 100, 100), 2
+                ) if job_stats["total_users"] else 100.0,
+            })
+
+        checkpoint.completed_at = datetime.utcnow()
+        db.commit()
+        job_stats.update({"last_completed_at": checkpoint.completed_at, "progress_percentage": 100.0})
+        logger.info(f"Goal evaluation completed: {checkpoint.processed} users in {job_stats['batches']} batches")
+    except Exception as e:
+        db.rollback()
+        job_stats["last_error"] = str(e)
+        logger.error(f"Goal evaluation failed after user {job_stats['last_user_id']}: {e}")
+    finally:
+        job_stats["running"] = False
+    return job_stats
+
+
+def run_with_new_session(resume: bool = True):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return run_goal_evaluation(db, resume=resume)
+    finally:
+        db.close()
+
+
+# ------------------------
+# Job Command
+# ------------------------
+if __name__ == "__main__":
+    run_with_new_session()
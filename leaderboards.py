@@ -0,0 +1,288 @@
+from sqlalchemy import func, case, select, union_all
+from sqlalchemy.orm import Session
+from datetime import date, timedelta
+from models import ConsumptionEntry, SpendingEntry, ConsumptionMonthlySummary, SpendingMonthlySummary
+from cache import cache
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Leaderboard Configuration
+# ------------------------
+METRICS = ("liters", "spend")
+PERIODS = ("day", "week", "month", "all")
+
+LEADERBOARD_SIZE = 10  # Largest top-k served by the admin endpoints
+LEADERBOARD_SLACK = 4  # Extra tracked users so decrements rarely force a rebuild
+# With the in-process cache, bounds how long another worker's write can go unseen
+LEADERBOARD_TTL_SECONDS = float(os.getenv("LEADERBOARD_TTL_SECONDS", 60))
+
+_METRIC_COLUMNS = {
+    "liters": (ConsumptionEntry, ConsumptionEntry.liters_consumed),
+    "spend": (SpendingEntry, SpendingEntry.amount_spent),
+}
+
+# Archived entries only count towards all-time totals (see archive.py)
+_ARCHIVED_COLUMNS = {
+    "liters": (ConsumptionMonthlySummary, ConsumptionMonthlySummary.total_liters),
+    "spend": (SpendingMonthlySummary, SpendingMonthlySummary.total_spent),
+}
+
+
+# ------------------------
+# Period Helpers
+# ------------------------
+def period_bounds(period: str, today: date = None):
+    """
+    Returns the (start, end) dates of the current period, both inclusive.
+    The all-time period has no bounds.
+    """
+    today = today or date.today()
+    if period == "day":
+        return today, today
+    if period == "week":
+        start = today - timedelta(days=today.weekday())  # Monday
+        return start, start + timedelta(days=6)
+    if period == "month":
+        start = today.replace(day=1)
+        end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return start, end
+    return None, None
+
+
+# ------------------------
+# Bounded Top-K
+# ------------------------
+class TopK:
+    """
+    Keeps the highest values of at most `capacity` users.
+
+    `floor` is an upper bound on the value of every user that is not tracked,
+    so the tracked top-k is exact as long as its k-th value is at least `floor`.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = {}
+        self.floor = 0.0
+        self.built = False
+        self.version = None  # Cache version of the metric when loaded, see _cache_key
+        self.loaded_at = 0.0
+        self._ranked = None
+
+    def offer(self, user_id: int, value: float):
+        self._ranked = None
+        if value <= 0:
+            self.values.pop(user_id, None)
+            return
+
+        if user_id in self.values or len(self.values) < self.capacity:
+            self.values[user_id] = value
+            return
+
+        lowest_user, lowest_value = min(self.values.items(), key=lambda item: item[1])
+        if value > lowest_value:
+            del self.values[lowest_user]
+            self.values[user_id] = value
+            self.floor = max(self.floor, lowest_value)
+        else:
+            self.floor = max(self.floor, value)
+
+    def load(self, rows, truncated_value: float = 0.0, version: int = None):
+        self.values = {user_id: value for user_id, value in rows if value > 0}
+        self.floor = truncated_value
+        self.built = True
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._ranked = None
+
+    def ranked(self):
+        if self._ranked is None:
+            self._ranked = sorted(self.values.items(), key=lambda item: (-item[1], item[0]))
+        return self._ranked
+
+    def top(self, k: int):
+        """
+        Returns the top-k (user_id, value) pairs, or None if the tracked set can
+        no longer prove it holds the true top-k and must be rebuilt.
+        """
+        if not self.built:
+            return None
+        ranked = self.ranked()
+        if len(ranked) >= k:
+            return ranked[:k] if ranked[k - 1][1] >= self.floor else None
+        return ranked if self.floor == 0 else None
+
+
+# ------------------------
+# Leaderboard Registry
+# ------------------------
+# Boards stay in each worker's memory. Their freshness is tracked through the
+# cache's key versions (see cache.py), one key per metric: every write
+# advances it, and a worker applies a write to its boards only if its boards
+# were at the version before that write. With a shared cache backend, a write
+# made by another worker therefore makes this worker rebuild on its next read.
+# The in-process backend only sees this worker's writes, so boards are also
+# rebuilt after LEADERBOARD_TTL_SECONDS.
+_lock = threading.Lock()
+_boards = {}  # (metric, period) -> (period_start, TopK)
+
+
+def _cache_key(metric: str) -> str:
+    return f"leaderboard:{metric}"  # Version only
+
+
+def _board(metric: str, period: str, today: date = None) -> TopK:
+    """Returns the board for the current period, starting a fresh one on rollover."""
+    start, _ = period_bounds(period, today)
+    current = _boards.get((metric, period))
+    if current is None or current[0] != start:
+        current = (start, TopK(LEADERBOARD_SIZE * LEADERBOARD_SLACK))
+        _boards[(metric, period)] = current
+    return current[1]
+
+
+def _user_period_totals(db: Session, metric: str, user_id: int, today: date):
+    """Sums one user's entries for every period in a single query."""
+    table, column = _METRIC_COLUMNS[metric]
+    sums = []
+    for period in PERIODS:
+        start, end = period_bounds(period, today)
+        if start is None:
+            sums.append(func.coalesce(func.sum(column), 0))
+        else:
+            sums.append(
+                func.coalesce(func.sum(case((table.date.between(start, end), column), else_=0)), 0)
+            )
+    totals = dict(zip(PERIODS, db.query(*sums).filter(table.user_id == user_id).one()))
+
+    summary, archived_column = _ARCHIVED_COLUMNS[metric]
+    totals["all"] += (
+        db.query(func.coalesce(func.sum(archived_column), 0)).filter(summary.user_id == user_id).scalar()
+    )
+    return totals
+
+
+def record_write(db: Session, user_id: int, metrics=METRICS):
+    """
+    Refreshes a user's position on every board after one of their entries was
+    added, updated or deleted. Costs one per-user query per metric. Returns
+    the user's period totals of each metric that was refreshed.
+    """
+    today = date.today()
+    refreshed = {}
+    for metric in metrics:
+        # Advanced before reading the totals, so a board that adopts the new
+        # version holds totals at least as recent as it
+        previous, current = cache.invalidate(_cache_key(metric))
+        try:
+            totals = _user_period_totals(db, metric, user_id, today)
+        except Exception as e:
+            logger.error(f"Failed to refresh {metric} leaderboards for user {user_id}: {e}")
+            continue
+        with _lock:
+            for period, value in totals.items():
+                board = _board(metric, period, today)
+                if board.built and previous is not None and board.version == previous:
+                    board.offer(user_id, float(value or 0))
+                    board.version = current
+                else:
+                    board.built = False  # Missed another write: rebuild on next read
+        refreshed[metric] = totals
+    return refreshed
+
+
+def rebuild(db: Session, metric: str, period: str):
+    """Reloads one board from a single grouped query (cold start or after drift)."""
+    table, column = _METRIC_COLUMNS[metric]
+    today = date.today()
+    start, end = period_bounds(period, today)
+    capacity = LEADERBOARD_SIZE * LEADERBOARD_SLACK
+    version = cache.version(_cache_key(metric))  # Read before loading, see cache.py
+
+    if start is not None:
+        rows = (
+            db.query(table.user_id, func.sum(column).label("total"))
+            .filter(table.date.between(start, end))
+            .group_by(table.user_id)
+            .order_by(func.sum(column).desc(), table.user_id)
+            .limit(capacity + 1)
+            .all()
+        )
+    else:
+        summary, archived_column = _ARCHIVED_COLUMNS[metric]
+        combined = union_all(
+            select(table.user_id.label("user_id"), column.label("value")),
+            select(summary.user_id.label("user_id"), archived_column.label("value")),
+        ).subquery()
+        rows = (
+            db.query(combined.c.user_id, func.sum(combined.c.value).label("total"))
+            .group_by(combined.c.user_id)
+            .order_by(func.sum(combined.c.value).desc(), combined.c.user_id)
+            .limit(capacity + 1)
+            .all()
+        )
+
+    rows = [(user_id, float(total or 0)) for user_id, total in rows]
+    truncated_value = rows[capacity][1] if len(rows) > capacity else 0.0
+
+    with _lock:
+        _board(metric, period, today).load(rows[:capacity], truncated_value, version)
+    logger.info(f"Rebuilt {metric}/{period} leaderboard with {min(len(rows), capacity)} users")
+
+
+def rebuild_all(db: Session):
+    """
+    Rebuilds every board here, and makes every worker sharing the cache
+    rebuild its boards on their next read.
+    """
+    for metric in METRICS:
+        cache.invalidate(_cache_key(metric))
+        for period in PERIODS:
+            rebuild(db, metric, period)
+
+
+def _is_current(board: TopK, version: int) -> bool:
+    return board.version == version and (
+        cache.shared or time.monotonic() - board.loaded_at < LEADERBOARD_TTL_SECONDS
+    )
+
+
+def top_users(db: Session, metric: str, period: str, limit: int = LEADERBOARD_SIZE):
+    """
+    Returns the top users as (user_id, value) pairs. Served from memory unless
+    the board is cold, has drifted or missed another worker's write, in which
+    case it is rebuilt first.
+    """
+    version = cache.version(_cache_key(metric))
+    with _lock:
+        board = _board(metric, period)
+        top = board.top(limit) if _is_current(board, version) else None
+    if top is None:
+        rebuild(db, metric, period)
+        with _lock:
+            top = _board(metric, period).ranked()[:limit]
+    return top
+
+
+# ------------------------
+# Rebuild Command
+# ------------------------
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    if not cache.shared:
+        # Boards live in each server process; only a shared cache reaches them from here
+        raise SystemExit(
+            "With the in-process cache this command cannot reach the server's boards; "
+            "set CACHE_BACKEND=sqlite or use POST /admin/leaderboards/rebuild"
+        )
+    db = SessionLocal()
+    try:
+        rebuild_all(db)
+    finally:
+        db.close()
@@ -0,0 +1,202 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from datetime import date, timedelta
+import threading
+import asyncio
+import select
+import json
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Live Update Configuration
+# ------------------------
+HEARTBEAT_SECONDS = int(os.getenv("LIVE_HEARTBEAT_SECONDS", 15))
+SUBSCRIBER_QUEUE_SIZE = 100  # Events buffered per connection before asking it to resync
+MAX_SUBSCRIPTIONS_PER_USER = 10
+NOTIFY_CHANNEL = "dashboard_deltas"  # Postgres channel shared by every worker
+LISTEN_RECONNECT_SECONDS = 5
+
+_PER_DAY_FIELDS = {"monthlyAverage"}  # The month's total over the days elapsed, as /dashboard reports it
+# /dashboard fields affected by a change, keyed by metric; in the order of _contribution
+_DASHBOARD_FIELDS = {
+    "liters": ("todayConsumption", "weeklyConsumption", "monthlyAverage", "yearlyConsumption"),
+    "spend": ("todaySpending", "weeklySpending", "monthlySpending", "yearlySpending"),
+}
+
+
+# ------------------------
+# Delta Computation
+# ------------------------
+def _contribution(entry_date: date, value: float, today: date):
+    """Returns how much one entry counts towards today's, this week's, this month's and this year's totals."""
+    start_of_week = today - timedelta(days=today.weekday())
+    return (
+        value if entry_date == today else 0.0,
+        value if start_of_week <= entry_date <= start_of_week + timedelta(days=6) else 0.0,
+        value if (entry_date.year, entry_date.month) == (today.year, today.month) else 0.0,
+        value if entry_date.year == today.year else 0.0,
+    )
+
+
+def dashboard_delta(metric: str, old=None, new=None, today: date = None):
+    """
+    Derives the dashboard totals delta from the written row alone.
+    `old` and `new` are (date, value) pairs; pass only `new` for an insert
+    and only `old` for a delete.
+    """
+    today = today or date.today()
+    before = _contribution(*old, today) if old else (0.0,) * 4
+    after = _contribution(*new, today) if new else (0.0,) * 4
+    delta = {
+        field: round((a - b) / today.day if field in _PER_DAY_FIELDS else a - b, 4)
+        for field, a, b in zip(_DASHBOARD_FIELDS[metric], after, before)
+        if a != b
+    }
+    return delta or None
+
+
+# ------------------------
+# Broker
+# ------------------------
+class DashboardBroker:
+    """
+    Fans out per-user dashboard deltas to open streams. Each idle stream is
+    only a coroutine waiting on a small queue, so thousands stay cheap.
+
+    On Postgres, deltas travel through LISTEN/NOTIFY so a write handled by one
+    worker reaches streams open on every worker; each worker runs one listener
+    thread on its own connection. Other databases deliver in-process only,
+    which is correct for a single worker.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.shared = False
+        self._subscribers = {}  # user_id -> set of asyncio.Queue
+
+    def start(self, engine):
+        self.loop = asyncio.get_running_loop()
+        self.shared = engine.dialect.name == "postgresql"
+        if self.shared:
+            threading.Thread(target=self._listen, args=(engine.url,), name="dashboard-listener", daemon=True).start()
+
+    def _listen(self, url):
+        # NullPool: the listening connection must not hold a slot of the request pool
+        listen_engine = create_engine(url, poolclass=NullPool)
+        while True:
+            try:
+                raw = listen_engine.raw_connection()
+                try:
+                    connection = raw.driver_connection
+                    connection.autocommit = True
+                    connection.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    # Deltas sent while the listener was down are lost; have every stream refetch
+                    self.loop.call_soon_threadsafe(self._resync_all)
+                    while True:
+                        if select.select([connection], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                            continue
+                        connection.poll()
+                        while connection.notifies:
+                            message = json.loads(connection.notifies.pop(0).payload)
+                            self.loop.call_soon_threadsafe(self._publish, message["user_id"], message["event"])
+                finally:
+                    raw.close()
+            except Exception as e:
+                logger.error(f"Dashboard listener lost its connection: {e}")
+                time.sleep(LISTEN_RECONNECT_SECONDS)
+
+    def can_subscribe(self, user_id: int) -> bool:
+        return len(self._subscribers.get(user_id, ())) < MAX_SUBSCRIPTIONS_PER_USER
+
+    def subscribe(self, user_id: int):
+        queues = self._subscribers.setdefault(user_id, set())
+        if len(queues) >= MAX_SUBSCRIPTIONS_PER_USER:
+            return None
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        queues.add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: int, event: dict):
+        """Safe to call from request threads; a no-op when nobody is listening."""
+        if self.loop is None or self.loop.is_closed() or user_id not in self._subscribers:
+            return
+        self.loop.call_soon_threadsafe(self._publish, user_id, event)
+
+    def _resync_all(self):
+        for user_id in list(self._subscribers):
+            self._publish(user_id, {"type": "resync"})
+
+    def _publish(self, user_id: int, event: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client missed deltas; tell it to refetch /dashboard instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def connection_count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+broker = DashboardBroker()
+
+
+def publish_entry_change(db, user_id: int, metric: str, old=None, new=None):
+    """Publishes the delta of a committed write to the user's streams on every worker."""
+    delta = dashboard_delta(metric, old, new)
+    if not delta:
+        return
+    event = {"type": "delta", "date": str(date.today()), "delta": delta}
+    if not broker.shared:
+        broker.publish(user_id, event)
+        return
+    try:
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": json.dumps({"user_id": user_id, "event": event})},
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()  # The write itself is already committed; streams resync on their next fetch
+        logger.error(f"Failed to publish dashboard delta for user {user_id}: {e}")
+
+
+# ------------------------
+# Server-Sent Events Stream
+# ------------------------
+def format_event(event: dict):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(request, user_id: int):
+    # Subscribed here rather than by the route, so a response that is never
+    # streamed (e.g. the client left first) cannot leave a queue behind
+    queue = broker.subscribe(user_id)
+    if queue is None:
+        yield format_event({"type": "resync"})
+        return
+    try:
+        yield f"retry: {HEARTBEAT_SECONDS * 1000}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                yield format_event(event)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(user_id, queue)
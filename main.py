@@ -1,6 +1,6 @@
-from fastapi import FastAPI, Depends, HTTPException, Request, Body
+from fastapi import FastAPI, Depends, HTTPException, Request, Body, BackgroundTasks
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from database import SessionLocal, engine, init_db, check_replicas, replica_engines, REPLICA_HEALTH_CHECK_SECONDS
 from models import User, RoleEnum, ConsumptionEntry, SpendingEntry
 from schemas import (
     Token,
@@ -13,19 +13,43 @@ from schemas import (
     UserProfileResponse,
     UserProfileUpdate,
     UserUpdateSchema,
+    BatchRequest,
 )
 from passlib.context import CryptContext
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from auth import authenticate_user, create_access_token, get_current_user
-from dependencies import get_db
+from auth import authenticate_user, create_access_token
+from dependencies import get_db, get_current_user, request_user_id, token_user_id
 from datetime import date, timedelta, datetime
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
 import logging
 from auth import auth_router
 from fastapi import Query
 from calendar import monthrange
-from routes import analytics
+from routes import analytics, admin, live
+import leaderboards
+import forecasting
+import percentiles
+import anomalies
+import entry_search
+import timeseries
+import goal_job
+import partitions
+import archive
+import account_purge
+import snapshots
+import slow_queries
+import profiling
+import rate_limits
+import single_flight
+from archive import AllConsumptionEntries, AllSpendingEntries
+from sql_expressions import month_start, json_array_agg, json_object
+from work_queue import recompute_queue
+import live_updates
+import asyncio
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -33,6 +57,8 @@ app = FastAPI()
 # Initialize Router
 app.include_router(auth_router)
 app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
+app.include_router(live.router, tags=["Live"])
 
 # Enable CORS for frontend communication
 app.add_middleware(
@@ -56,22 +82,166 @@ logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Middleware to log requests
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
+    # Path only: query strings can carry credentials, e.g. the stream ticket
+    logger.info(f"Request: {request.method} {request.url.path}")
+    if slow_queries.enabled:
+        # Attributes slow queries to this request (see slow_queries.py)
+        slow_queries.request_context.set({
+            "route": f"{request.method} {request.url.path}",
+            "user_id": request_user_id(request),
+        })
     response = await call_next(request)
     logger.info(f"Response: {response.status_code}")
     return response
 
+# Run a single request under the sampling profiler when an admin asks for it
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    mode = request.headers.get(profiling.PROFILE_HEADER)
+    if not mode:
+        return await call_next(request)
+    if not await asyncio.to_thread(profiling.is_admin_request, request.headers.get("Authorization")):
+        return await call_next(request)  # Ignored rather than revealing the profiler
+
+    sampler = profiling.start()
+    if sampler is None:
+        response = await call_next(request)
+        response.headers["X-Profile-Error"] = "Another request is being profiled"
+        return response
+    try:
+        response = await call_next(request)
+    finally:
+        name = await asyncio.to_thread(profiling.finish, sampler, request.method, request.url.path)
+
+    if mode.lower() == "inline":
+        return PlainTextResponse(
+            sampler.collapsed(), headers={"X-Profile-File": name, "X-Profile-Scope": profiling.PROFILE_SCOPE}
+        )
+    response.headers["X-Profile-File"] = name
+    response.headers["X-Profile-Scope"] = profiling.PROFILE_SCOPE
+    return response
+
+# Per-user rate limits and global admission control, checked before any
+# database or threadpool work (see rate_limits.py)
+@app.middleware("http")
+async def limit_requests(request: Request, call_next):
+    limit_class = rate_limits.route_class(request.method, request.url.path)
+    if rate_limits.RATE_LIMITS_ENABLED and limit_class:
+        user_id = token_user_id(request)
+        client = f"user:{user_id}" if user_id is not None else f"ip:{request.client.host if request.client else None}"
+        retry_after = rate_limits.check_rate_limit(limit_class, client)
+        if retry_after:
+            logger.warning(f"Rate limited {client} on {request.method} {request.url.path} ({limit_class})")
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Too many requests. Please slow down."},
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    if request.url.path in rate_limits.ADMISSION_EXEMPT_PATHS:
+        return await call_next(request)
+    if not rate_limits.try_admit():
+        logger.warning(f"Shed {request.method} {request.url.path}: server at capacity")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is busy. Please retry shortly."},
+            headers={"Retry-After": str(rate_limits.ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        rate_limits.release()
+
+# Identical concurrent reads (same user, endpoint and query, and no write by
+# the user in between) share one computation; followers skip rate limits and
+# admission since they add no work
+@app.middleware("http")
+async def coalesce_requests(request: Request, call_next):
+    if not single_flight.coalescible(request.method, request.url.path) or profiling.PROFILE_HEADER in request.headers:
+        return await call_next(request)
+    user_id = token_user_id(request)
+    if user_id is None:
+        return await call_next(request)
+
+    async def respond():
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        return response.status_code, dict(response.headers), body
+
+    key = (
+        user_id,
+        single_flight.write_generation(user_id),
+        request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+    )
+    (status_code, headers, body), shared = await single_flight.requests.do(key, respond)
+    response = Response(content=body, status_code=status_code, headers=headers)
+    if shared:
+        response.headers["X-Coalesced"] = "true"
+    return response
+
+# Periodically evaluate every user's monthly goal in the background
+async def run_goal_job_periodically():
+    while True:
+        await asyncio.to_thread(goal_job.run_with_new_session)
+        await asyncio.sleep(goal_job.GOAL_JOB_INTERVAL_SECONDS)
+
+# Periodically rebuild the percentile sketches from every user's totals
+async def run_percentile_rebuilds():
+    while True:
+        await asyncio.to_thread(percentiles.run_with_new_session)
+        await asyncio.sleep(percentiles.PERCENTILE_REBUILD_SECONDS)
+
+# Periodically re-check read replica health and lag
+async def run_replica_health_checks():
+    while True:
+        await asyncio.to_thread(check_replicas)
+        await asyncio.sleep(REPLICA_HEALTH_CHECK_SECONDS)
+
+# Daily maintenance: create upcoming partitions and archive cold entries
+async def run_daily_maintenance():
+    while True:
+        await asyncio.to_thread(partitions.ensure_partitions, engine)
+        await asyncio.to_thread(archive.run_with_new_session)
+        if snapshots.available():
+            await asyncio.to_thread(snapshots.run_with_new_session)
+        await asyncio.sleep(24 * 60 * 60)
+
+@app.on_event("startup")
+async def start_background_jobs():
+    if engine.dialect.name == "sqlite":
+        init_db()  # Local development; Postgres is set up with `alembic upgrade head`
+    recompute_queue.start()
+    live_updates.broker.start(engine)
+    asyncio.create_task(run_goal_job_periodically())
+    asyncio.create_task(run_daily_maintenance())
+    asyncio.create_task(run_percentile_rebuilds())
+    asyncio.create_task(asyncio.to_thread(account_purge.resume_pending_purges))
+    if replica_engines:
+        asyncio.create_task(run_replica_health_checks())
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    await recompute_queue.stop()
+
+# Refresh derived data after a user's entries change. Cheap invalidations run
+# inline; recomputation is queued so the write returns once the row commits.
+# `old`/`new` are the (date, value) of a single changed row, used for live deltas.
+def after_entry_write(db: Session, user_id: int, metrics=leaderboards.METRICS, old=None, new=None):
+    single_flight.mark_write(user_id)  # Reads from now on must not join ones started before the write
+    forecasting.invalidate(user_id)
+    changed_days = {values[0] for values in (old, new) if values}
+    if len(metrics) == 1 and changed_days:
+        timeseries.store.refresh_days(db, user_id, metrics[0], changed_days)
+    else:
+        timeseries.store.invalidate(user_id)
+    recompute_queue.enqueue(user_id, metrics)
+    if len(metrics) == 1 and (old or new):
+        live_updates.publish_entry_change(db, user_id, metrics[0], old=old, new=new)
+
 # Get the current date and month details
 today = date.today()
 days_in_month = monthrange(today.year, today.month)[1]  # Total days in the current month
@@ -89,7 +259,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     user = db.query(User).filter(func.lower(User.email) == normalized_email).first()
 
     # Authenticate user by verifying the password
-    if not user:
+    if not user or user.disabled_at is not None:
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
     # Generate access token upon successful authentication
@@ -105,20 +275,25 @@ def logout():
 # User Registration
 @app.post("/auth/register", response_model=UserResponse)
 def register(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user.email).first():
+    normalized_email = user.email.strip().lower()
+    if db.query(User.id).filter(func.lower(User.email) == normalized_email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
     hashed_password = pwd_context.hash(user.password)
     new_user = User(
         first_name=user.first_name,
         last_name=user.last_name,
-        email=user.email,
+        email=normalized_email,
         password=hashed_password,
         role=RoleEnum.user,
         date_of_birth=user.date_of_birth,
         monthly_goal=user.monthly_goal,
     )
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:  # A concurrent registration won the lower(email) unique index
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
     db.refresh(new_user)
     return new_user
 
@@ -129,8 +304,11 @@ def get_user_profile(
     db: Session = Depends(get_db)
 ):
     today = date.today()
+    start_of_month = today.replace(day=1)
+    end_of_month = date(today.year, today.month, monthrange(today.year, today.month)[1])
+    # Plain date ranges (not date_trunc) so partitions can be pruned
     monthly_data = db.query(func.sum(ConsumptionEntry.liters_consumed)).filter(
-        func.date_trunc("month", ConsumptionEntry.date) == func.date_trunc("month", today),
+        ConsumptionEntry.date.between(start_of_month, end_of_month),
         ConsumptionEntry.user_id == current_user.id
     ).first()
 
@@ -143,6 +321,7 @@ def get_user_profile(
         "monthly_goal": current_user.monthly_goal,
         "income": current_user.income,  # Added income field
         "current_month_consumption": monthly_data[0] or 0.0,
+        "goal_status": goal_job.get_goal_status(db, current_user.id),
     }
 
     logger.info(f"Fetched profile: {profile}")
@@ -177,6 +356,7 @@ def update_user_profile(
         db.add(user)
         db.commit()
         db.refresh(user)
+        forecasting.invalidate(user.id)  # Forecast caches the monthly goal
 
         return user
     except Exception as e:
@@ -194,6 +374,10 @@ def get_dashboard_metrics(
         start_of_week = today - timedelta(days=today.weekday())  # Monday
         end_of_week = start_of_week + timedelta(days=6)  # Sunday
         start_of_year = date(today.year, 1, 1)
+        end_of_year = date(today.year, 12, 31)
+        start_of_month = today.replace(day=1)
+        end_of_month = date(today.year, today.month, monthrange(today.year, today.month)[1])
+        # Filters below use plain date ranges (not date_trunc) so partitions can be pruned
 
         # Today's Consumption
         today_consumption = (
@@ -225,8 +409,7 @@ def get_dashboard_metrics(
                 func.count(func.distinct(ConsumptionEntry.date)).label("unique_days"),
             )
             .filter(
-                func.date_trunc("month", ConsumptionEntry.date)
-                == func.date_trunc("month", today),
+                ConsumptionEntry.date.between(start_of_month, end_of_month),
                 ConsumptionEntry.user_id == current_user.id,
             )
             .first()
@@ -243,22 +426,22 @@ def get_dashboard_metrics(
         yearly_consumption = (
                 db.query(func.sum(ConsumptionEntry.liters_consumed))
                 .filter(
-                    func.date_trunc("year", ConsumptionEntry.date) == func.date_trunc("year", today),
+                    ConsumptionEntry.date.between(start_of_year, end_of_year),
                     ConsumptionEntry.user_id == current_user.id,
                 )
                 .scalar()
                 or 0
         )
 
-        # Highest Consumption (Summing all values for the highest consumption day)
+        # Highest Consumption (Summing all values for the highest consumption day, archive included)
         highest_consumption_data = (
             db.query(
-                ConsumptionEntry.date,
-                func.sum(ConsumptionEntry.liters_consumed).label("total_liters")
+                AllConsumptionEntries.date,
+                func.sum(AllConsumptionEntries.liters_consumed).label("total_liters")
             )
-            .filter(ConsumptionEntry.user_id == current_user.id)
-            .group_by(ConsumptionEntry.date)
-            .order_by(func.sum(ConsumptionEntry.liters_consumed).desc())
+            .filter(AllConsumptionEntries.user_id == current_user.id)
+            .group_by(AllConsumptionEntries.date)
+            .order_by(func.sum(AllConsumptionEntries.liters_consumed).desc())
             .first()
         )
 
@@ -294,8 +477,7 @@ def get_dashboard_metrics(
         monthly_spending = (
             db.query(func.sum(SpendingEntry.amount_spent))
             .filter(
-                func.date_trunc("month", SpendingEntry.date)
-                == func.date_trunc("month", today),
+                SpendingEntry.date.between(start_of_month, end_of_month),
                 SpendingEntry.user_id == current_user.id,
             )
             .scalar()
@@ -323,22 +505,22 @@ def get_dashboard_metrics(
         yearly_spending = (
                 db.query(func.sum(SpendingEntry.amount_spent))
                 .filter(
-                    func.date_trunc("year", SpendingEntry.date) == func.date_trunc("year", today),
+                    SpendingEntry.date.between(start_of_year, end_of_year),
                     SpendingEntry.user_id == current_user.id,
                 )
                 .scalar()
                 or 0
         )
 
-        # Highest Spending (Summing all values for the highest spending day)
+        # Highest Spending (Summing all values for the highest spending day, archive included)
         highest_spending_data = (
             db.query(
-                SpendingEntry.date,
-                func.sum(SpendingEntry.amount_spent).label("total_spent")
+                AllSpendingEntries.date,
+                func.sum(AllSpendingEntries.amount_spent).label("total_spent")
             )
-            .filter(SpendingEntry.user_id == current_user.id)
-            .group_by(SpendingEntry.date)
-            .order_by(func.sum(SpendingEntry.amount_spent).desc())
+            .filter(AllSpendingEntries.user_id == current_user.id)
+            .group_by(AllSpendingEntries.date)
+            .order_by(func.sum(AllSpendingEntries.amount_spent).desc())
             .first()
         )
 
@@ -385,6 +567,7 @@ def get_dashboard_metrics(
             "yearlySpending": yearly_spending,
             "highestSpending": highest_spending,
             "weeklyTrends": weekly_trends,
+            "goalStatus": goal_job.get_goal_status(db, current_user.id),
              "spending_percentage": round(spending_percentage, 2) if spending_percentage is not None else "N/A",
         }
 
@@ -404,24 +587,24 @@ def get_monthly_consumption_history(
     try:
         offset = (page - 1) * limit  # Calculate the offset for pagination
 
-        # Fetch aggregated data by month
+        # Fetch aggregated data by month (archived entries included)
         query = db.query(
-            func.date_trunc("month", ConsumptionEntry.date).label("month"),
-            func.sum(ConsumptionEntry.liters_consumed).label("total_consumption"),
-            func.count(func.distinct(ConsumptionEntry.date)).label("unique_days"),
-            func.max(ConsumptionEntry.liters_consumed).label("highest_consumption"),
-            func.array_agg(
-                func.json_build_object(
-                    "date", ConsumptionEntry.date,
-                    "liters_consumed", ConsumptionEntry.liters_consumed,
-                    "notes", ConsumptionEntry.notes,
-                    "id", ConsumptionEntry.id
+            month_start(AllConsumptionEntries.date).label("month"),
+            func.sum(AllConsumptionEntries.liters_consumed).label("total_consumption"),
+            func.count(func.distinct(AllConsumptionEntries.date)).label("unique_days"),
+            func.max(AllConsumptionEntries.liters_consumed).label("highest_consumption"),
+            json_array_agg(
+                json_object(
+                    "date", AllConsumptionEntries.date,
+                    "liters_consumed", AllConsumptionEntries.liters_consumed,
+                    "notes", AllConsumptionEntries.notes,
+                    "id", AllConsumptionEntries.id
                 )
             ).label("entries"),
         ).filter(
-            ConsumptionEntry.user_id == current_user.id
+            AllConsumptionEntries.user_id == current_user.id
         ).group_by(
-            func.date_trunc("month", ConsumptionEntry.date)
+            month_start(AllConsumptionEntries.date)
         ).order_by(
             desc("month")
         )
@@ -436,7 +619,7 @@ def get_monthly_consumption_history(
         response = []
         for result in paginated_query:
             # Convert the month from datetime to string
-            month = result.month.strftime("%B %Y") if isinstance(result.month, datetime) else str(result.month)
+            month = result.month.strftime("%B %Y") if isinstance(result.month, date) else str(result.month)
 
             # Process entries
             entries = []
@@ -505,27 +688,28 @@ def get_monthly_spending_history(
     try:
         offset = (page - 1) * limit  # Calculate the offset for pagination
 
+        # Fetch aggregated data by month (archived entries included)
         query = db.query(
-            func.date_trunc("month", SpendingEntry.date).label("month"),
-            func.sum(SpendingEntry.amount_spent).label("total_spending"),
-            func.sum(SpendingEntry.liters).label("total_liters"),  # Total liters
-            func.count(func.distinct(SpendingEntry.date)).label("unique_days"),
-            func.max(SpendingEntry.amount_spent).label("highest_spending"),
-            func.array_agg(
-                func.json_build_object(
-                    "date", SpendingEntry.date,
-                    "amount_spent", SpendingEntry.amount_spent,
-                    "liters", SpendingEntry.liters,
-                    "store", SpendingEntry.store,
-                    "city", SpendingEntry.city,
-                    "notes", SpendingEntry.notes,
-                    "id", SpendingEntry.id
+            month_start(AllSpendingEntries.date).label("month"),
+            func.sum(AllSpendingEntries.amount_spent).label("total_spending"),
+            func.sum(AllSpendingEntries.liters).label("total_liters"),  # Total liters
+            func.count(func.distinct(AllSpendingEntries.date)).label("unique_days"),
+            func.max(AllSpendingEntries.amount_spent).label("highest_spending"),
+            json_array_agg(
+                json_object(
+                    "date", AllSpendingEntries.date,
+                    "amount_spent", AllSpendingEntries.amount_spent,
+                    "liters", AllSpendingEntries.liters,
+                    "store", AllSpendingEntries.store,
+                    "city", AllSpendingEntries.city,
+                    "notes", AllSpendingEntries.notes,
+                    "id", AllSpendingEntries.id
                 )
             ).label("entries"),
         ).filter(
-            SpendingEntry.user_id == current_user.id
+            AllSpendingEntries.user_id == current_user.id
         ).group_by(
-            func.date_trunc("month", SpendingEntry.date)
+            month_start(AllSpendingEntries.date)
         ).order_by(desc("month"))
 
         total_entries = query.count()  # Total records for pagination
@@ -623,6 +807,8 @@ def add_consumption_entry(
     db.add(new_entry)
     db.commit()
     db.refresh(new_entry)
+    after_entry_write(db, current_user.id, metrics=("liters",), new=(new_entry.date, new_entry.liters_consumed))
+    anomalies.observe_consumption(db, current_user.id, new_entry)
 
     logger.info(f"Consumption entry added successfully: {new_entry}")
     return {
@@ -664,6 +850,8 @@ def add_spending_entry(
     db.add(new_entry)
     db.commit()
     db.refresh(new_entry)
+    after_entry_write(db, current_user.id, metrics=("spend",), new=(new_entry.date, new_entry.amount_spent))
+    anomalies.observe_spending(db, current_user.id, new_entry)
 
     logger.info(f"Spending entry added successfully: {new_entry}")
     return {
@@ -689,6 +877,8 @@ def update_consumption_entry(
     entry = db.query(ConsumptionEntry).filter_by(id=entry_id, user_id=current_user.id).first()
 
     if not entry:
+        if archive.archived_ids(db, ConsumptionEntry, current_user.id, [entry_id]):
+            raise HTTPException(status_code=409, detail="Archived entries are read-only")
         logger.error("Consumption entry not found or unauthorized access.")
         raise HTTPException(
             status_code=404, detail="Consumption entry not found"
@@ -700,6 +890,8 @@ def update_consumption_entry(
             status_code=400, detail="Liters consumed must be a positive number."
         )
 
+    old_values = (entry.date, entry.liters_consumed)
+
     # Update the entry fields
     entry.date = updated_data.date
     entry.liters_consumed = updated_data.liters_consumed
@@ -707,6 +899,9 @@ def update_consumption_entry(
 
     db.commit()
     db.refresh(entry)
+    after_entry_write(db, current_user.id, metrics=("liters",), old=old_values, new=(entry.date, entry.liters_consumed))
+    anomalies.entries_changed(db, current_user.id, "liters", [(entry.id, *old_values)])
+    anomalies.observe_consumption(db, current_user.id, entry)
 
     logger.info(f"Consumption entry updated successfully: {entry}")
     return {
@@ -730,11 +925,16 @@ def delete_consumption_entry(
     ).first()
 
     if not entry:
+        if archive.archived_ids(db, ConsumptionEntry, current_user.id, [entry_id]):
+            raise HTTPException(status_code=409, detail="Archived entries are read-only")
         logger.error(f"Consumption entry {entry_id} not found for user {current_user.id}")
         raise HTTPException(status_code=404, detail="Consumption entry not found")
 
+    old_values = (entry.date, entry.liters_consumed)
     db.delete(entry)
     db.commit()
+    after_entry_write(db, current_user.id, metrics=("liters",), old=old_values)
+    anomalies.entries_changed(db, current_user.id, "liters", [(entry_id, *old_values)])
     logger.info(f"Successfully deleted consumption entry {entry_id}")
     return {"detail": "Consumption entry deleted successfully"}
 
@@ -753,6 +953,8 @@ def update_spending_entry(
     ).first()
 
     if not entry:
+        if archive.archived_ids(db, SpendingEntry, current_user.id, [entry_id]):
+            raise HTTPException(status_code=409, detail="Archived entries are read-only")
         logger.error(f"Spending entry ID: {entry_id} not found.")
         raise HTTPException(status_code=404, detail="Spending entry not found.")
 
@@ -762,6 +964,7 @@ def update_spending_entry(
             status_code=400, detail="Amount spent must be a positive number."
         )
 
+    old_values = (entry.date, entry.amount_spent)
     entry.date = updated_spending.date
     entry.amount_spent = updated_spending.amount_spent
     entry.liters = updated_spending.liters if updated_spending.liters else 0
@@ -771,6 +974,9 @@ def update_spending_entry(
 
     db.commit()
     db.refresh(entry)
+    after_entry_write(db, current_user.id, metrics=("spend",), old=old_values, new=(entry.date, entry.amount_spent))
+    anomalies.entries_changed(db, current_user.id, "price_per_liter", [(entry.id, *old_values)])
+    anomalies.observe_spending(db, current_user.id, entry)
 
     logger.info(f"Spending entry updated successfully: {entry}")
     return {
@@ -797,18 +1003,208 @@ def delete_spending_entry(
     ).first()
 
     if not entry:
+        if archive.archived_ids(db, SpendingEntry, current_user.id, [entry_id]):
+            raise HTTPException(status_code=409, detail="Archived entries are read-only")
         logger.error(f"Spending entry ID: {entry_id} not found.")
         raise HTTPException(status_code=404, detail="Spending entry not found.")
 
+    old_values = (entry.date, entry.amount_spent)
     db.delete(entry)
     db.commit()
+    after_entry_write(db, current_user.id, metrics=("spend",), old=old_values)
+    anomalies.entries_changed(db, current_user.id, "price_per_liter", [(entry_id, *old_values)])
 
     logger.info(f"Spending entry ID: {entry_id} deleted successfully.")
     return {"message": "Spending entry deleted successfully."}
 
+# Batch entry operations
+_BATCH_TABLES = {
+    "consumption": (ConsumptionEntry, ConsumptionCreate, "liters_consumed", "liters"),
+    "spending": (SpendingEntry, SpendingCreate, "amount_spent", "spend"),
+}
+
+def _batch_row(entry_type: str, data):
+    """Column values for a validated create/update payload, normalized like the single-entry endpoints."""
+    if entry_type == "consumption":
+        return {"date": data.date, "liters_consumed": data.liters_consumed, "notes": data.notes}
+    return {
+        "date": data.date,
+        "amount_spent": data.amount_spent,
+        "liters": data.liters if data.liters else 0,
+        "store": data.store if data.store else "N/A",
+        "city": data.city if data.city else "N/A",
+        "notes": data.notes,
+    }
+
+# Search entries by their notes (and store and city of spending), best matches first
+@app.get("/entries/search")
+def search_entries(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str = Query(None, pattern="^(consumption|spending)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+):
+    logger.info(f"Searching entries of user {current_user.id} for: {q}")
+    try:
+        total, rows = entry_search.search_entries(db, current_user.id, q, entry_type=type, page=page, limit=limit)
+
+        results = []
+        for row in rows:
+            result = {"type": row.type, "id": row.id, "date": str(row.date), "notes": row.notes, "snippet": row.snippet}
+            if row.type == "consumption":
+                result["liters_consumed"] = row.value
+            else:
+                result.update({"amount_spent": row.value, "liters": row.liters, "store": row.store, "city": row.city})
+            result["rank"] = round(row.rank or 0, 4)
+            results.append(result)
+
+        return {"data": results, "total": total, "total_pages": (total + limit - 1) // limit}
+    except Exception as e:
+        logger.error(f"Error searching entries of user {current_user.id}: {e}")
+        raise HTTPException(status_code=500, detail="An error occurred while searching entries")
+
+@app.post("/entries/batch")
+def apply_entry_batch(
+    batch: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Applies create/update/delete operations on consumption and spending entries
+    in one transaction: all succeed or none are applied. Each statement covers
+    every operation of its kind and type at once.
+    """
+    logger.info(f"Applying batch of {len(batch.operations)} operations for user {current_user.id}")
+    operations = batch.operations
+    results = [{"index": i, "op": op.op, "type": op.type, "id": op.id, "status": None} for i, op in enumerate(operations)]
+    rows = {}
+    errors = False
+
+    # Validate every payload before touching the database
+    targeted = set()  # (type, id) already referenced by an earlier operation
+    for i, op in enumerate(operations):
+        if op.op in ("update", "delete") and op.id is None:
+            results[i].update(status="error", detail="id is required")
+            errors = True
+            continue
+        if op.op in ("update", "delete"):
+            # Operations of a kind run as one statement, so repeats have no defined order
+            if (op.type, op.id) in targeted:
+                results[i].update(status="error", detail=f"{op.type.capitalize()} entry {op.id} appears more than once")
+                errors = True
+                continue
+            targeted.add((op.type, op.id))
+        if op.op in ("create", "update"):
+            try:
+                rows[i] = _batch_row(op.type, _BATCH_TABLES[op.type][1].model_validate(op.data or {}))
+            except ValidationError as e:
+                results[i].update(status="error", detail=e.errors(include_url=False))
+                errors = True
+    if errors:
+        raise HTTPException(status_code=400, detail={"message": "Invalid operations, nothing applied", "results": results})
+
+    try:
+        # Lock and fetch every referenced entry the user owns, one query per type
+        existing = {}
+        for entry_type, (table, _, value_column, _) in _BATCH_TABLES.items():
+            target_ids = {op.id for op in operations if op.type == entry_type and op.op != "create"}
+            existing[entry_type] = {
+                row.id: (row.date, row.value)
+                for row in db.query(table.id, table.date, getattr(table, value_column).label("value"))
+                .filter(table.user_id == current_user.id, table.id.in_(target_ids))
+                .with_for_update()
+                .all()
+            } if target_ids else {}
+        missing = [i for i, op in enumerate(operations) if op.op != "create" and op.id not in existing[op.type]]
+        if missing:
+            archived = {
+                entry_type: archive.archived_ids(
+                    db, table, current_user.id, {operations[i].id for i in missing if operations[i].type == entry_type}
+                )
+                for entry_type, (table, _, _, _) in _BATCH_TABLES.items()
+            }
+            for i in missing:
+                op = operations[i]
+                if op.id in archived[op.type]:
+                    results[i].update(status="error", detail=f"{op.type.capitalize()} entry is archived and read-only")
+                else:
+                    results[i].update(status="error", detail=f"{op.type.capitalize()} entry not found")
+            if all(operations[i].id in archived[operations[i].type] for i in missing):
+                raise HTTPException(status_code=409, detail={"message": "Archived entries are read-only, nothing applied", "results": results})
+            raise HTTPException(status_code=404, detail={"message": "Entries not found, nothing applied", "results": results})
+
+        changes = []  # (metric, old, new) for live dashboard deltas
+        for entry_type, (table, _, value_column, metric) in _BATCH_TABLES.items():
+            indexes = [i for i, op in enumerate(operations) if op.type == entry_type]
+            owned = existing[entry_type]
+
+            creates = [i for i in indexes if operations[i].op == "create"]
+            if creates:
+                new_ids = db.scalars(
+                    insert(table).returning(table.id, sort_by_parameter_order=True),  # ids in row order
+                    [{"user_id": current_user.id, **rows[i]} for i in creates],
+                ).all()
+                for i, new_id in zip(creates, new_ids):
+                    results[i].update(id=new_id, status="created")
+                    changes.append((metric, None, (rows[i]["date"], rows[i][value_column])))
+
+            updates = [i for i in indexes if operations[i].op == "update"]
+            if updates:
+                db.execute(update(table), [{"id": operations[i].id, **rows[i]} for i in updates])
+                for i in updates:
+                    results[i]["status"] = "updated"
+                    changes.append((metric, owned[operations[i].id], (rows[i]["date"], rows[i][value_column])))
+
+            deletes = [i for i in indexes if operations[i].op == "delete"]
+            if deletes:
+                db.execute(
+                    delete(table)
+                    .where(table.user_id == current_user.id, table.id.in_([operations[i].id for i in deletes]))
+                    .execution_options(synchronize_session=False)
+                )
+                for i in deletes:
+                    results[i]["status"] = "deleted"
+                    changes.append((metric, owned[operations[i].id], None))
+
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error applying batch for user {current_user.id}: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    after_entry_write(db, current_user.id, metrics=tuple({metric for metric, _, _ in changes}))
+    for entry_type, anomaly_metric in (("consumption", "liters"), ("spending", "price_per_liter")):
+        changed = [
+            (op.id, *existing[entry_type][op.id])
+            for op in operations if op.type == entry_type and op.op != "create"
+        ]
+        if changed:
+            anomalies.entries_changed(db, current_user.id, anomaly_metric, changed)
+    # Created and updated entries are scored like single writes
+    written = [(i, results[i]["id"]) for i, op in enumerate(operations) if op.op in ("create", "update")]
+    anomalies.observe_consumptions(db, current_user.id, [
+        (entry_id, rows[i]["date"], rows[i]["liters_consumed"])
+        for i, entry_id in written if operations[i].type == "consumption"
+    ])
+    anomalies.observe_spendings(db, current_user.id, [
+        (entry_id, rows[i]["date"], rows[i]["amount_spent"], rows[i]["liters"])
+        for i, entry_id in written if operations[i].type == "spending"
+    ])
+    for metric, old, new in changes:
+        live_updates.publish_entry_change(db, current_user.id, metric, old=old, new=new)
+
+    logger.info(f"Batch applied successfully for user {current_user.id}")
+    return {"results": results}
+
 #User Deleting
-@app.delete("/user/delete", status_code=204)
+@app.delete("/user/delete", status_code=202)
 def delete_user_account(
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -819,14 +1215,13 @@ def delete_user_account(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Delete the user and their related entries
-        db.query(ConsumptionEntry).filter(ConsumptionEntry.user_id == current_user.id).delete()
-        db.query(SpendingEntry).filter(SpendingEntry.user_id == current_user.id).delete()
-        db.delete(user)
+        # Disable the account right away; its rows are deleted in the background
+        user.disabled_at = datetime.utcnow()
         db.commit()
+        background_tasks.add_task(account_purge.purge_with_new_session, current_user.id)
 
-        logger.info(f"User {current_user.id} deleted successfully")
-        return {"message": "Account deleted successfully"}
+        logger.info(f"User {current_user.id} disabled, purge scheduled")
+        return {"message": "Account deletion scheduled"}
 
     except Exception as e:
         logger.error(f"Error deleting user {current_user.id}: {e}")
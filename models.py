@@ -9,6 +9,8 @@ from sqlalchemy import (
     ForeignKey,
     Enum,
     CheckConstraint,
+    Index,
+    literal_column,
 )
 from sqlalchemy.orm import relationship, declarative_base
 import enum
@@ -38,14 +40,37 @@ class User(Base):
     monthly_goal = Column(Float, nullable=True)  # Liters
     role = Column(Enum(RoleEnum), default=RoleEnum.user)  # Default role is "user"
     income = Column(Float, nullable=True)  # Optional Income field
+    disabled_at = Column(TIMESTAMP, nullable=True)  # Set when deletion is requested; rows are purged in the background
+    lifetime_liters = Column(Float, nullable=False, default=0, server_default="0")  # Kept current by the recompute queue
 
     # Timestamps
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
     # Relationships
-    consumption_entries = relationship("ConsumptionEntry", back_populates="user")
-    spending_entries = relationship("SpendingEntry", back_populates="user")
+    consumption_entries = relationship("ConsumptionEntry", back_populates="user", passive_deletes=True)
+    spending_entries = relationship("SpendingEntry", back_populates="user", passive_deletes=True)
+
+    # Constraints
+    __table_args__ = (
+        # Emails are unique case-insensitively; also serves lower(email) lookups at login
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        # Keyset pagination of the admin user listing
+        Index("ix_users_name_id", "last_name", "first_name", "id"),
+        Index("ix_users_lifetime_liters_id", "lifetime_liters", "id"),
+    )
+
+
+def user_search_text():
+    """
+    Names and email as one string, matched by admin search. Must stay
+    identical to the expression of the ix_users_search_trgm index, which only
+    the admin user search migration creates: it needs the pg_trgm extension,
+    which create_all cannot install. The separators are literals, as in the
+    index; bound parameters would keep Postgres from using it.
+    """
+    separator = literal_column("' '")
+    return User.first_name.concat(separator).concat(User.last_name).concat(separator).concat(User.email)
 
 
 # ----------------------------
@@ -55,7 +80,7 @@ class ConsumptionEntry(Base):
     __tablename__ = "consumption_entries"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False, default=date.today)  # Default to today's date
     liters_consumed = Column(Float, nullable=False)
     notes = Column(String, nullable=True)  # Field for optional comments
@@ -69,6 +94,7 @@ class ConsumptionEntry(Base):
     # Constraints
     __table_args__ = (
         CheckConstraint("liters_consumed > 0", name="check_liters_positive"),
+        Index("ix_consumption_entries_created_at_id", "created_at", "id"),  # Snapshot export keyset
     )
 
 # ----------------------------
@@ -78,7 +104,7 @@ class SpendingEntry(Base):
     __tablename__ = "spending_entries"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     date = Column(Date, nullable=False)
     amount_spent = Column(Float, nullable=False)
     liters = Column(Float, nullable=False)
@@ -96,4 +122,122 @@ class SpendingEntry(Base):
     __table_args__ = (
         CheckConstraint("amount_spent > 0", name="check_amount_positive"),
         CheckConstraint("liters > 0", name="check_liters_positive"),
+        Index("ix_spending_entries_created_at_id", "created_at", "id"),  # Snapshot export keyset
+    )
+
+# ----------------------------
+# Goal Status Table
+# ----------------------------
+class UserGoalStatus(Base):
+    __tablename__ = "user_goal_status"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, nullable=False)  # First day of the evaluated month
+    consumption = Column(Float, nullable=False, default=0)
+    monthly_goal = Column(Float, nullable=True)
+    status = Column(String, nullable=False)  # "no_goal", "within_goal" or "goal_exceeded"
+
+    # Timestamps
+    evaluated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+# ----------------------------
+# Job Checkpoints Table
+# ----------------------------
+class JobCheckpoint(Base):
+    __tablename__ = "job_checkpoints"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)  # Keyset position of the current run
+    processed = Column(Integer, nullable=False, default=0)
+    run_started_at = Column(TIMESTAMP, nullable=True)
+    completed_at = Column(TIMESTAMP, nullable=True)
+
+# ----------------------------
+# Archived Entries Tables
+# ----------------------------
+class ConsumptionEntryArchive(Base):
+    __tablename__ = "consumption_entries_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Keeps the original entry id
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    date = Column(Date, nullable=False)
+    liters_consumed = Column(Float, nullable=False)
+    notes = Column(String, nullable=True)
+
+    # Timestamps
+    created_at = Column(TIMESTAMP)
+    archived_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_consumption_entries_archive_created_at_id", "created_at", "id"),  # Snapshot export keyset
+    )
+
+
+class SpendingEntryArchive(Base):
+    __tablename__ = "spending_entries_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Keeps the original entry id
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    date = Column(Date, nullable=False)
+    amount_spent = Column(Float, nullable=False)
+    liters = Column(Float, nullable=False)
+    store = Column(String, nullable=True)
+    city = Column(String, nullable=True)
+    notes = Column(String, nullable=True)
+
+    # Timestamps
+    created_at = Column(TIMESTAMP)
+    archived_at = Column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_spending_entries_archive_created_at_id", "created_at", "id"),  # Snapshot export keyset
+    )
+
+
+# ----------------------------
+# Monthly Summary Tables (aggregates of archived entries)
+# ----------------------------
+class ConsumptionMonthlySummary(Base):
+    __tablename__ = "consumption_monthly_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    total_liters = Column(Float, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+    max_liters = Column(Float, nullable=False, default=0)
+
+
+class SpendingMonthlySummary(Base):
+    __tablename__ = "spending_monthly_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    total_spent = Column(Float, nullable=False, default=0)
+    total_liters = Column(Float, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+    max_spent = Column(Float, nullable=False, default=0)
+
+
+# ----------------------------
+# Entry Anomalies Table
+# ----------------------------
+class EntryAnomaly(Base):
+    __tablename__ = "entry_anomalies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    metric = Column(String, nullable=False)  # "liters" (daily total) or "price_per_liter" (spending entry)
+    entry_id = Column(Integer, nullable=False)  # Consumption or spending entry that triggered it
+    date = Column(Date, nullable=False)
+    value = Column(Float, nullable=False)
+    expected = Column(Float, nullable=False)  # The user's moving average at the time
+    z_score = Column(Float, nullable=False)
+
+    # Timestamps
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    # Constraints
+    __table_args__ = (
+        Index("ix_entry_anomalies_user_id_created_at", "user_id", "created_at"),
     )
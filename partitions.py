@@ -0,0 +1,126 @@
+from sqlalchemy import text
+from datetime import date, timedelta
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Partition Configuration
+# ------------------------
+PARTITIONED_TABLES = ("consumption_entries", "spending_entries")
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+
+
+# ------------------------
+# Partition Helpers
+# ------------------------
+def add_months(month_start: date, months: int) -> date:
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month_start: date) -> str:
+    return f"{table}_y{month_start.year}m{month_start.month:02d}"
+
+
+def create_partition_sql(table: str, month_start: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month_start)} "
+        f"PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{add_months(month_start, 1).isoformat()}')"
+    )
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+        {"table": table},
+    ).scalar()
+
+
+def ensure_partitions(engine, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """
+    Creates monthly partitions from the current month up to `months_ahead`
+    months ahead. Rows outside every partition land in the DEFAULT partition.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+
+    created = []
+    current_month = date.today().replace(day=1)
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            for offset in range(months_ahead + 1):
+                month_start = add_months(current_month, offset)
+                name = partition_name(table, month_start)
+                if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                    continue
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(create_partition_sql(table, month_start)))
+                    created.append(name)
+                except Exception as e:
+                    # Usually rows for that month already sit in the default partition
+                    logger.error(f"Could not create partition {name}: {e}")
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+
+# ------------------------
+# Pruning Verification
+# ------------------------
+def scanned_partitions(conn, statement: str, params: dict = None):
+    """Runs EXPLAIN on a statement and returns the partitions its plan touches."""
+    plan = conn.execute(text(f"EXPLAIN {statement}"), params or {}).scalars().all()
+    partitions = set()
+    for line in plan:
+        for table in PARTITIONED_TABLES:
+            partitions.update(re.findall(rf"\b({table}_(?:y\d{{4}}m\d{{2}}|default))\b", line))
+    return sorted(partitions)
+
+
+def verify_pruning(engine):
+    """
+    EXPLAINs the date-filtered query shapes used by the dashboard, profile and
+    analytics endpoints and reports the partitions each one would scan.
+    """
+    today = date.today()
+    month_start = today.replace(day=1)
+    month_end = add_months(month_start, 1) - timedelta(days=1)
+    checks = {
+        "day": ("date = :day", {"day": today}),
+        "month": ("date BETWEEN :start AND :end", {"start": month_start, "end": month_end}),
+        "year": ("date BETWEEN :start AND :end", {"start": date(today.year, 1, 1), "end": date(today.year, 12, 31)}),
+    }
+
+    report = {}
+    with engine.connect() as conn:
+        for table in PARTITIONED_TABLES:
+            total = conn.execute(
+                text("SELECT count(*) FROM pg_inherits WHERE inhparent = to_regclass(:table)"), {"table": table}
+            ).scalar()
+            for name, (condition, params) in checks.items():
+                scanned = scanned_partitions(
+                    conn, f"SELECT sum(1) FROM {table} WHERE user_id = :user_id AND {condition}", {"user_id": 1, **params}
+                )
+                report[f"{table}/{name}"] = {"scanned": scanned, "total_partitions": total}
+                logger.info(f"{table} {name} filter scans {len(scanned)} of {total} partitions: {scanned}")
+    return report
+
+
+# ------------------------
+# Partition Command
+# ------------------------
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    if len(sys.argv) > 1 and sys.argv[1] == "verify":
+        verify_pruning(engine)
+    else:
+        ensure_partitions(engine)
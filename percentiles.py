@@ -0,0 +1,254 @@
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from archive import AllConsumptionEntries, AllSpendingEntries
+import numpy as np
+import timeseries
+import threading
+import logging
+import random
+import math
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Percentile Configuration
+# ------------------------
+METRICS = ("liters", "spend")
+PERIODS = ("daily", "monthly", "lifetime")
+
+PERCENTILE_SKETCH_K = int(os.getenv("PERCENTILE_SKETCH_K", 200))  # Rank error about 1.7 / k
+PERCENTILE_REBUILD_SECONDS = int(os.getenv("PERCENTILE_REBUILD_SECONDS", 600))
+
+# Hot and archived entries alike, so lifetime totals cover a user's whole history
+_METRIC_COLUMNS = {
+    "liters": (AllConsumptionEntries, AllConsumptionEntries.liters_consumed),
+    "spend": (AllSpendingEntries, AllSpendingEntries.amount_spent),
+}
+
+
+def period_start(period: str, today: date = None):
+    """First day of the current period; the lifetime period has none."""
+    today = today or date.today()
+    if period == "daily":
+        return today
+    if period == "monthly":
+        return today.replace(day=1)
+    return None
+
+
+# ------------------------
+# KLL Quantile Sketch
+# ------------------------
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty). Keeps a stack of compactors
+    where an item at level h stands for 2**h inputs; a full level sorts itself
+    and promotes every other item. Memory stays O(k) however many values are
+    added, and two sketches merge by concatenating their levels.
+    """
+
+    def __init__(self, k: int = PERCENTILE_SKETCH_K):
+        self.k = k
+        self.n = 0
+        self.levels = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._rng = random.Random()
+        self._cdf = None
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        while self._size >= self._max_size:
+            for level, items in enumerate(self.levels):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                        self._max_size = sum(self._capacity(h) for h in range(len(self.levels)))
+                    items.sort()
+                    keep = [items.pop()] if len(items) % 2 else []
+                    promoted = items[self._rng.random() < 0.5::2]
+                    self.levels[level + 1].extend(promoted)
+                    self.levels[level] = keep
+                    self._size -= len(items) - len(promoted)
+                    break
+
+    def update(self, value: float):
+        self.levels[0].append(value)
+        self.n += 1
+        self._size += 1
+        self._cdf = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """Adds another sketch's values, e.g. one built by another worker or shard."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        self._max_size = sum(self._capacity(h) for h in range(len(self.levels)))
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._size += other._size
+        self._cdf = None
+        self._compress()
+
+    def _sorted(self):
+        if self._cdf is None:
+            values = np.concatenate([np.asarray(items, dtype=np.float64) for items in self.levels])
+            weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+            order = np.argsort(values, kind="stable")
+            self._cdf = values[order], np.cumsum(weights[order])
+        return self._cdf
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of added values at or below `value`."""
+        if self.n == 0:
+            return 0.0
+        values, cumulative = self._sorted()
+        position = np.searchsorted(values, value, side="right")
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def quantile(self, fraction: float) -> float:
+        values, cumulative = self._sorted()
+        return float(values[min(np.searchsorted(cumulative, fraction * cumulative[-1]), len(values) - 1)])
+
+    @property
+    def nbytes(self) -> int:
+        return self._size * 8
+
+
+# ------------------------
+# Population Sketches
+# ------------------------
+# Sketches cannot retract a value, so writes are not fed into them: adding a
+# user's new total without removing the old one would count them twice.
+# Sketches therefore describe every user's totals as of the last rebuild, which
+# a background task repeats every PERCENTILE_REBUILD_SECONDS, so other users'
+# totals are at most that old plus one build. The user being ranked is always
+# looked up at their live total (from the time-series store, refreshed on each
+# write). Requests never build: after a rollover, periods that started since
+# the last build report no percentile until a background rebuild finishes.
+_lock = threading.Lock()
+_sketches = {}  # (metric, period) -> KLLSketch
+_built_for = None  # Day the sketches were built, so daily and monthly periods roll over
+_rebuild_lock = threading.Lock()
+_rebuild_scheduled = False
+percentile_stats = {"last_built_at": None, "build_seconds": None, "last_error": None}
+
+
+def build_sketches(db: Session, today: date = None):
+    """Streams every user's period totals into fresh sketches, one grouped scan per metric."""
+    today = today or date.today()
+    sketches = {(metric, period): KLLSketch() for metric in METRICS for period in PERIODS}
+    for metric in METRICS:
+        table, column = _METRIC_COLUMNS[metric]
+        sums = [
+            func.sum(case((table.date >= period_start(period, today), column), else_=0))
+            if period_start(period, today) else func.sum(column)
+            for period in PERIODS
+        ]
+        rows = db.query(*sums).group_by(table.user_id).execution_options(yield_per=10000)
+        for totals in rows:
+            for period, total in zip(PERIODS, totals):
+                if total:  # Users are ranked among those active in the period
+                    sketches[(metric, period)].update(float(total))
+    return sketches
+
+
+def rebuild(db: Session, only_if_stale: bool = False):
+    """Replaces the sketches; `only_if_stale` skips it if they were built today."""
+    global _sketches, _built_for
+    with _rebuild_lock:
+        today = date.today()
+        if only_if_stale and _built_for == today:
+            return  # Another request rebuilt them while this one waited
+        started = datetime.utcnow()
+        try:
+            sketches = build_sketches(db, today)
+            with _lock:
+                _sketches, _built_for = sketches, today
+            percentile_stats.update({
+                "last_built_at": datetime.utcnow(),
+                "build_seconds": round((datetime.utcnow() - started).total_seconds(), 3),
+                "last_error": None,
+            })
+            logger.info(f"Rebuilt percentile sketches over {sketches[('liters', 'lifetime')].n} users")
+        except Exception as e:
+            percentile_stats["last_error"] = str(e)
+            logger.error(f"Failed to rebuild percentile sketches: {e}")
+        finally:
+            db.rollback()  # Ends the read transaction
+
+
+def run_with_new_session(only_if_stale: bool = False):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    db.info["read_only"] = True  # Whole-table scans; a slightly lagging replica is fine
+    try:
+        rebuild(db, only_if_stale=only_if_stale)
+    finally:
+        db.close()
+
+
+def schedule_rebuild():
+    """Rebuilds stale sketches in a background thread, unless one is already on its way."""
+    global _rebuild_scheduled
+    with _lock:
+        if _rebuild_scheduled:
+            return
+        _rebuild_scheduled = True
+
+    def run():
+        global _rebuild_scheduled
+        try:
+            run_with_new_session(only_if_stale=True)
+        finally:
+            with _lock:
+                _rebuild_scheduled = False
+
+    threading.Thread(target=run, name="percentile-rebuild", daemon=True).start()
+
+
+def user_percentiles(db: Session, user_id: int):
+    """Ranks the user's live totals against every period's population sketch."""
+    today = date.today()
+    with _lock:
+        sketches, built_for = _sketches, _built_for
+    if built_for != today:  # Cold start or the day rolled over
+        schedule_rebuild()
+    series = timeseries.store.get(db, user_id)
+
+    result = {}
+    for metric in METRICS:
+        result[metric] = {}
+        for period in PERIODS:
+            start = period_start(period, today)
+            value, entries = series.total(metric, start=start)
+            # A sketch built on an earlier day only still describes periods that had started by then
+            current = built_for is not None and period_start(period, built_for) == start
+            sketch = sketches.get((metric, period)) if current else None
+            result[metric][period] = {
+                "value": round(value, 2),
+                "percentile": round(sketch.rank(value) * 100, 1) if entries and sketch and sketch.n else None,
+                "users": sketch.n if sketch else 0,
+            }
+    return result
+
+
+def stats():
+    with _lock:
+        sketches = dict(_sketches)
+    return {
+        **percentile_stats,
+        "built_for": _built_for,
+        "sketches": {
+            f"{metric}/{period}": {"users": sketch.n, "bytes": sketch.nbytes}
+            for (metric, period), sketch in sketches.items()
+        },
+    }
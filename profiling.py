@@ -0,0 +1,150 @@
+from collections import Counter
+from datetime import datetime
+from auth_helpers import decode_token
+from models import User, RoleEnum
+import threading
+import logging
+import sys
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Profiler Configuration
+# ------------------------
+PROFILE_HEADER = "X-Profile"  # "1" stores the profile; "inline" returns it instead of the response
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", 1)) / 1000
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+PROFILE_FILE_PATTERN = re.compile(r"^[\w.-]+\.collapsed$")
+
+# Profiles cover the whole worker process, not only the profiled request:
+# its sync parts hop between threadpool threads that cannot be told apart
+# from those serving other requests at the same time. Each stack is rooted at
+# its thread's name, so the event loop and workers can still be separated.
+PROFILE_SCOPE = "process"
+
+# Leaf frames of threads that are waiting rather than working
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),  # concurrent.futures workers blocked on their queue
+}
+
+_active = threading.Lock()  # One profiled request at a time
+
+
+def is_admin_request(authorization: str) -> bool:
+    """Checks the request's bearer token belongs to an active admin."""
+    from database import SessionLocal
+
+    if not authorization or not authorization.startswith("Bearer "):
+        return False
+    try:
+        user_id = int(decode_token(authorization[7:]).get("sub"))
+    except (ValueError, TypeError):
+        return False
+
+    # Short-lived session: only profiled requests pay for this lookup
+    db = SessionLocal()
+    try:
+        user = db.query(User.role, User.disabled_at).filter(User.id == user_id).first()
+        return user is not None and user.role == RoleEnum.admin and user.disabled_at is None
+    finally:
+        db.close()
+
+
+# ------------------------
+# Sampling Profiler
+# ------------------------
+def _collapse(frame):
+    """Folds a stack into 'root;...;leaf', or None if the thread is idle."""
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """
+    Samples the stacks of every other thread in the process at a fixed
+    interval and counts identical stacks, in the collapsed format read by
+    flamegraph.pl and speedscope. Requests served concurrently with the
+    profiled one appear as well (see PROFILE_SCOPE).
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = _collapse(frame)
+                if stack is None:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                self.counts[f"{names.get(ident, ident)};{stack}"] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def start():
+    """Starts profiling a request, or returns None if another one is being profiled."""
+    if not _active.acquire(blocking=False):
+        return None
+    sampler = Sampler()
+    sampler.start()
+    return sampler
+
+
+def finish(sampler: Sampler, method: str, path: str) -> str:
+    """Stops the sampler, stores its profile and returns the file name."""
+    try:
+        sampler.stop()
+    finally:
+        _active.release()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w]+", "_", path).strip("_") or "root"
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{method}-{slug}.collapsed"
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(sampler.collapsed())
+
+    for old in list_profiles()[PROFILE_MAX_FILES:]:
+        os.remove(os.path.join(PROFILE_DIR, old))
+    logger.info(f"Profiled {method} {path} ({PROFILE_SCOPE}-wide): {sampler.samples} samples stored in {name}")
+    return name
+
+
+def list_profiles():
+    """Stored profile names, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((name for name in os.listdir(PROFILE_DIR) if PROFILE_FILE_PATTERN.match(name)), reverse=True)
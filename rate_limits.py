@@ -0,0 +1,115 @@
+import threading
+import logging
+import math
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Limiter Configuration
+# ------------------------
+def _parse_limit(value: str):
+    """'requests/seconds' -> (bucket capacity, tokens refilled per second)."""
+    requests, seconds = value.split("/")
+    return int(requests), int(requests) / float(seconds)
+
+
+# Route class -> per-user token bucket; routes in no class are not rate limited
+RATE_LIMITS = {
+    "auth": _parse_limit(os.getenv("RATE_LIMIT_AUTH", "10/60")),
+    "writes": _parse_limit(os.getenv("RATE_LIMIT_WRITES", "60/60")),
+    "analytics": _parse_limit(os.getenv("RATE_LIMIT_ANALYTICS", "120/60")),
+}
+RATE_LIMITS_ENABLED = os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true"
+RATE_LIMIT_SWEEP_SECONDS = 60
+
+# Requests handled at once before new ones are shed. The default matches
+# SQLAlchemy's default pool (5 connections + 10 overflow), so excess requests
+# are turned away instead of waiting in the threadpool for a connection.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 15))
+ADMISSION_RETRY_AFTER_SECONDS = 1
+ADMISSION_EXEMPT_PATHS = ("/dashboard/stream",)  # Long-lived streams would hold a slot for hours
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+_lock = threading.Lock()
+_buckets = {}  # (route class, client) -> [tokens, refilled_at]
+_last_sweep = time.monotonic()
+_in_flight = 0
+limiter_stats = {"rate_limited": 0, "shed": 0, "peak_in_flight": 0}
+
+
+def route_class(method: str, path: str):
+    if path.startswith("/auth/"):
+        return "auth"
+    if method in WRITE_METHODS:
+        return "writes"
+    if path.startswith("/analytics/") or path.startswith("/dashboard"):
+        return "analytics"
+    return None
+
+
+# ------------------------
+# Per-User Token Buckets
+# ------------------------
+def _sweep(now: float):
+    """
+    Drops buckets that have refilled completely. A full bucket behaves exactly
+    like a missing one, so memory stays proportional to recently active clients.
+    """
+    global _last_sweep
+    _last_sweep = now
+    for key, (tokens, refilled_at) in list(_buckets.items()):
+        capacity, rate = RATE_LIMITS[key[0]]
+        if tokens + (now - refilled_at) * rate >= capacity:
+            del _buckets[key]
+
+
+def check_rate_limit(limit_class: str, client: str) -> int:
+    """Takes a token from the client's bucket; returns 0, or seconds to wait when empty."""
+    capacity, rate = RATE_LIMITS[limit_class]
+    now = time.monotonic()
+    with _lock:
+        if now - _last_sweep > RATE_LIMIT_SWEEP_SECONDS:
+            _sweep(now)
+        tokens, refilled_at = _buckets.get((limit_class, client), (capacity, now))
+        tokens = min(capacity, tokens + (now - refilled_at) * rate)
+        if tokens < 1:
+            _buckets[(limit_class, client)] = [tokens, now]
+            limiter_stats["rate_limited"] += 1
+            return math.ceil((1 - tokens) / rate)
+        _buckets[(limit_class, client)] = [tokens - 1, now]
+        return 0
+
+
+# ------------------------
+# Global Admission Control
+# ------------------------
+def try_admit() -> bool:
+    """Claims a request slot; callers that get True must call release()."""
+    global _in_flight
+    with _lock:
+        if _in_flight >= MAX_CONCURRENT_REQUESTS:
+            limiter_stats["shed"] += 1
+            return False
+        _in_flight += 1
+        limiter_stats["peak_in_flight"] = max(limiter_stats["peak_in_flight"], _in_flight)
+        return True
+
+
+def release():
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+
+
+def stats():
+    with _lock:
+        return {
+            **limiter_stats,
+            "in_flight": _in_flight,
+            "max_concurrent_requests": MAX_CONCURRENT_REQUESTS,
+            "tracked_buckets": len(_buckets),
+            "limits": {name: {"requests": capacity, "per_second": rate} for name, (capacity, rate) in RATE_LIMITS.items()},
+        }
@@ -0,0 +1,287 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi.responses import FileResponse
+from typing import List
+from sqlalchemy.orm import Session
+from dependencies import get_db, admin_required
+from models import User, user_search_text
+from sqlalchemy import tuple_
+import leaderboards
+import goal_job
+import account_purge
+import snapshots
+import slow_queries
+import profiling
+import rate_limits
+import single_flight
+import percentiles
+from work_queue import recompute_queue
+import base64
+import json
+import os
+
+router = APIRouter(dependencies=[Depends(admin_required)])
+
+# -------------------------
+# 1. Leaderboards
+# -------------------------
+@router.get("/leaderboards/{metric}/{period}")
+def get_leaderboard(
+    metric: str,
+    period: str,
+    limit: int = Query(leaderboards.LEADERBOARD_SIZE, ge=1, le=leaderboards.LEADERBOARD_SIZE),
+    db: Session = Depends(get_db),
+):
+    if metric not in leaderboards.METRICS:
+        raise HTTPException(status_code=400, detail=f"Metric must be one of {', '.join(leaderboards.METRICS)}")
+    if period not in leaderboards.PERIODS:
+        raise HTTPException(status_code=400, detail=f"Period must be one of {', '.join(leaderboards.PERIODS)}")
+
+    try:
+        top = leaderboards.top_users(db, metric, period, limit)
+
+        user_ids = [user_id for user_id, _ in top]
+        users = {
+            user.id: user
+            for user in db.query(User).filter(User.id.in_(user_ids)).all()
+        } if user_ids else {}
+
+        return {
+            "metric": metric,
+            "period": period,
+            "leaders": [
+                {
+                    "rank": rank,
+                    "user_id": user_id,
+                    "name": f"{users[user_id].first_name} {users[user_id].last_name}" if user_id in users else "N/A",
+                    "value": round(value, 2),
+                }
+                for rank, (user_id, value) in enumerate(top, start=1)
+            ],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching leaderboard: {str(e)}")
+
+
+@router.post("/leaderboards/rebuild")
+def rebuild_leaderboards(db: Session = Depends(get_db)):
+    try:
+        leaderboards.rebuild_all(db)
+        return {"message": "Leaderboards rebuilt successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding leaderboards: {str(e)}")
+
+
+# -------------------------
+# 2. Goal Evaluation Job
+# -------------------------
+@router.get("/jobs/goal-evaluation")
+def get_goal_job_stats():
+    return goal_job.job_stats
+
+
+@router.post("/jobs/goal-evaluation/run", status_code=202)
+def run_goal_job(background_tasks: BackgroundTasks, resume: bool = True):
+    if goal_job.job_stats["running"]:
+        raise HTTPException(status_code=409, detail="Goal evaluation is already running")
+    background_tasks.add_task(goal_job.run_with_new_session, resume)
+    return {"message": "Goal evaluation started"}
+
+
+# -------------------------
+# 3. Background Work Queue
+# -------------------------
+@router.get("/queue")
+async def get_queue_stats():
+    # Async so the snapshot is taken on the event loop that owns the queue
+    return recompute_queue.snapshot()
+
+
+# -------------------------
+# 4. Account Purges
+# -------------------------
+@router.get("/purges")
+def get_purge_progress():
+    return account_purge.purge_progress
+
+
+# -------------------------
+# 5. Parquet Snapshots
+# -------------------------
+@router.get("/snapshots")
+def get_snapshot_stats():
+    return {
+        **snapshots.snapshot_stats,
+        "available": snapshots.available(),
+        "watermarks": {dataset: snapshots.read_watermark(dataset) for dataset in snapshots.DATASETS},
+    }
+
+
+@router.post("/snapshots/export", status_code=202)
+def run_snapshot_export(background_tasks: BackgroundTasks, rebuild: bool = False):
+    if not snapshots.available():
+        raise HTTPException(status_code=503, detail="Parquet snapshots need the optional pyarrow and duckdb packages")
+    if snapshots.snapshot_stats["running"]:
+        raise HTTPException(status_code=409, detail="Snapshot export is already running")
+    background_tasks.add_task(snapshots.run_with_new_session, rebuild)
+    return {"message": "Snapshot export started"}
+
+
+@router.get("/analytics/platform-totals")
+def get_platform_totals(
+    dataset: str = "consumption",
+    group_by: List[str] = Query(["month"]),
+    start_month: str = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    end_month: str = Query(None, pattern=r"^\d{4}-\d{2}$"),
+):
+    """Cross-user totals answered from the Parquet snapshots, off the database."""
+    if dataset not in snapshots.DATASETS:
+        raise HTTPException(status_code=400, detail=f"Dataset must be one of {', '.join(snapshots.DATASETS)}")
+    if not snapshots.available():
+        raise HTTPException(status_code=503, detail="Parquet snapshots need the optional pyarrow and duckdb packages")
+
+    try:
+        rows = snapshots.query_totals(dataset, group_by, start_month, end_month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying snapshots: {str(e)}")
+
+    watermark = snapshots.read_watermark(dataset)
+    return {
+        "dataset": dataset,
+        "exported_through": watermark[0] if watermark else None,  # created_at of the newest exported entry
+        "rows": rows,
+    }
+
+
+# -------------------------
+# 6. Slow Queries
+# -------------------------
+@router.get("/slow-queries")
+def get_slow_queries(limit: int = Query(50, ge=1, le=slow_queries.SLOW_QUERY_BUFFER_SIZE)):
+    return {
+        "enabled": slow_queries.enabled,
+        "threshold_ms": slow_queries.SLOW_QUERY_MS,
+        "queries": slow_queries.recent(limit),
+    }
+
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    slow_queries.clear()
+    return {"message": "Slow query log cleared"}
+
+
+# -------------------------
+# 7. Request Profiles
+# -------------------------
+@router.get("/profiles")
+def get_profiles():
+    return {
+        "header": profiling.PROFILE_HEADER,
+        "scope": profiling.PROFILE_SCOPE,  # Stacks of every thread, not only the profiled request's
+        "profiles": profiling.list_profiles(),
+    }
+
+
+@router.get("/profiles/{name}")
+def download_profile(name: str):
+    if not profiling.PROFILE_FILE_PATTERN.match(name) or name not in profiling.list_profiles():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(os.path.join(profiling.PROFILE_DIR, name), media_type="text/plain", filename=name)
+
+
+# -------------------------
+# 8. Rate Limits
+# -------------------------
+@router.get("/rate-limits")
+def get_rate_limits():
+    return {
+        **rate_limits.stats(),
+        "coalescing": {**single_flight.requests.stats, "in_flight": single_flight.requests.in_flight()},
+    }
+
+
+# -------------------------
+# 9. Percentile Sketches
+# -------------------------
+@router.get("/percentiles")
+def get_percentile_stats():
+    return percentiles.stats()
+
+
+@router.post("/percentiles/rebuild", status_code=202)
+def rebuild_percentiles(background_tasks: BackgroundTasks):
+    background_tasks.add_task(percentiles.run_with_new_session)
+    return {"message": "Percentile sketch rebuild started"}
+
+
+# -------------------------
+# 10. Users
+# -------------------------
+# sort -> (columns, descending); `id` ends every key so positions are unique
+USER_SORTS = {
+    "newest": ((User.id,), True),
+    "name": ((User.last_name, User.first_name, User.id), False),
+    "lifetime_liters": ((User.lifetime_liters, User.id), True),
+}
+
+
+def _encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str, length: int):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+@router.get("/users")
+def list_users(
+    q: str = Query(None, min_length=3, description="Matches names and email; 3+ characters to use the trigram index"),
+    sort: str = Query("newest", pattern="^(newest|name|lifetime_liters)$"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = None,
+    db: Session = Depends(get_db),
+):
+    """Lists users by keyset pagination: pass `next_cursor` back to get the following page."""
+    columns, descending = USER_SORTS[sort]
+    query = db.query(User)
+    if q:
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.filter(user_search_text().ilike(pattern, escape="\\"))
+    if cursor:
+        after = tuple_(*_decode_cursor(cursor, len(columns)))
+        query = query.filter(tuple_(*columns) < after if descending else tuple_(*columns) > after)
+
+    try:
+        users = (
+            query.order_by(*[column.desc() if descending else column for column in columns])
+            .limit(limit + 1)
+            .all()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing users: {str(e)}")
+
+    page, more = users[:limit], len(users) > limit
+    return {
+        "users": [
+            {
+                "id": user.id,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "email": user.email,
+                "role": user.role,
+                "lifetime_liters": round(user.lifetime_liters or 0, 2),
+                "created_at": user.created_at,
+                "disabled_at": user.disabled_at,
+            }
+            for user in page
+        ],
+        "next_cursor": _encode_cursor([getattr(page[-1], column.key) for column in columns]) if more else None,
+    }
@@ -4,7 +4,14 @@ from sqlalchemy import func
 from datetime import date, timedelta
 from typing import List
 from dependencies import get_db
-from models import ConsumptionEntry, SpendingEntry, User
+from models import ConsumptionEntry, SpendingEntry, User, EntryAnomaly
+import numpy as np
+import forecasting
+import percentiles
+import timeseries
+from timeseries import day_strings
+from archive import AllConsumptionEntries, AllSpendingEntries
+import sql_expressions
 
 router = APIRouter()
 
@@ -14,15 +21,13 @@ router = APIRouter()
 @router.get("/daily-trends")
 def get_daily_trends(user_id: int, db: Session = Depends(get_db)):
     try:
-        trends = (
-            db.query(ConsumptionEntry.date, func.sum(ConsumptionEntry.liters_consumed))
-            .filter(ConsumptionEntry.user_id == user_id)
-            .group_by(ConsumptionEntry.date)
-            .order_by(ConsumptionEntry.date)
-            .all()
-        )
+        days, liters = timeseries.store.get(db, user_id).daily("liters")
 
-        return {"trends": [{"date": str(trend[0]), "liters": round(trend[1] or 0, 2)} for trend in trends]}
+        return {
+            "trends": [
+                {"date": day, "liters": value} for day, value in zip(day_strings(days), np.round(liters, 2).tolist())
+            ]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching daily trends: {str(e)}")
 
@@ -40,34 +45,26 @@ def compare_months(
     if not months:
         raise HTTPException(status_code=400, detail="No months provided for comparison")
 
-    results = []
-    for month in months:
-        try:
-            month_start = date.fromisoformat(month + "-01")
-            # calculate the last day of that month
-            month_end = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-
-            consumption = (
-                db.query(func.coalesce(func.sum(ConsumptionEntry.liters_consumed), 0))
-                .filter(ConsumptionEntry.user_id == user_id, ConsumptionEntry.date.between(month_start, month_end))
-                .scalar()
-            )
-
-            spending = (
-                db.query(func.coalesce(func.sum(SpendingEntry.amount_spent), 0))
-                .filter(SpendingEntry.user_id == user_id, SpendingEntry.date.between(month_start, month_end))
-                .scalar()
-            )
+    try:
+        month_starts = [date.fromisoformat(month + "-01") for month in months]
+        # calculate the last day of each month
+        month_ends = [
+            (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            for month_start in month_starts
+        ]
 
-            results.append({
-                "month": month,
-                "consumption": round(consumption, 2),
-                "spending": round(spending, 2)
-            })
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error comparing months: {str(e)}")
+        series = timeseries.store.get(db, user_id)
+        consumption = np.round(series.range_totals("liters", month_starts, month_ends), 2).tolist()
+        spending = np.round(series.range_totals("spend", month_starts, month_ends), 2).tolist()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error comparing months: {str(e)}")
 
-    return {"comparison": results}
+    return {
+        "comparison": [
+            {"month": month, "consumption": liters, "spending": spent}
+            for month, liters, spent in zip(months, consumption, spending)
+        ]
+    }
 
 # -------------------------
 # 3. Weekly Overview
@@ -110,16 +107,12 @@ def get_monthly_trends(user_id: int, month: str = None, db: Session = Depends(ge
         month_start = date.fromisoformat(month + "-01") if month else today.replace(day=1)
         month_end = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
 
-        trends = (
-            db.query(ConsumptionEntry.date, func.sum(ConsumptionEntry.liters_consumed))
-            .filter(ConsumptionEntry.user_id == user_id, ConsumptionEntry.date.between(month_start, month_end))
-            .group_by(ConsumptionEntry.date)
-            .order_by(ConsumptionEntry.date)
-            .all()
-        )
+        days, liters = timeseries.store.get(db, user_id).daily("liters", month_start, month_end)
 
         return {
-            "daily_trends": [{"date": str(trend[0]), "liters": round(trend[1] or 0, 2)} for trend in trends]
+            "daily_trends": [
+                {"date": day, "liters": value} for day, value in zip(day_strings(days), np.round(liters, 2).tolist())
+            ]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching monthly trends: {str(e)}")
@@ -136,11 +129,7 @@ def spending_percentage(user_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail="User not found")
 
         income = user.income or 1  # Avoid division by zero
-        total_spent = (
-            db.query(func.coalesce(func.sum(SpendingEntry.amount_spent), 0))
-            .filter(SpendingEntry.user_id == user_id)
-            .scalar()
-        )
+        total_spent, _ = timeseries.store.get(db, user_id).total("spend")
 
         percentage = (total_spent / income) * 100
         return {"income": income, "total_spent": round(total_spent, 2), "spending_percentage": round(percentage, 2)}
@@ -156,21 +145,25 @@ def annual_overview(user_id: int, db: Session = Depends(get_db)):
     try:
         year = date.today().year
 
-        data = (
-            db.query(func.date_trunc('month', ConsumptionEntry.date),
-                     func.sum(ConsumptionEntry.liters_consumed),
-                     func.sum(SpendingEntry.amount_spent))
-            .filter(ConsumptionEntry.user_id == user_id, func.extract('year', ConsumptionEntry.date) == year)
-            .group_by(func.date_trunc('month', ConsumptionEntry.date))
-            .order_by(func.date_trunc('month', ConsumptionEntry.date))
-            .all()
-        )
+        # One grouped query per table; joining the two would pair every
+        # consumption entry with every spending entry
+        monthly = {}
+        for index, (table, column) in enumerate(((ConsumptionEntry, ConsumptionEntry.liters_consumed),
+                                                  (SpendingEntry, SpendingEntry.amount_spent))):
+            rows = (
+                db.query(sql_expressions.month_start(table.date), func.sum(column))
+                .filter(table.user_id == user_id, table.date.between(date(year, 1, 1), date(year, 12, 31)))
+                .group_by(sql_expressions.month_start(table.date))
+                .all()
+            )
+            for month, total in rows:
+                monthly.setdefault(str(month), [0.0, 0.0])[index] = total or 0
 
         return {
             "year": year,
             "monthly_data": [
-                {"month": str(entry[0]), "liters": round(entry[1] or 0, 2), "spending": round(entry[2] or 0, 2)}
-                for entry in data
+                {"month": month, "liters": round(liters, 2), "spending": round(spending, 2)}
+                for month, (liters, spending) in sorted(monthly.items())
             ]
         }
     except Exception as e:
@@ -183,11 +176,7 @@ def annual_overview(user_id: int, db: Session = Depends(get_db)):
 @router.get("/milestones")
 def get_milestones(user_id: int, db: Session = Depends(get_db)):
     try:
-        total_consumption = (
-            db.query(func.coalesce(func.sum(ConsumptionEntry.liters_consumed), 0))
-            .filter(ConsumptionEntry.user_id == user_id)
-            .scalar()
-        )
+        total_consumption, _ = timeseries.store.get(db, user_id).total("liters")
 
         milestones = {
             "5L": total_consumption >= 5,
@@ -208,19 +197,14 @@ def get_milestones(user_id: int, db: Session = Depends(get_db)):
 @router.get("/top-days")
 def get_top_days(user_id: int, type: str = "spending", db: Session = Depends(get_db)):
     try:
-        table = SpendingEntry if type == "spending" else ConsumptionEntry
-        column = table.amount_spent if type == "spending" else table.liters_consumed
-
-        top_days = (
-            db.query(table.date, func.sum(column))
-            .filter(table.user_id == user_id)
-            .group_by(table.date)
-            .order_by(func.sum(column).desc())
-            .limit(5)
-            .all()
-        )
+        metric = "spend" if type == "spending" else "liters"
+        days, totals = timeseries.store.get(db, user_id).top_days(metric, 5)
 
-        return {"top_days": [{"date": str(day[0]), "value": round(day[1] or 0, 2)} for day in top_days]}
+        return {
+            "top_days": [
+                {"date": day, "value": value} for day, value in zip(day_strings(days), np.round(totals, 2).tolist())
+            ]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching top days: {str(e)}")
 
@@ -231,12 +215,202 @@ def get_top_days(user_id: int, type: str = "spending", db: Session = Depends(get
 @router.get("/average-daily-consumption")
 def get_average_daily_consumption(user_id: int, db: Session = Depends(get_db)):
     try:
-        data = (
-            db.query(func.avg(ConsumptionEntry.liters_consumed))
-            .filter(ConsumptionEntry.user_id == user_id)
-            .scalar()
-        )
+        total, count = timeseries.store.get(db, user_id).total("liters")
+        data = total / count if count else 0
 
         return {"average_daily_consumption": round(data or 0, 2)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching average daily consumption: {str(e)}")
+
+
+# -------------------------
+# 10. Price per Liter by Store and City
+# -------------------------
+def _price_series(keys, dates, amounts, liters, window):
+    """
+    Computes price-per-liter statistics for rows sorted by (group key, date).
+    Rolling prices are liter-weighted over the last `window` purchase days of
+    each group; trends are least-squares slopes in price per liter per 30 days.
+    Everything runs on whole arrays, group boundaries included.
+    """
+    n = len(keys)
+    if n == 0:
+        empty = np.array([], dtype=int)
+        return empty, empty, np.array([]), np.array([]), np.array([]), np.empty((0, 2))
+
+    amounts = np.asarray(amounts, dtype=float)
+    liters = np.asarray(liters, dtype=float)
+    days = np.asarray(dates, dtype="datetime64[D]").astype(float)
+
+    # Start index of every group and, per row, the start of its own group
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_group)
+    row_start = starts[np.cumsum(new_group) - 1]
+
+    # Rolling sums that never cross a group boundary
+    positions = np.arange(n)
+    lower = np.maximum(positions + 1 - window, row_start)
+    amount_cs = np.concatenate(([0.0], np.cumsum(amounts)))
+    liters_cs = np.concatenate(([0.0], np.cumsum(liters)))
+    rolling_price = (amount_cs[positions + 1] - amount_cs[lower]) / (liters_cs[positions + 1] - liters_cs[lower])
+    price = amounts / liters
+
+    # Per-group totals and trend slopes from reduced sums
+    counts = np.diff(np.append(starts, n))
+    total_amount = np.add.reduceat(amounts, starts)
+    total_liters = np.add.reduceat(liters, starts)
+    x = days - days[row_start]
+    sx = np.add.reduceat(x, starts)
+    sy = np.add.reduceat(price, starts)
+    sxx = np.add.reduceat(x * x, starts)
+    sxy = np.add.reduceat(x * price, starts)
+    denominator = counts * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.where(denominator > 0, (counts * sxy - sx * sy) / denominator, 0.0) * 30
+
+    return starts, counts, total_amount / total_liters, total_liters, slopes, np.column_stack((price, rolling_price))
+
+
+def _price_groups(rows, key_names, window):
+    keys = [tuple(row[:len(key_names)]) for row in rows]
+    dates = [row.date for row in rows]
+    key_codes = np.array(["\x1f".join(str(part) for part in key) for key in keys], dtype=str)
+    starts, counts, averages, totals, slopes, prices = _price_series(
+        key_codes, dates, [row.amount for row in rows], [row.liters for row in rows], window
+    )
+
+    prices = np.round(prices, 3).tolist()
+    groups = []
+    for start, count, average, total, slope in zip(
+        starts.tolist(), counts.tolist(), averages.tolist(), totals.tolist(), slopes.tolist()
+    ):
+        group = dict(zip(key_names, keys[start]))
+        group.update({
+            "average_price_per_liter": round(average, 3),
+            "total_liters": round(total, 2),
+            "trend_per_month": round(slope, 3),
+            "series": [
+                {"date": str(dates[i]), "price_per_liter": prices[i][0], "rolling_price_per_liter": prices[i][1]}
+                for i in range(start, start + count)
+            ],
+        })
+        groups.append(group)
+    return groups
+
+
+@router.get("/prices")
+def get_price_analytics(
+    user_id: int,
+    window: int = Query(5, ge=1, le=90, description="Rolling window in purchase days"),
+    limit: int = Query(5, ge=1, le=50, description="Number of cheapest stores to return"),
+    db: Session = Depends(get_db),
+):
+    try:
+        store_rows = (
+            db.query(
+                AllSpendingEntries.store,
+                AllSpendingEntries.city,
+                AllSpendingEntries.date,
+                func.sum(AllSpendingEntries.amount_spent).label("amount"),
+                func.sum(AllSpendingEntries.liters).label("liters"),
+            )
+            .filter(AllSpendingEntries.user_id == user_id)
+            .group_by(AllSpendingEntries.store, AllSpendingEntries.city, AllSpendingEntries.date)
+            .order_by(AllSpendingEntries.store, AllSpendingEntries.city, AllSpendingEntries.date)
+            .all()
+        )
+
+        city_rows = (
+            db.query(
+                AllSpendingEntries.city,
+                AllSpendingEntries.date,
+                func.sum(AllSpendingEntries.amount_spent).label("amount"),
+                func.sum(AllSpendingEntries.liters).label("liters"),
+            )
+            .filter(AllSpendingEntries.user_id == user_id)
+            .group_by(AllSpendingEntries.city, AllSpendingEntries.date)
+            .order_by(AllSpendingEntries.city, AllSpendingEntries.date)
+            .all()
+        )
+
+        stores = _price_groups(store_rows, ("store", "city"), window)
+        cities = _price_groups(city_rows, ("city",), window)
+
+        cheapest = sorted(stores, key=lambda group: group["average_price_per_liter"])[:limit]
+
+        return {
+            "window": window,
+            "stores": stores,
+            "cities": cities,
+            "cheapest_stores": [
+                {
+                    "store": group["store"],
+                    "city": group["city"],
+                    "average_price_per_liter": group["average_price_per_liter"],
+                }
+                for group in cheapest
+            ],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching price analytics: {str(e)}")
+
+
+# -------------------------
+# 11. Month-End Forecast
+# -------------------------
+@router.get("/forecast")
+def get_forecast(user_id: int, db: Session = Depends(get_db)):
+    try:
+        return forecasting.forecast(db, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching forecast: {str(e)}")
+
+
+# -------------------------
+# 12. Percentile Among All Users
+# -------------------------
+@router.get("/percentiles")
+def get_percentiles(user_id: int, db: Session = Depends(get_db)):
+    try:
+        return {
+            "percentiles": percentiles.user_percentiles(db, user_id),
+            # Other users' totals are as of this build, see percentiles.py
+            "population_built_at": percentiles.percentile_stats["last_built_at"],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching percentiles: {str(e)}")
+
+
+# -------------------------
+# 13. Unusual Entries
+# -------------------------
+@router.get("/anomalies")
+def get_anomalies(
+    user_id: int,
+    metric: str = Query(None, pattern="^(liters|price_per_liter)$"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    try:
+        query = db.query(EntryAnomaly).filter(EntryAnomaly.user_id == user_id)
+        if metric:
+            query = query.filter(EntryAnomaly.metric == metric)
+        rows = query.order_by(EntryAnomaly.created_at.desc(), EntryAnomaly.id.desc()).limit(limit).all()
+
+        return {
+            "anomalies": [
+                {
+                    "metric": row.metric,
+                    "entry_id": row.entry_id,
+                    "date": row.date.isoformat(),
+                    "value": round(row.value, 2),
+                    "expected": round(row.expected, 2),
+                    "z_score": row.z_score,
+                    "flagged_at": row.created_at,
+                }
+                for row in rows
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching anomalies: {str(e)}")
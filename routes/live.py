@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from auth_helpers import create_stream_ticket, decode_token, STREAM_TICKET_EXPIRE_SECONDS
+from cache import cache
+from database import SessionLocal
+from dependencies import get_current_user
+from models import User
+import live_updates
+import threading
+import time
+import uuid
+
+router = APIRouter()
+
+# Tickets redeemed on this worker, for when the cache is not shared: jti -> expiry
+_redeemed = {}
+_redeemed_lock = threading.Lock()
+
+
+def _user_exists(user_id: int) -> bool:
+    # Short-lived session: a stream must not hold a pooled connection while idle
+    db = SessionLocal()
+    try:
+        return db.query(User.id).filter(User.id == user_id, User.disabled_at.is_(None)).first() is not None
+    finally:
+        db.close()
+
+
+def _ticket_key(jti: str):
+    return f"stream_ticket:{jti}"
+
+
+def _redeem(payload: dict) -> bool:
+    """
+    Marks a ticket as used; False if it already was. With a shared cache the
+    ticket carries the version its key had when issued, and redeeming advances
+    it, so only the first redemption on any worker sees the issued version.
+    Otherwise tickets are single-use per worker, and only for their short life.
+    """
+    if cache.shared:
+        previous, _ = cache.invalidate(_ticket_key(payload["jti"]))
+        return previous is not None and previous == payload.get("ver")
+    now = time.time()
+    with _redeemed_lock:
+        for jti in [jti for jti, expires_at in _redeemed.items() if expires_at <= now]:
+            del _redeemed[jti]
+        if payload["jti"] in _redeemed:
+            return False
+        _redeemed[payload["jti"]] = now + STREAM_TICKET_EXPIRE_SECONDS
+        return True
+
+
+# -------------------------
+# 1. Stream Ticket
+# -------------------------
+@router.post("/dashboard/stream/ticket")
+def issue_stream_ticket(current_user: User = Depends(get_current_user)):
+    """
+    EventSource cannot send an Authorization header, so the stream is opened
+    with a short-lived, single-use ticket in its URL instead of the access token.
+    """
+    jti = uuid.uuid4().hex
+    version = cache.invalidate(_ticket_key(jti))[1] if cache.shared else None
+    if cache.shared and version is None:
+        raise HTTPException(status_code=503, detail="Live updates are temporarily unavailable")
+    return {"ticket": create_stream_ticket(current_user.id, jti, version), "expires_in": STREAM_TICKET_EXPIRE_SECONDS}
+
+
+# -------------------------
+# 2. Dashboard Stream
+# -------------------------
+@router.get("/dashboard/stream")
+async def stream_dashboard(request: Request, ticket: str = Query(...)):
+    try:
+        payload = decode_token(ticket)
+        if payload.get("type") != "stream" or not payload.get("jti"):
+            raise ValueError("Not a stream ticket")
+        user_id = int(payload.get("sub"))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+
+    if not await run_in_threadpool(_redeem, payload):
+        raise HTTPException(status_code=401, detail="Stream ticket was already used")
+
+    if not await run_in_threadpool(_user_exists, user_id):
+        raise HTTPException(status_code=401, detail="Invalid or expired token. Please log in again.")
+
+    if not live_updates.broker.can_subscribe(user_id):
+        raise HTTPException(status_code=429, detail="Too many open dashboard streams")
+
+    return StreamingResponse(
+        live_updates.event_stream(request, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
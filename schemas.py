@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Literal
 from enum import Enum
 
 # --------------------------
@@ -70,6 +70,7 @@ class UserProfileResponse(BaseModel):
     monthly_goal: Optional[float]
     income: Optional[float]  # Include income in the profile response
     current_month_consumption: float
+    goal_status: Optional[dict] = None  # Filled in by the goal evaluation job
 
     class Config:
         populate_by_name = True
@@ -154,3 +155,18 @@ class SpendingCreate(SpendingBase):
 
 class SpendingResponse(SpendingBase):
     id: int
+
+
+# --------------------------
+# Batch Entry Schemas
+# --------------------------
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    type: Literal["consumption", "spending"]
+    id: Optional[int] = None  # Required for update and delete
+    data: Optional[dict] = None  # ConsumptionCreate / SpendingCreate fields for create and update
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=500)
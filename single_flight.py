@@ -0,0 +1,101 @@
+from cache import cache
+import itertools
+import threading
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Coalescing Configuration
+# ------------------------
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+COALESCE_PATH_PREFIXES = ("/analytics/", "/dashboard")
+COALESCE_EXEMPT_PATHS = ("/dashboard/stream",)
+COALESCE_MAX_TRACKED_WRITERS = 10000
+
+
+# ------------------------
+# Write Generations
+# ------------------------
+# Part of every coalescing key, so a read that starts after the user's write
+# never joins a computation that started before it. Generations come from one
+# counter; users not tracked (never wrote, or dropped to bound memory) share
+# the floor, a value drawn after every generation any in-flight key can hold.
+# They only see this worker's writes. With a shared cache backend, every write
+# also advances the user's version there (see cache.py), which is part of the
+# key too, so a write handled by any worker is seen; with the in-process cache
+# the guarantee holds for writes handled by the same worker only.
+_generations = itertools.count(1)
+_write_generations = {}  # user_id -> generation of the user's last write
+_floor = 0
+_writes_lock = threading.Lock()
+
+
+def _cache_key(user_id: int) -> str:
+    return f"writes:{user_id}"  # Version only
+
+
+def mark_write(user_id: int):
+    """Called from request threads once a user's write is committed."""
+    global _floor
+    with _writes_lock:
+        _write_generations[user_id] = next(_generations)
+        if len(_write_generations) > COALESCE_MAX_TRACKED_WRITERS:
+            _floor = next(_generations)  # Before clearing, so no reader sees an old floor for a dropped user
+            _write_generations.clear()
+    if cache.shared:
+        cache.invalidate(_cache_key(user_id))
+
+
+def write_generation(user_id: int):
+    generation = _write_generations.get(user_id)
+    generation = _floor if generation is None else generation
+    if cache.shared:
+        return generation, cache.version(_cache_key(user_id))
+    return generation
+
+
+def coalescible(method: str, path: str) -> bool:
+    return (
+        COALESCE_REQUESTS
+        and method == "GET"
+        and path.startswith(COALESCE_PATH_PREFIXES)
+        and path not in COALESCE_EXEMPT_PATHS
+    )
+
+
+class SingleFlight:
+    """
+    Shares one in-flight computation between concurrent callers with the same
+    key: the first caller starts it and later ones await its result. Nothing is
+    kept once it finishes, so this never serves a stale result; it only removes
+    duplicate work while the first call is still running.
+
+    Lives on the event loop, so it needs no lock.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key, compute):
+        """Returns (result, shared), where shared is True for callers that joined another's call."""
+        task = self._in_flight.get(key)
+        shared = task is not None
+        if shared:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["leaders"] += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded: a caller that disconnects must not cancel the others' result
+        return await asyncio.shield(task), shared
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+
+requests = SingleFlight()
@@ -0,0 +1,143 @@
+from sqlalchemy import event
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+import threading
+import logging
+import queue
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Recorder Configuration
+# ------------------------
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 0))  # Opt-in: 0 disables the recorder
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 200))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 10000))
+SLOW_QUERY_EXPLAIN_QUEUE = 20  # Plans waiting for capture; further ones are skipped
+
+enabled = SLOW_QUERY_MS > 0
+
+# Route and user of the current request, set by the request middleware in main.py
+request_context = ContextVar("slow_query_request_context", default=None)
+
+_lock = threading.Lock()
+_records = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+_explain_queue = queue.Queue(maxsize=SLOW_QUERY_EXPLAIN_QUEUE)
+_explain_worker = None
+
+
+def recent(limit: int = None):
+    """Returns recorded slow queries, newest first."""
+    with _lock:
+        records = list(reversed(_records))
+    return records[:limit] if limit else records
+
+
+def clear():
+    with _lock:
+        _records.clear()
+
+
+# ------------------------
+# Plan Capture
+# ------------------------
+# Plans are captured with plain EXPLAIN, which plans the statement without
+# running it. EXPLAIN ANALYZE runs it again, side effects included (sequences,
+# advisory locks, notifications, functions that write), so it is only used for
+# statements executed with the `slow_query_analyze` execution option, which
+# callers set on reads they know to be safe to repeat:
+#
+#     db.execute(query.execution_options(slow_query_analyze=True))
+_EXPLAINABLE = ("SELECT", "WITH", "VALUES", "INSERT", "UPDATE", "DELETE")
+
+
+def _explainable(statement: str) -> bool:
+    head = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return head in _EXPLAINABLE
+
+
+def _capture_plan(engine, record, statement, parameters, analyze):
+    options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+    # The execution option keeps the plan queries themselves out of the buffer
+    with engine.connect().execution_options(slow_query_explain=True) as conn:
+        with conn.begin() as transaction:
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}")
+            rows = conn.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters).fetchall()
+            transaction.rollback()
+    record["plan"] = "\n".join(row[0] for row in rows)
+    record["plan_analyzed"] = analyze
+
+
+def _run_explain_worker():
+    while True:
+        engine, record, statement, parameters, analyze = _explain_queue.get()
+        try:
+            _capture_plan(engine, record, statement, parameters, analyze)
+        except Exception as e:
+            record["plan_error"] = str(e)
+        finally:
+            _explain_queue.task_done()
+
+
+def _request_plan(engine, record, statement, parameters, analyze):
+    global _explain_worker
+    if not SLOW_QUERY_EXPLAIN:
+        return
+    if engine.dialect.name != "postgresql":
+        record["plan_error"] = f"Plans are not captured on {engine.dialect.name}"
+        return
+    if not _explainable(statement):
+        record["plan_error"] = "Not explained: only queries and data changes have plans"
+        return
+    if isinstance(parameters, list):  # executemany: explain the first row
+        parameters = parameters[0] if parameters else None
+
+    with _lock:
+        if _explain_worker is None:
+            _explain_worker = threading.Thread(target=_run_explain_worker, name="slow-query-explain", daemon=True)
+            _explain_worker.start()
+    try:
+        _explain_queue.put_nowait((engine, record, statement, parameters, analyze))
+    except queue.Full:
+        record["plan_error"] = "Skipped: too many plans waiting"
+
+
+# ------------------------
+# Engine Hooks
+# ------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["slow_query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info.pop("slow_query_started")) * 1000
+    if elapsed_ms < SLOW_QUERY_MS or context.execution_options.get("slow_query_explain"):
+        return
+
+    request = request_context.get() or {}
+    record = {
+        "recorded_at": datetime.utcnow(),
+        "duration_ms": round(elapsed_ms, 2),
+        "route": request.get("route"),
+        "user_id": request.get("user_id"),
+        "database": conn.engine.url.render_as_string(hide_password=True),
+        "statement": statement,
+        "parameters": repr(parameters)[:500],
+        "plan": None,
+        "plan_analyzed": False,
+        "plan_error": None,
+    }
+    with _lock:
+        _records.append(record)
+    logger.warning(f"Slow query ({record['duration_ms']} ms) in {record['route'] or 'background job'}: {statement[:200]}")
+    _request_plan(conn.engine, record, statement, parameters, bool(context.execution_options.get("slow_query_analyze")))
+
+
+def install(engine):
+    """Records statements on `engine` slower than SLOW_QUERY_MS."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,229 @@
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from archive import AllConsumptionEntries, AllSpendingEntries
+import threading
+import logging
+import shutil
+import json
+import os
+
+# Optional dependencies: pip install pyarrow duckdb
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Snapshot Configuration
+# ------------------------
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", 50000))
+# Rows younger than this are left for the next run: a transaction still open
+# when the export reads may yet commit rows with an earlier created_at.
+SNAPSHOT_SAFETY_LAG_SECONDS = int(os.getenv("SNAPSHOT_SAFETY_LAG_SECONDS", 300))
+
+# dataset -> (entries over hot and archived rows, exported columns, groupable columns, aggregates)
+DATASETS = {
+    "consumption": (
+        AllConsumptionEntries,
+        ("id", "user_id", "date", "liters_consumed", "created_at"),
+        ("month", "date"),
+        {"total_liters": "sum(liters_consumed)"},
+    ),
+    "spending": (
+        AllSpendingEntries,
+        ("id", "user_id", "date", "amount_spent", "liters", "store", "city", "created_at"),
+        ("month", "date", "city", "store"),
+        {"total_spent": "sum(amount_spent)", "total_liters": "sum(liters)"},
+    ),
+}
+
+_run_lock = threading.Lock()
+snapshot_stats = {
+    "running": False,
+    "last_started_at": None,
+    "last_completed_at": None,
+    "exported": {dataset: 0 for dataset in DATASETS},
+    "last_error": None,
+}
+
+
+def available() -> bool:
+    return pa is not None and duckdb is not None
+
+
+def _dataset_dir(dataset: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, dataset)
+
+
+# ------------------------
+# Watermarks
+# ------------------------
+# Kept next to the files they describe, so removing a dataset's directory
+# simply restarts its export from the beginning.
+def read_watermark(dataset: str):
+    try:
+        with open(os.path.join(_dataset_dir(dataset), "_watermark.json")) as f:
+            mark = json.load(f)
+        return datetime.fromisoformat(mark["created_at"]), mark["id"]
+    except FileNotFoundError:
+        return None
+
+
+def _write_watermark(dataset: str, created_at: datetime, entry_id: int):
+    path = os.path.join(_dataset_dir(dataset), "_watermark.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"created_at": created_at.isoformat(), "id": entry_id}, f)
+    os.replace(path + ".tmp", path)
+
+
+# ------------------------
+# Incremental Export
+# ------------------------
+def _write_batch(dataset: str, columns, rows):
+    """
+    Writes one batch as a Parquet file per entry month. File names derive from
+    the batch's first row, so re-running an interrupted export overwrites the
+    files it already wrote instead of duplicating them.
+    """
+    first = rows[0]
+    name = f"part-{first.created_at:%Y%m%d%H%M%S%f}-{first.id}.parquet"
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row.date.strftime("%Y-%m"), []).append(row)
+
+    for month, month_rows in by_month.items():
+        directory = os.path.join(_dataset_dir(dataset), f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        table = pa.table({column: [getattr(row, column) for row in month_rows] for column in columns})
+        pq.write_table(table, os.path.join(directory, name + ".tmp"), compression="zstd")
+        os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+
+
+def export_dataset(db: Session, dataset: str, batch_size: int = SNAPSHOT_BATCH_SIZE) -> int:
+    """Exports entries created since the dataset's watermark, in keyset order of (created_at, id)."""
+    entries, columns, _, _ = DATASETS[dataset]
+    cutoff = db.scalar(select(func.now())) - timedelta(seconds=SNAPSHOT_SAFETY_LAG_SECONDS)
+    watermark = read_watermark(dataset)
+    os.makedirs(_dataset_dir(dataset), exist_ok=True)
+
+    exported = 0
+    while True:
+        query = db.query(*[getattr(entries, column) for column in columns]).filter(entries.created_at < cutoff)
+        if watermark is not None:
+            query = query.filter(tuple_(entries.created_at, entries.id) > tuple_(*watermark))
+        rows = query.order_by(entries.created_at, entries.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        _write_batch(dataset, columns, rows)
+        watermark = (rows[-1].created_at, rows[-1].id)
+        _write_watermark(dataset, *watermark)
+        exported += len(rows)
+        snapshot_stats["exported"][dataset] += len(rows)
+    return exported
+
+
+def run_export(db: Session, rebuild: bool = False):
+    """
+    Exports every dataset. Snapshots are append-only: entries edited or deleted
+    after export keep their exported values until a rebuild re-exports everything.
+    """
+    if not available():
+        raise RuntimeError("Parquet snapshots need the optional pyarrow and duckdb packages")
+    if not _run_lock.acquire(blocking=False):
+        logger.info("Snapshot export already running, skipping")
+        return snapshot_stats
+
+    try:
+        snapshot_stats.update({
+            "running": True,
+            "last_started_at": datetime.utcnow(),
+            "exported": {dataset: 0 for dataset in DATASETS},
+            "last_error": None,
+        })
+        for dataset in DATASETS:
+            if rebuild:
+                shutil.rmtree(_dataset_dir(dataset), ignore_errors=True)
+            exported = export_dataset(db, dataset)
+            logger.info(f"Exported {exported} {dataset} entries to Parquet")
+        snapshot_stats["last_completed_at"] = datetime.utcnow()
+    except Exception as e:
+        snapshot_stats["last_error"] = str(e)
+        logger.error(f"Snapshot export failed: {e}")
+    finally:
+        db.rollback()  # Ends the read transaction
+        snapshot_stats["running"] = False
+        _run_lock.release()
+    return snapshot_stats
+
+
+def run_with_new_session(rebuild: bool = False):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    db.info["read_only"] = True  # Exports scan whole tables; keep them on a replica when there is one
+    try:
+        return run_export(db, rebuild=rebuild)
+    finally:
+        db.close()
+
+
+# ------------------------
+# Offline Queries
+# ------------------------
+def query_totals(dataset: str, group_by, start_month: str = None, end_month: str = None):
+    """
+    Aggregates a dataset across all users from its Parquet files with DuckDB,
+    never touching Postgres. Months are 'YYYY-MM' and prune whole partitions.
+    """
+    if not available():
+        raise RuntimeError("Parquet snapshots need the optional pyarrow and duckdb packages")
+    _, _, groupable, aggregates = DATASETS[dataset]
+    unknown = [column for column in group_by if column not in groupable]
+    if unknown:
+        raise ValueError(f"Cannot group {dataset} by {', '.join(unknown)}")
+
+    directory = _dataset_dir(dataset)
+    if not os.path.isdir(directory) or not any(name.startswith("month=") for name in os.listdir(directory)):
+        return []  # Nothing exported yet
+    files = os.path.join(directory, "month=*", "*.parquet")
+
+    selected = ", ".join(group_by)
+    measures = ", ".join(f"{expression} AS {name}" for name, expression in aggregates.items())
+    conditions, parameters = [], []
+    if start_month:
+        conditions.append("month >= ?")
+        parameters.append(start_month)
+    if end_month:
+        conditions.append("month <= ?")
+        parameters.append(end_month)
+
+    sql = (
+        f"SELECT {selected + ', ' if selected else ''}{measures}, "
+        "count(*) AS entries, count(DISTINCT user_id) AS users "
+        f"FROM read_parquet('{files}', hive_partitioning = true, hive_types = {{'month': VARCHAR}}) "
+        + (f"WHERE {' AND '.join(conditions)} " if conditions else "")
+        + (f"GROUP BY {selected} ORDER BY {selected}" if selected else "")
+    )
+    with duckdb.connect() as conn:
+        result = conn.execute(sql, parameters)
+        names = [column[0] for column in result.description]
+        return [dict(zip(names, row)) for row in result.fetchall()]
+
+
+# ------------------------
+# Export Command
+# ------------------------
+if __name__ == "__main__":
+    import sys
+
+    run_with_new_session(rebuild=len(sys.argv) > 1 and sys.argv[1] == "rebuild")
@@ -0,0 +1,223 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Boolean, Date, Float, JSON, String
+from sqlalchemy import event
+from functools import lru_cache
+import re
+
+# ------------------------
+# Dialect-Portable Expressions
+# ------------------------
+# Postgres is the production database; the SQLite forms let the same queries
+# run on an in-memory database (see benchmarks/sqlite_harness.py).
+
+
+class month_start(FunctionElement):
+    """First day of the month of a date, as a date."""
+
+    type = Date()
+    inherit_cache = True
+    name = "month_start"
+
+
+class year_start(FunctionElement):
+    """First day of the year of a date, as a date."""
+
+    type = Date()
+    inherit_cache = True
+    name = "year_start"
+
+
+class json_object(FunctionElement):
+    """A JSON object from alternating key and value arguments."""
+
+    type = JSON()
+    inherit_cache = True
+    name = "json_object"
+
+
+class json_array_agg(FunctionElement):
+    """Aggregates a value per row into a JSON array; loads as a Python list."""
+
+    type = JSON()
+    inherit_cache = True
+    name = "json_array_agg"
+
+
+# Full-text search: Postgres matches the stored search_vector column (see the
+# entry search migration). SQLite has no such column; it calls Python functions
+# registered on each connection (see install_sqlite_functions) that read the
+# web-style query the same way, word by word, against the document text.
+class text_search_match(FunctionElement):
+    """Arguments: search vector, document text, web-style query. True where they match."""
+
+    type = Boolean()
+    inherit_cache = True
+    name = "text_search_match"
+
+
+class text_search_rank(FunctionElement):
+    """Arguments: search vector, document text, query. Relevance of a match, higher first."""
+
+    type = Float()
+    inherit_cache = True
+    name = "text_search_rank"
+
+
+class text_search_snippet(FunctionElement):
+    """Arguments: document text, query. An excerpt with the matches wrapped in <mark>."""
+
+    type = String()
+    inherit_cache = True
+    name = "text_search_snippet"
+
+
+@compiles(month_start)
+def _month_start_postgresql(element, compiler, **kw):
+    return f"CAST(date_trunc('month', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+
+@compiles(month_start, "sqlite")
+def _month_start_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, 'start of month')"
+
+
+@compiles(year_start)
+def _year_start_postgresql(element, compiler, **kw):
+    return f"CAST(date_trunc('year', {compiler.process(element.clauses, **kw)}) AS DATE)"
+
+
+@compiles(year_start, "sqlite")
+def _year_start_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)}, 'start of year')"
+
+
+@compiles(json_object)
+def _json_object_postgresql(element, compiler, **kw):
+    return f"json_build_object({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(json_object, "sqlite")
+def _json_object_sqlite(element, compiler, **kw):
+    return f"json_object({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(json_array_agg)
+def _json_array_agg_postgresql(element, compiler, **kw):
+    return f"json_agg({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(json_array_agg, "sqlite")
+def _json_array_agg_sqlite(element, compiler, **kw):
+    return f"json_group_array({compiler.process(element.clauses, **kw)})"
+
+
+TEXT_SEARCH_CONFIG = "simple"  # Notes are written in any language, so words are not stemmed
+SNIPPET_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=20, MinWords=8, MaxFragments=2"
+
+
+def _query(compiler, argument, **kw):
+    return f"websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', {compiler.process(argument, **kw)})"
+
+
+@compiles(text_search_match)
+def _text_search_match_postgresql(element, compiler, **kw):
+    vector, _, query = element.clauses.clauses
+    return f"{compiler.process(vector, **kw)} @@ {_query(compiler, query, **kw)}"
+
+
+@compiles(text_search_match, "sqlite")
+def _text_search_match_sqlite(element, compiler, **kw):
+    _, document, query = element.clauses.clauses
+    return f"text_search_match({compiler.process(document, **kw)}, {compiler.process(query, **kw)})"
+
+
+@compiles(text_search_rank)
+def _text_search_rank_postgresql(element, compiler, **kw):
+    vector, _, query = element.clauses.clauses
+    return f"ts_rank_cd({compiler.process(vector, **kw)}, {_query(compiler, query, **kw)})"
+
+
+@compiles(text_search_rank, "sqlite")
+def _text_search_rank_sqlite(element, compiler, **kw):
+    _, document, query = element.clauses.clauses
+    return f"text_search_rank({compiler.process(document, **kw)}, {compiler.process(query, **kw)})"
+
+
+@compiles(text_search_snippet)
+def _text_search_snippet_postgresql(element, compiler, **kw):
+    document, query = element.clauses.clauses
+    return (
+        f"ts_headline('{TEXT_SEARCH_CONFIG}', {compiler.process(document, **kw)}, "
+        f"{_query(compiler, query, **kw)}, '{SNIPPET_OPTIONS}')"
+    )
+
+
+@compiles(text_search_snippet, "sqlite")
+def _text_search_snippet_sqlite(element, compiler, **kw):
+    document, query = element.clauses.clauses
+    return f"text_search_snippet({compiler.process(document, **kw)}, {compiler.process(query, **kw)})"
+
+
+# SQLite forms of the web-style query: words must all appear (in order and
+# adjacent for a "quoted phrase"), -word must not, and "or" separates
+# alternatives. Words match whole words, case-insensitively, like the
+# unstemmed 'simple' configuration.
+_QUERY_TOKEN = re.compile(r'(-?)"([^"]*)"?|(-?)(\S+)')
+
+
+@lru_cache(maxsize=256)
+def _parse_web_query(query: str):
+    """Returns the query's alternatives, each a list of (pattern, excluded) terms."""
+    alternatives, terms = [], []
+    for match in _QUERY_TOKEN.finditer(query or ""):
+        phrase_excluded, phrase, word_excluded, word = match.groups()
+        if phrase is None and word.lower() == "or":
+            if terms:
+                alternatives.append(terms)
+                terms = []
+            continue
+        words = re.findall(r"\w+", phrase if phrase is not None else word)
+        if words:
+            pattern = re.compile(r"\b" + r"\W+".join(map(re.escape, words)) + r"\b", re.IGNORECASE)
+            terms.append((pattern, bool(phrase_excluded or word_excluded)))
+    if terms:
+        alternatives.append(terms)
+    return alternatives
+
+
+def _search_match(document, query):
+    document = document or ""
+    return any(
+        all(bool(pattern.search(document)) != excluded for pattern, excluded in terms)
+        for terms in _parse_web_query(query)
+    )
+
+
+def _search_rank(document, query):
+    """Occurrences of the query's words, so documents matching more often rank first."""
+    document = document or ""
+    return float(sum(
+        len(pattern.findall(document))
+        for terms in _parse_web_query(query) for pattern, excluded in terms if not excluded
+    ))
+
+
+def _search_snippet(document, query):
+    patterns = [
+        f"(?:{pattern.pattern})"
+        for terms in _parse_web_query(query) for pattern, excluded in terms if not excluded
+    ]
+    if not document or not patterns:
+        return document
+    # One pass, so a word of the query cannot match inside an inserted tag
+    return re.sub("|".join(patterns), lambda match: f"<mark>{match.group(0)}</mark>", document, flags=re.IGNORECASE)
+
+
+def install_sqlite_functions(engine):
+    """Registers the SQLite forms of the search functions on every connection of `engine`."""
+    @event.listens_for(engine, "connect")
+    def _register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("text_search_match", 2, _search_match, deterministic=True)
+        dbapi_connection.create_function("text_search_rank", 2, _search_rank, deterministic=True)
+        dbapi_connection.create_function("text_search_snippet", 2, _search_snippet, deterministic=True)
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Must be set before the app is imported: one shared in-memory SQLite database
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["RATE_LIMITS_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db  # noqa: E402
+
+init_db()
@@ -0,0 +1,115 @@
+import math
+from datetime import date, timedelta
+
+import pytest
+
+import anomalies
+from anomalies import EWMA, score_liters, score_price
+from database import SessionLocal
+from models import EntryAnomaly, User, RoleEnum
+
+
+def test_ewma_mean_and_variance():
+    stats = EWMA()
+    for value in (10.0, 12.0):
+        stats.add(value)
+    # Second observation: mean moves by alpha of the difference, and so does the variance (Finch's incremental form)
+    alpha = anomalies.ANOMALY_ALPHA
+    assert stats.mean == pytest.approx(10.0 + alpha * 2.0)
+    assert stats.variance == pytest.approx((1 - alpha) * (2.0 * alpha * 2.0))
+    assert stats.samples == 2
+
+
+def test_z_score_waits_for_enough_samples():
+    stats = EWMA()
+    for _ in range(anomalies.ANOMALY_MIN_SAMPLES - 1):
+        stats.add(2.0)
+    assert stats.z_score(100.0) is None
+    stats.add(2.0)
+    assert stats.z_score(100.0) is not None
+
+
+def test_z_score_floors_the_deviation_of_regular_users():
+    stats = EWMA(mean=2.0, variance=0.0, samples=30)
+    # A perfectly regular user still has a deviation of 10% of their mean
+    assert stats.z_score(3.0) == pytest.approx(1.0 / (anomalies.ANOMALY_MIN_STD_FRACTION * 2.0))
+
+
+def test_z_score_uses_the_moving_deviation():
+    stats = EWMA(mean=2.0, variance=0.25, samples=30)
+    assert stats.z_score(3.5) == pytest.approx(1.5 / math.sqrt(0.25))
+
+
+def _liters_state(day, daily_totals):
+    stats = EWMA()
+    for total in daily_totals:
+        stats.add(total)
+    return {"day": day, "total": 0.0, "flagged": False, "stats": stats.as_list()}
+
+
+def test_day_total_is_flagged_once():
+    day = date(2026, 10, 19)
+    state = _liters_state(day - timedelta(days=1), [2.0] * 20)
+    state["total"] = 2.0  # Yesterday, folded into the statistics by the next day's write
+
+    assert score_liters(state, day, 1.5) is None
+    total, expected, z_score = score_liters(state, day, 2.0)
+    assert total == 3.5 and expected == pytest.approx(2.0)
+    assert z_score > anomalies.ANOMALY_Z_THRESHOLD
+    assert score_liters(state, day, 1.0) is None  # Already flagged today
+    assert state["total"] == 4.5
+
+
+def test_earlier_days_are_not_scored():
+    day = date(2026, 10, 19)
+    state = _liters_state(day, [2.0] * 20)
+    assert score_liters(state, day - timedelta(days=3), 50.0) is None
+    assert state["total"] == 0.0
+
+
+def test_unusually_cheap_prices_are_flagged():
+    stats = EWMA()
+    for _ in range(20):
+        stats.add(1.0)
+    state = {"stats": stats.as_list()}
+    expected, z_score = score_price(state, 0.5)
+    assert expected == pytest.approx(1.0) and z_score < -anomalies.ANOMALY_Z_THRESHOLD
+    assert EWMA(*state["stats"]).samples == 21
+
+
+@pytest.fixture(scope="module")
+def client_user():
+    from fastapi.testclient import TestClient
+    import main
+    from auth_helpers import create_access_token
+
+    db = SessionLocal()
+    try:
+        user = User(
+            first_name="Anomaly", last_name="Test", email="anomaly-test@example.com", password="x",
+            date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+        )
+        db.add(user)
+        db.commit()
+        return TestClient(main.app), {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}, user.id
+    finally:
+        db.close()
+
+
+def test_batch_creates_are_scored(client_user):
+    client, headers, user_id = client_user
+    today = date.today()
+    operations = [
+        {"op": "create", "type": "consumption", "data": {"date": str(today - timedelta(days=day)), "liters_consumed": 2.0}}
+        for day in range(20, 0, -1)
+    ]
+    operations.append({"op": "create", "type": "consumption", "data": {"date": str(today), "liters_consumed": 9.0}})
+    response = client.post("/entries/batch", json={"operations": operations}, headers=headers)
+    assert response.status_code == 200
+
+    db = SessionLocal()
+    try:
+        flagged = db.query(EntryAnomaly).filter(EntryAnomaly.user_id == user_id).all()
+    finally:
+        db.close()
+    assert [(anomaly.date, anomaly.value) for anomaly in flagged] == [(today, 9.0)]
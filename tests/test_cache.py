@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+
+from cache import LRUCache, SQLiteCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return LRUCache(max_entries=100, ttl=60)
+    return SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+
+
+def test_set_with_the_version_read_before_computing(backend):
+    version = backend.version("key")
+    assert backend.set("key", {"total": 1.5, "day": date(2026, 10, 19)}, version=version)
+    assert backend.get("key") == {"total": 1.5, "day": date(2026, 10, 19)}
+
+
+def test_stale_value_cannot_overwrite_an_invalidation(backend):
+    version = backend.version("key")  # A reader starts computing...
+    backend.invalidate("key")  # ...a writer invalidates meanwhile...
+    assert not backend.set("key", "stale", version=version)  # ...so the reader's value is refused
+    assert backend.get("key") is None
+
+
+def test_invalidate_reports_whether_anyone_else_invalidated(backend):
+    previous, current = backend.invalidate("key")
+    assert current != previous
+    again_previous, _ = backend.invalidate("key")
+    assert again_previous == current  # Nobody else invalidated in between
+
+
+def test_get_or_compute_computes_once(backend):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [1, 2, 3]
+
+    assert backend.get_or_compute("key", compute) == [1, 2, 3]
+    assert backend.get_or_compute("key", compute) == [1, 2, 3]
+    assert len(calls) == 1
+
+
+def test_workers_sharing_a_file_see_each_others_invalidations(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker, other_worker = SQLiteCache(path), SQLiteCache(path)
+    version = worker.version("key")
+    other_worker.invalidate("key")
+    assert worker.version("key") != version
+    assert not worker.set("key", "stale", version=version)
+
+
+def test_eviction_does_not_forget_an_invalidation():
+    backend = LRUCache(max_entries=1, ttl=60)
+    stale = backend.version("a")
+    backend.invalidate("a")
+    backend.invalidate("b")  # Evicts "a"
+    assert not backend.set("a", "stale", version=stale)
+    assert backend.set("a", "fresh", version=backend.version("a"))
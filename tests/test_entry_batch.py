@@ -0,0 +1,154 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth_helpers import create_access_token
+from database import SessionLocal
+from models import ConsumptionEntry, ConsumptionEntryArchive, SpendingEntry, User, RoleEnum
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="module")
+def user():
+    db = SessionLocal()
+    try:
+        user = User(
+            first_name="Batch", last_name="Test", email="batch-test@example.com", password="x",
+            date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+        )
+        db.add(user)
+        db.commit()
+        return user.id, {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def entry_id(user):
+    db = SessionLocal()
+    try:
+        entry = ConsumptionEntry(user_id=user[0], date=date(2026, 10, 1), liters_consumed=1.0, notes="before")
+        db.add(entry)
+        db.commit()
+        return entry.id
+    finally:
+        db.close()
+
+
+def _entries(user_id):
+    db = SessionLocal()
+    try:
+        return (
+            sorted((entry.id, entry.liters_consumed, entry.notes) for entry in db.query(ConsumptionEntry).filter_by(user_id=user_id)),
+            db.query(SpendingEntry).filter_by(user_id=user_id).count(),
+        )
+    finally:
+        db.close()
+
+
+def _create(liters):
+    return {"op": "create", "type": "consumption", "data": {"date": "2026-10-02", "liters_consumed": liters}}
+
+
+def test_applies_every_operation(client, user, entry_id):
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        _create(2.0),
+        {"op": "create", "type": "spending", "data": {"date": "2026-10-02", "amount_spent": 3.0, "liters": 1.5}},
+        {"op": "update", "type": "consumption", "id": entry_id, "data": {"date": "2026-10-01", "liters_consumed": 4.0, "notes": "after"}},
+        _create(5.0),
+    ]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["created", "created", "updated", "created"]
+
+    entries, _ = _entries(user[0])
+    by_id = {entry[0]: entry[1:] for entry in entries}
+    # Created ids are returned in request order
+    assert by_id[results[0]["id"]] == (2.0, None) and by_id[results[3]["id"]] == (5.0, None)
+    assert by_id[entry_id] == (4.0, "after")
+
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        {"op": "delete", "type": "consumption", "id": entry_id},
+    ]})
+    assert response.status_code == 200
+    assert entry_id not in {entry[0] for entry in _entries(user[0])[0]}
+
+
+def test_repeated_entry_is_rejected_before_anything_runs(client, user, entry_id):
+    before = _entries(user[0])
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        _create(2.0),
+        {"op": "update", "type": "consumption", "id": entry_id, "data": {"date": "2026-10-01", "liters_consumed": 3.0}},
+        {"op": "delete", "type": "consumption", "id": entry_id},
+    ]})
+    assert response.status_code == 400
+    assert response.json()["detail"]["results"][2]["status"] == "error"
+    assert _entries(user[0]) == before
+
+
+def test_invalid_payload_applies_nothing(client, user):
+    before = _entries(user[0])
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        _create(2.0),
+        {"op": "create", "type": "consumption", "data": {"date": "not a date", "liters_consumed": 1.0}},
+    ]})
+    assert response.status_code == 400
+    assert _entries(user[0]) == before
+
+
+def test_missing_entry_rolls_back_the_whole_batch(client, user, entry_id):
+    before = _entries(user[0])
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        _create(2.0),
+        {"op": "update", "type": "consumption", "id": entry_id, "data": {"date": "2026-10-01", "liters_consumed": 9.0}},
+        {"op": "delete", "type": "spending", "id": 987654},
+    ]})
+    assert response.status_code == 404
+    results = response.json()["detail"]["results"]
+    assert results[2]["detail"] == "Spending entry not found"
+    assert _entries(user[0]) == before
+
+
+def test_other_users_entries_count_as_missing(client, user):
+    db = SessionLocal()
+    try:
+        other = User(
+            first_name="Other", last_name="User", email="batch-other@example.com", password="x",
+            date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+        )
+        db.add(other)
+        db.flush()
+        entry = ConsumptionEntry(user_id=other.id, date=date(2026, 10, 1), liters_consumed=1.0)
+        db.add(entry)
+        db.commit()
+        other_id, other_entry_id = other.id, entry.id
+    finally:
+        db.close()
+
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        {"op": "delete", "type": "consumption", "id": other_entry_id},
+    ]})
+    assert response.status_code == 404
+    assert [entry[0] for entry in _entries(other_id)[0]] == [other_entry_id]
+
+
+def test_archived_entry_is_read_only(client, user):
+    db = SessionLocal()
+    try:
+        db.add(ConsumptionEntryArchive(id=900001, user_id=user[0], date=date(2020, 1, 1), liters_consumed=1.0))
+        db.commit()
+    finally:
+        db.close()
+    before = _entries(user[0])
+    response = client.post("/entries/batch", headers=user[1], json={"operations": [
+        _create(2.0),
+        {"op": "delete", "type": "consumption", "id": 900001},
+    ]})
+    assert response.status_code == 409
+    assert _entries(user[0]) == before
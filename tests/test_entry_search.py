@@ -0,0 +1,109 @@
+import importlib.util
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import entry_search
+from database import SessionLocal
+from models import (
+    Base, ConsumptionEntry, ConsumptionEntryArchive, SpendingEntry, User, RoleEnum,
+)
+
+# An empty Postgres database the test may fill and drop, e.g. postgresql://localhost/app_test
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+def _seed(db: Session) -> int:
+    user = User(
+        first_name="Search", last_name="Test", email="search-test@example.com", password="x",
+        date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+    )
+    db.add(user)
+    db.flush()
+    db.add_all([
+        ConsumptionEntry(user_id=user.id, date=date(2026, 10, 1), liters_consumed=1.0, notes="cola Kiwi Oslo"),
+        ConsumptionEntry(user_id=user.id, date=date(2026, 10, 2), liters_consumed=1.0, notes="Oslo cola, more cola in Oslo"),
+        ConsumptionEntry(user_id=user.id, date=date(2026, 10, 3), liters_consumed=1.0, notes="cola at home"),
+        SpendingEntry(user_id=user.id, date=date(2026, 10, 4), amount_spent=3.0, liters=1.5, store="Kiwi", city="Oslo", notes="cola"),
+    ])
+    db.add(ConsumptionEntryArchive(id=100000, user_id=user.id, date=date(2020, 1, 5), liters_consumed=1.0, notes="old cola in Oslo"))
+    db.commit()
+    return user.id
+
+
+def _notes(rows):
+    return [(row.type, row.notes) for row in rows]
+
+
+@pytest.fixture(scope="module")
+def sqlite_user():
+    db = SessionLocal()
+    try:
+        yield db, _seed(db)
+    finally:
+        db.close()
+
+
+def test_words_need_not_be_adjacent(sqlite_user):
+    db, user_id = sqlite_user
+    total, rows = entry_search.search_entries(db, user_id, "Cola Oslo")
+    assert total == 4
+    assert ("consumption", "cola Kiwi Oslo") in _notes(rows)
+    assert ("consumption", "old cola in Oslo") in _notes(rows)  # Archived entries are searched too
+    assert ("consumption", "cola at home") not in _notes(rows)
+
+
+def test_phrases_exclusions_and_alternatives(sqlite_user):
+    db, user_id = sqlite_user
+    assert _notes(entry_search.search_entries(db, user_id, '"kiwi oslo"', entry_type="consumption")[1]) == [("consumption", "cola Kiwi Oslo")]
+    assert ("consumption", "cola Kiwi Oslo") not in _notes(entry_search.search_entries(db, user_id, "cola -kiwi")[1])
+    assert entry_search.search_entries(db, user_id, "home or kiwi", entry_type="consumption")[0] == 2
+
+
+def test_more_matches_rank_first_and_snippets_mark_them(sqlite_user):
+    db, user_id = sqlite_user
+    _, rows = entry_search.search_entries(db, user_id, "cola oslo")
+    assert rows[0].notes == "Oslo cola, more cola in Oslo"
+    assert rows[0].snippet == "<mark>Oslo</mark> <mark>cola</mark>, more <mark>cola</mark> in <mark>Oslo</mark>"
+
+
+def _load_search_migration():
+    pytest.importorskip("alembic")
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic", "versions", "2c8f5d1a9e36_entry_notes_full_text_search.py")
+    spec = importlib.util.spec_from_file_location("entry_search_migration", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+def test_postgres_ranking_snippets_and_archive_union():
+    migration = _load_search_migration()
+    engine = create_engine(TEST_POSTGRES_URL)
+    Base.metadata.create_all(bind=engine)
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS btree_gin")
+            for table, vector in migration.TABLES.items():
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED"
+                )
+        with Session(engine) as db:
+            user_id = _seed(db)
+
+            total, rows = entry_search.search_entries(db, user_id, "Cola Oslo")
+            assert total == 4
+            assert ("consumption", "old cola in Oslo") in _notes(rows)
+            assert rows[0].notes == "Oslo cola, more cola in Oslo"
+            assert all(rows[i].rank >= rows[i + 1].rank for i in range(len(rows) - 1))
+            assert "<mark>" in rows[0].snippet
+
+            # Store and city are searched for spending, behind the notes
+            _, rows = entry_search.search_entries(db, user_id, "kiwi", entry_type="spending")
+            assert [row.store for row in rows] == ["Kiwi"]
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
@@ -0,0 +1,106 @@
+from datetime import date
+
+import pytest
+
+import leaderboards
+from cache import cache
+from database import SessionLocal
+from leaderboards import TopK
+from models import ConsumptionEntry, User, RoleEnum
+
+
+@pytest.fixture
+def boards(monkeypatch):
+    monkeypatch.setattr(leaderboards, "_boards", {})
+    return leaderboards._boards
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    counted = []
+    rebuild = leaderboards.rebuild
+
+    def counting_rebuild(db, metric, period):
+        counted.append((metric, period))
+        rebuild(db, metric, period)
+
+    monkeypatch.setattr(leaderboards, "rebuild", counting_rebuild)
+    return counted
+
+
+@pytest.fixture(scope="module")
+def db():
+    session = SessionLocal()
+    user = User(
+        first_name="Leader", last_name="Board", email="leaderboard-test@example.com", password="x",
+        date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+    )
+    session.add(user)
+    session.commit()
+    session.add(ConsumptionEntry(user_id=user.id, date=date.today(), liters_consumed=1000.0))
+    session.commit()
+    session.info["test_user_id"] = user.id
+    yield session
+    session.close()
+
+
+def test_top_k_keeps_the_highest_values():
+    board = TopK(3)
+    board.load([])
+    for user_id, value in [(1, 5.0), (2, 9.0), (3, 1.0), (4, 7.0)]:
+        board.offer(user_id, value)
+    assert board.top(3) == [(2, 9.0), (4, 7.0), (1, 5.0)]
+    # User 3 was displaced, so nobody untracked can exceed its value
+    assert board.floor == 1.0
+
+
+def test_top_k_asks_for_a_rebuild_once_an_untracked_user_could_rank():
+    board = TopK(2)
+    board.load([(1, 10.0), (2, 8.0)], truncated_value=6.0)
+    assert board.top(2) == [(1, 10.0), (2, 8.0)]
+    board.offer(2, 5.0)  # Below the floor: an untracked user may now be second
+    assert board.top(2) is None
+    assert board.top(1) == [(1, 10.0)]
+
+
+def test_top_k_drops_users_whose_total_reaches_zero():
+    board = TopK(2)
+    board.load([(1, 3.0)])
+    board.offer(1, 0.0)
+    assert board.top(1) == []
+
+
+def test_cold_board_needs_a_rebuild():
+    assert TopK(2).top(1) is None
+
+
+def test_board_starts_fresh_on_period_rollover(boards):
+    monday = date(2026, 10, 19)
+    leaderboards._board("liters", "week", monday).load([(1, 4.0)])
+    assert leaderboards._board("liters", "week", date(2026, 10, 25)).top(1) == [(1, 4.0)]
+
+    next_week = leaderboards._board("liters", "week", date(2026, 10, 26))
+    assert not next_week.built
+    assert next_week.top(1) is None
+
+
+def test_own_write_updates_the_board_in_place(boards, rebuilds, db):
+    user_id = db.info["test_user_id"]
+    assert leaderboards.top_users(db, "liters", "day", 1)[0][0] == user_id
+    assert rebuilds == [("liters", "day")]
+
+    db.add(ConsumptionEntry(user_id=user_id, date=date.today(), liters_consumed=1.0))
+    db.commit()
+    leaderboards.record_write(db, user_id, metrics=("liters",))
+    assert leaderboards.top_users(db, "liters", "day", 1)[0] == (user_id, 1001.0)
+    assert rebuilds == [("liters", "day")]
+
+
+def test_another_workers_write_forces_a_rebuild(boards, rebuilds, db):
+    leaderboards.top_users(db, "liters", "all", 1)
+    assert len(rebuilds) == 1
+
+    # What a write handled by another worker sharing the cache does
+    cache.invalidate(leaderboards._cache_key("liters"))
+    leaderboards.top_users(db, "liters", "all", 1)
+    assert len(rebuilds) == 2
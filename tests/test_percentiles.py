@@ -0,0 +1,94 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import percentiles
+from database import SessionLocal
+from models import ConsumptionEntry, User, RoleEnum
+from percentiles import KLLSketch
+
+
+def _sketch(values, k=200, seed=0):
+    sketch = KLLSketch(k)
+    sketch._rng = random.Random(seed)
+    for value in values:
+        sketch.update(value)
+    return sketch
+
+
+@pytest.mark.parametrize("k", [100, 200])
+def test_rank_error_stays_within_the_kll_bound(k):
+    n = 50000
+    values = list(range(n))
+    random.Random(1).shuffle(values)
+    sketch = _sketch(values, k=k)
+
+    assert sketch.n == n
+    # About 1.7 / k in practice; twice that leaves room for the randomness of compaction
+    bound = 3.4 / k
+    worst = max(abs(sketch.rank(value) - (value + 1) / n) for value in range(0, n, 97))
+    assert worst <= bound
+    assert sketch.nbytes < n * 8 / 20  # O(k) memory, not O(n)
+
+
+def test_quantiles_of_a_skewed_population():
+    rng = random.Random(2)
+    values = [rng.expovariate(1.0) for _ in range(20000)]
+    sketch = _sketch(values)
+    exact = sorted(values)
+    for fraction in (0.1, 0.5, 0.9, 0.99):
+        estimate = sketch.quantile(fraction)
+        assert abs(sum(value <= estimate for value in exact) / len(exact) - fraction) <= 0.02
+
+
+def test_merged_sketches_rank_like_one():
+    values = list(range(20000))
+    random.Random(3).shuffle(values)
+    merged = _sketch(values[:10000], seed=4)
+    merged.merge(_sketch(values[10000:], seed=5))
+    assert merged.n == 20000
+    assert abs(merged.rank(4999) - 0.25) <= 0.02
+
+
+def test_empty_sketch_ranks_nothing():
+    assert KLLSketch().rank(1.0) == 0.0
+
+
+@pytest.fixture
+def user_id():
+    db = SessionLocal()
+    try:
+        user = User(
+            first_name="Percentile", last_name="Test", email="percentile-test@example.com", password="x",
+            date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+        )
+        db.add(user)
+        db.commit()
+        db.add(ConsumptionEntry(user_id=user.id, date=date.today(), liters_consumed=2.0))
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def test_requests_never_build_and_skip_periods_started_since_the_last_build(monkeypatch, user_id):
+    scheduled = []
+    monkeypatch.setattr(percentiles, "schedule_rebuild", lambda: scheduled.append(True))
+    monkeypatch.setattr(percentiles, "build_sketches", lambda *args: pytest.fail("built on the request path"))
+    yesterday = date.today() - timedelta(days=1)
+    monkeypatch.setattr(percentiles, "_built_for", yesterday)
+    monkeypatch.setattr(percentiles, "_sketches", {
+        (metric, period): _sketch([1.0, 3.0]) for metric in percentiles.METRICS for period in percentiles.PERIODS
+    })
+
+    db = SessionLocal()
+    try:
+        result = percentiles.user_percentiles(db, user_id)["liters"]
+    finally:
+        db.close()
+
+    assert scheduled == [True]
+    assert result["daily"]["percentile"] is None  # Yesterday's daily totals say nothing about today
+    assert result["lifetime"]["percentile"] == 50.0
+    assert (result["monthly"]["percentile"] is None) == (yesterday.month != date.today().month)
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from auth_helpers import create_access_token
+from database import SessionLocal, engine
+from dependencies import get_db
+from models import User, RoleEnum
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="module")
+def user_headers():
+    db = SessionLocal()
+    try:
+        user = User(
+            first_name="Session", last_name="Test", email="session-test@example.com", password="x",
+            date_of_birth=date(1990, 1, 1), role=RoleEnum.user, monthly_goal=60.0,
+        )
+        db.add(user)
+        db.commit()
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def checkouts():
+    counted = []
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        counted.append(connection_record)
+
+    event.listen(engine, "checkout", on_checkout)
+    yield counted
+    event.remove(engine, "checkout", on_checkout)
+
+
+@pytest.mark.parametrize("path", ["/user/profile", "/consumption/history"])
+def test_authenticated_request_checks_out_one_connection(client, user_headers, checkouts, path):
+    # Auth and the handler share the request's session, so one pool checkout serves both
+    response = client.get(path, headers=user_headers)
+    assert response.status_code == 200
+    assert len(checkouts) == 1
+
+
+@pytest.mark.parametrize("method, path, read_only", [
+    ("GET", "/dashboard", True),
+    ("POST", "/consumption", False),
+    ("GET", "/admin/users", False),
+])
+def test_only_non_admin_reads_may_use_a_replica(method, path, read_only):
+    request = Request({"type": "http", "method": method, "path": path, "query_string": b"", "headers": []})
+    sessions = get_db(request)
+    db = next(sessions)
+    assert db.info["read_only"] is read_only
+    sessions.close()
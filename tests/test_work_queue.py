@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+from work_queue import CoalescingQueue
+
+
+def run_queue(handler, scenario, **options):
+    async def main():
+        queue = CoalescingQueue(handler, window=0.01, concurrency=4, **options)
+        queue.start()
+        try:
+            await scenario(queue)
+            await asyncio.sleep(0)  # enqueue hands keys over through the loop
+            await queue._queue.join()
+        finally:
+            await queue.stop()
+        return queue
+    return asyncio.run(main())
+
+
+def test_key_enqueued_mid_run_waits_for_the_running_task():
+    runs = []
+    started = threading.Event()
+
+    def handler(key, payload):
+        runs.append(("start", sorted(payload)))
+        started.set()
+        time.sleep(0.1)
+        runs.append(("end", sorted(payload)))
+
+    async def scenario(queue):
+        queue.enqueue(1, {"liters"})
+        await asyncio.to_thread(started.wait, 1)
+        queue.enqueue(1, {"spend"})
+
+    queue = run_queue(handler, scenario)
+    assert runs == [("start", ["liters"]), ("end", ["liters"]), ("start", ["spend"]), ("end", ["spend"])]
+    assert queue.stats["processed"] == 2
+
+
+def test_failed_task_is_retried_with_later_payloads():
+    calls = []
+
+    def handler(key, payload):
+        calls.append(sorted(payload))
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+
+    async def scenario(queue):
+        queue.enqueue(1, {"liters"})
+        await asyncio.sleep(0.02)
+        queue.enqueue(1, {"spend"})
+
+    queue = run_queue(handler, scenario, retry_delay=0.1)
+    assert calls == [["liters"], ["liters", "spend"]]
+    assert queue.stats["retried"] == 1 and queue.stats["failed"] == 0
+
+
+def test_task_is_dropped_after_max_attempts():
+    calls = []
+
+    def handler(key, payload):
+        calls.append(key)
+        raise RuntimeError("always fails")
+
+    async def scenario(queue):
+        queue.enqueue(1, {"liters"})
+
+    queue = run_queue(handler, scenario, max_attempts=3, retry_delay=0.001)
+    assert calls == [1, 1, 1]
+    assert queue.stats["failed"] == 1 and queue.stats["retried"] == 2
@@ -0,0 +1,239 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import date
+from archive import AllConsumptionEntries, AllSpendingEntries
+from cache import cache
+from database import engine as primary_engine
+import numpy as np
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Time-Series Configuration
+# ------------------------
+TIMESERIES_MEMORY_BYTES = int(os.getenv("TIMESERIES_MEMORY_MB", 64)) * 1024 * 1024
+# Longest a series is served without reloading when the cache backend is per
+# process, since other workers' writes are then invisible to this one
+TIMESERIES_TTL_SECONDS = float(os.getenv("TIMESERIES_TTL_SECONDS", 60))
+
+# Hot and archived entries alike, so series cover a user's whole history
+_METRIC_COLUMNS = {
+    "liters": (AllConsumptionEntries, AllConsumptionEntries.liters_consumed),
+    "spend": (AllSpendingEntries, AllSpendingEntries.amount_spent),
+}
+
+
+def _day_number(day: date) -> int:
+    return int(np.datetime64(day, "D").astype(np.int64))
+
+
+def day_strings(days: np.ndarray):
+    """ISO dates of an array of day numbers."""
+    return np.datetime_as_string(days.astype(np.int64).astype("datetime64[D]")).tolist()
+
+
+# ------------------------
+# Columnar User Series
+# ------------------------
+class UserSeries:
+    """
+    One user's daily totals as parallel columns sorted by day: day numbers
+    (days since 1970-01-01) plus a value and an entry count per metric. A day
+    exists in every column if either metric has entries on it; `counts` tells
+    whether a metric really has entries that day. Never modified in place.
+    `loaded_at` is when the series was last loaded in full.
+    """
+
+    __slots__ = ("days", "values", "counts", "version", "loaded_at")
+
+    def __init__(self, days, values, counts, version, loaded_at=None):
+        self.days = days
+        self.values = values
+        self.counts = counts
+        self.version = version
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + sum(v.nbytes for v in self.values.values()) + sum(
+            c.nbytes for c in self.counts.values()
+        )
+
+    def _slice(self, start: date = None, end: date = None):
+        lower = 0 if start is None else np.searchsorted(self.days, _day_number(start), side="left")
+        upper = len(self.days) if end is None else np.searchsorted(self.days, _day_number(end), side="right")
+        return slice(lower, upper)
+
+    def daily(self, metric: str, start: date = None, end: date = None):
+        """Returns (days, totals) of the days with entries within [start, end]."""
+        window = self._slice(start, end)
+        present = self.counts[metric][window] > 0
+        return self.days[window][present], self.values[metric][window][present]
+
+    def total(self, metric: str, start: date = None, end: date = None):
+        """Returns (total, entry count) within [start, end]."""
+        window = self._slice(start, end)
+        return float(self.values[metric][window].sum()), int(self.counts[metric][window].sum())
+
+    def range_totals(self, metric: str, starts, ends):
+        """Totals of many [start, end] ranges at once, from one cumulative sum."""
+        cumulative = np.concatenate(([0.0], np.cumsum(self.values[metric])))
+        lower = np.searchsorted(self.days, [_day_number(day) for day in starts], side="left")
+        upper = np.searchsorted(self.days, [_day_number(day) for day in ends], side="right")
+        return cumulative[upper] - cumulative[lower]
+
+    def top_days(self, metric: str, limit: int):
+        """Returns (days, totals) of the highest days, ties broken by the earlier day."""
+        days, totals = self.daily(metric)
+        order = np.lexsort((days, -totals))[:limit]
+        return days[order], totals[order]
+
+    def with_days(self, metric: str, days, totals, counts, version):
+        """
+        Returns a copy with the given days of one metric set to absolute
+        totals, inserting days that are new to the series.
+        """
+        days = np.asarray(days, dtype=np.int32)
+        new_days = np.setdiff1d(days, self.days)
+        merged = np.union1d(self.days, new_days).astype(np.int32)
+        positions = np.searchsorted(merged, self.days)
+
+        values, entry_counts = {}, {}
+        for name in self.values:
+            values[name] = np.zeros(len(merged))
+            values[name][positions] = self.values[name]
+            entry_counts[name] = np.zeros(len(merged), dtype=np.int32)
+            entry_counts[name][positions] = self.counts[name]
+
+        changed = np.searchsorted(merged, days)
+        values[metric][changed] = totals
+        entry_counts[metric][changed] = counts
+        # Only the given days were reloaded, so the series is no fresher than before
+        return UserSeries(merged, values, entry_counts, version, self.loaded_at)
+
+
+def _daily_rows(db: Session, metric: str, user_id: int, days=None):
+    table, column = _METRIC_COLUMNS[metric]
+    query = (
+        select(table.date, func.sum(column), func.count())
+        .where(table.user_id == user_id)
+        .group_by(table.date)
+    )
+    if days is not None:
+        query = query.where(table.date.in_(days))
+    # Series outlive the request, so they must not be built from a lagging replica
+    return db.execute(query, bind_arguments={"bind": primary_engine}).all()
+
+
+def _load(db: Session, user_id: int, version) -> UserSeries:
+    rows = {metric: _daily_rows(db, metric, user_id) for metric in _METRIC_COLUMNS}
+    day_numbers = {metric: np.array([_day_number(row[0]) for row in rows[metric]], dtype=np.int32) for metric in rows}
+    days = np.union1d(*day_numbers.values()).astype(np.int32)
+
+    values, counts = {}, {}
+    for metric in rows:
+        positions = np.searchsorted(days, day_numbers[metric])
+        values[metric] = np.zeros(len(days))
+        values[metric][positions] = [row[1] or 0 for row in rows[metric]]
+        counts[metric] = np.zeros(len(days), dtype=np.int32)
+        counts[metric][positions] = [row[2] for row in rows[metric]]
+    return UserSeries(days, values, counts, version)
+
+
+# ------------------------
+# Series Store
+# ------------------------
+def _cache_key(user_id: int) -> str:
+    return f"timeseries:{user_id}"  # Version only; series stay in process memory
+
+
+class SeriesStore:
+    """
+    Per-process LRU of user series, bounded by total bytes. Freshness is
+    tracked through the cache's key versions (see cache.py). With a shared
+    cache backend, a write made by another worker makes this worker reload
+    the series. The in-process backend only sees this worker's writes, so
+    series are then also reloaded after TIMESERIES_TTL_SECONDS, which bounds
+    how long another worker's write can go unseen.
+    """
+
+    def __init__(self, max_bytes: int = TIMESERIES_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._series = OrderedDict()  # user_id -> UserSeries
+        self._bytes = 0
+
+    def _put(self, user_id: int, series: UserSeries):
+        self._drop(user_id)
+        self._series[user_id] = series
+        self._bytes += series.nbytes
+        while self._bytes > self.max_bytes and len(self._series) > 1:
+            _, evicted = self._series.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _drop(self, user_id: int):
+        series = self._series.pop(user_id, None)
+        if series is not None:
+            self._bytes -= series.nbytes
+
+    def get(self, db: Session, user_id: int) -> UserSeries:
+        """Returns the user's series, loading it on first access or after another worker's write."""
+        version = cache.version(_cache_key(user_id))  # Read before loading, see cache.py
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is not None and series.version == version and (
+                cache.shared or time.monotonic() - series.loaded_at < TIMESERIES_TTL_SECONDS
+            ):
+                self._series.move_to_end(user_id)
+                return series
+
+        series = _load(db, user_id, version)
+        with self._lock:
+            self._put(user_id, series)
+        return series
+
+    def refresh_days(self, db: Session, user_id: int, metric: str, days):
+        """
+        Updates a loaded series after one of the user's entries changed on
+        `days`. Reloads those days' totals rather than applying a delta, so a
+        refresh that races a load or another refresh cannot count a write twice.
+        """
+        previous, current = cache.invalidate(_cache_key(user_id))
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is None or series.version != previous:
+                self._drop(user_id)  # Missed another write: reload on next access
+                return
+
+        try:
+            rows = {row[0]: row for row in _daily_rows(db, metric, user_id, days=list(days))}
+        except Exception as e:
+            logger.error(f"Failed to refresh {metric} series of user {user_id}: {e}")
+            with self._lock:
+                self._drop(user_id)
+            return
+        totals = [(rows[day][1] or 0) if day in rows else 0 for day in days]
+        counts = [rows[day][2] if day in rows else 0 for day in days]
+
+        with self._lock:
+            series = self._series.get(user_id)
+            if series is None or series.version != previous:
+                return
+            self._put(user_id, series.with_days(metric, [_day_number(day) for day in days], totals, counts, current))
+
+    def invalidate(self, user_id: int):
+        cache.invalidate(_cache_key(user_id))
+        with self._lock:
+            self._drop(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._series), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+store = SeriesStore()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Queue Configuration
+# ------------------------
+COALESCE_WINDOW_SECONDS = float(os.getenv("RECOMPUTE_COALESCE_WINDOW_SECONDS", 0.5))
+RECOMPUTE_CONCURRENCY = int(os.getenv("RECOMPUTE_CONCURRENCY", 4))
+RECOMPUTE_MAX_ATTEMPTS = int(os.getenv("RECOMPUTE_MAX_ATTEMPTS", 5))
+RECOMPUTE_RETRY_SECONDS = float(os.getenv("RECOMPUTE_RETRY_SECONDS", 2))  # Doubles with every failed attempt
+
+
+class CoalescingQueue:
+    """
+    Background queue of per-key tasks running on the app's event loop.
+
+    A key enqueued again before its task starts is merged into the pending
+    task, so a burst of writes for one user costs a single recomputation.
+    Tasks wait `window` seconds before running to give bursts time to merge,
+    and at most `concurrency` run at once, each in a worker thread.
+
+    A key never runs twice at once: one enqueued while its task runs waits
+    for that task to finish, so runs for a key happen in enqueue order. A
+    failed task is retried with exponential backoff, merged with anything
+    enqueued for its key since, up to `max_attempts` times.
+    """
+
+    def __init__(
+        self,
+        handler,
+        window: float = COALESCE_WINDOW_SECONDS,
+        concurrency: int = RECOMPUTE_CONCURRENCY,
+        max_attempts: int = RECOMPUTE_MAX_ATTEMPTS,
+        retry_delay: float = RECOMPUTE_RETRY_SECONDS,
+    ):
+        self.handler = handler  # handler(key, payload) runs in a thread
+        self.window = window
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.loop = None
+        self._queue = None
+        self._workers = []
+        self._pending = {}  # key -> {"enqueued_at": ..., "payload": set(), "attempts": ..., "not_before": ...}
+        self._running = set()  # Keys whose task is running; queued again once it finishes
+        self.stats = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "processed": 0,
+            "retried": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+    # ------------------------
+    # Lifecycle
+    # ------------------------
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [self.loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Work queue started with {self.concurrency} workers")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.loop = None
+
+    # ------------------------
+    # Producers
+    # ------------------------
+    def enqueue(self, key, payload=()):
+        """
+        Schedules `key` for processing. Safe to call from request threads.
+        Falls back to running inline when the queue is not started (scripts, jobs).
+        """
+        if self.loop is None or self.loop.is_closed():
+            self.handler(key, set(payload))
+            return
+        self.loop.call_soon_threadsafe(self._enqueue, key, set(payload))
+
+    def _enqueue(self, key, payload):
+        self.stats["enqueued"] += 1
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending["payload"] |= payload
+            self.stats["coalesced"] += 1
+            return
+        self._pending[key] = {"enqueued_at": time.monotonic(), "payload": payload, "attempts": 0, "not_before": 0.0}
+        if key not in self._running:
+            self._queue.put_nowait(key)
+
+    # ------------------------
+    # Consumers
+    # ------------------------
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                pending = self._pending[key]
+                due = max(pending["enqueued_at"] + self.window, pending["not_before"])
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                # Anything enqueued for this key from now on starts a new task,
+                # which waits for this one to finish
+                task = self._pending.pop(key)
+                self._running.add(key)
+                lag = time.monotonic() - task["enqueued_at"]
+                self.stats["last_lag_seconds"] = round(lag, 4)
+                self.stats["max_lag_seconds"] = round(max(self.stats["max_lag_seconds"], lag), 4)
+
+                self.stats["in_flight"] += 1
+                try:
+                    await asyncio.to_thread(self.handler, key, task["payload"])
+                    self.stats["processed"] += 1
+                except Exception as e:
+                    self._retry(key, task, e)
+                finally:
+                    self.stats["in_flight"] -= 1
+                    self._running.discard(key)
+                    if key in self._pending:
+                        self._queue.put_nowait(key)
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, key, task, error):
+        attempts = task["attempts"] + 1
+        if attempts >= self.max_attempts:
+            self.stats["failed"] += 1
+            logger.error(f"Background task for {key} failed {attempts} times, giving up: {error}")
+            return
+        self.stats["retried"] += 1
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        logger.warning(f"Background task for {key} failed, retrying in {delay:.1f}s: {error}")
+        retry = self._pending.setdefault(
+            key, {"enqueued_at": task["enqueued_at"], "payload": set(), "attempts": 0, "not_before": 0.0}
+        )
+        retry["payload"] |= task["payload"]
+        retry["enqueued_at"] = min(retry["enqueued_at"], task["enqueued_at"])
+        retry["attempts"] = attempts
+        retry["not_before"] = time.monotonic() + delay
+
+    # ------------------------
+    # Introspection
+    # ------------------------
+    def snapshot(self):
+        now = time.monotonic()
+        oldest = min((task["enqueued_at"] for task in self._pending.values()), default=None)
+        return {
+            **self.stats,
+            "running": self.loop is not None,
+            "depth": len(self._pending),
+            "oldest_pending_seconds": round(now - oldest, 4) if oldest is not None else 0.0,
+            "window_seconds": self.window,
+            "concurrency": self.concurrency,
+        }
+
+
+# ------------------------
+# Recompute Queue
+# ------------------------
+def recompute_user(user_id: int, metrics):
+    """Refreshes a user's derived data after their entries changed."""
+    from database import SessionLocal
+    from models import User
+    import leaderboards
+
+    db = SessionLocal()
+    try:
+        totals = leaderboards.record_write(db, user_id, metrics=tuple(metrics) or leaderboards.METRICS)
+        if "liters" in totals:
+            # Denormalized for the admin listing's sort by lifetime consumption
+            db.query(User).filter(User.id == user_id).update(
+                {User.lifetime_liters: float(totals["liters"]["all"] or 0)}, synchronize_session=False
+            )
+            db.commit()
+    finally:
+        db.close()
+
+
+recompute_queue = CoalescingQueue(recompute_user)